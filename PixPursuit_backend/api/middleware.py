@@ -5,50 +5,87 @@ Defines middleware components for the web application. Middleware functions proc
 requests before they reach the actual route handlers and can modify responses before
 they are sent to the client. This file includes middleware for tasks such as logging
 requests, handling authentication, managing sessions, and performing request/response
-transformations.
+transformations. Middleware is written against ASGI directly, so it adds no task or
+stream per request.
 """
 
-from fastapi import HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
+import time
 from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from config.logging_config import setup_logging
+from utils.metrics import REQUEST_LATENCY, REQUESTS_IN_FLIGHT
 
 logger = setup_logging(__name__)
 
 
-class LoggingMiddleware(BaseHTTPMiddleware):
+def get_route_path(scope: Scope) -> str:
     """
-        Middleware for logging HTTP requests and responses.
+    Returns the path template of the route that handled a request, so requests to the same route are
+    logged alike regardless of their path parameters.
 
-        This middleware intercepts all incoming HTTP requests, logs the request details,
-        and then passes the request through to the next middleware or endpoint. It also
+    :param scope: The ASGI scope of the request.
+    :return: The path template, or the request path if no route matched.
+    """
+    route = scope.get('route')
+    return getattr(route, 'path', None) or scope.get('path', '')
+
+
+class LoggingMiddleware:
+    """
+        Middleware for logging and timing HTTP requests.
+
+        This middleware passes every HTTP request through to the application, then logs the
+        method, the route, the user, the response status and the time the request took, and
+        records the time in the request latency histogram of the route. It also
         catches any exceptions thrown during the request handling, logs them, and returns
         an appropriate HTTP response.
     """
-    async def dispatch(self, request: Request, call_next: callable) -> JSONResponse:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """
-            Process the incoming request, log it, and handle any exceptions.
+            Process the incoming request, time it, log it, and handle any exceptions.
 
-            :param request: The incoming HTTP request.
-            :param call_next: The next callable in the middleware chain.
-            :return: The HTTP response to send back to the client.
+            :param scope: The ASGI scope of the request.
+            :param receive: The ASGI receive channel.
+            :param send: The ASGI send channel.
         """
-        try:
-            # Process the request and log it
-            response = await call_next(request)
-            username = getattr(request.state, 'username', None)
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
 
-            log_msg = f"Request: {request.method} {request.url.path}"
-            if username:
-                log_msg += f" - User: {username}"
+        scope.setdefault('state', {})  # Shared with the request state, where authentication stores the user
+        in_flight = REQUESTS_IN_FLIGHT.labels(scope['method'])
+        in_flight.inc()
+        started_at = time.perf_counter()
+        status_code = None
 
-            logger.info(log_msg)
-            return response
-        except HTTPException as http_exc:
-            # Propagate HTTP exceptions without altering
-            raise http_exc
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
         except Exception as e:
             # Log and respond to unhandled exceptions
             logger.error(f"Unhandled exception during request: {str(e)}")
-            return JSONResponse(status_code=500, content={"detail": "Internal Server Error"})
+            if status_code is not None:
+                raise
+            status_code = 500
+            response = JSONResponse(status_code=500, content={"detail": "Internal Server Error"})
+            await response(scope, receive, send)
+        finally:
+            elapsed = time.perf_counter() - started_at
+            in_flight.dec()
+            route_path = get_route_path(scope) if 'route' in scope else 'unmatched'
+            REQUEST_LATENCY.labels(scope['method'], route_path, str(status_code)).observe(elapsed)
+
+            log_msg = f"Request: {scope['method']} {get_route_path(scope)}"
+            username = scope['state'].get('username')
+            if username:
+                log_msg += f" - User: {username}"
+            log_msg += f" - Status: {status_code} - {elapsed * 1000:.1f} ms"
+            logger.info(log_msg)
@@ -9,7 +9,7 @@ from fastapi import APIRouter, Depends
 from data.databases.mongodb.async_db.database_tools import add_tags_to_images, add_tags_to_albums, add_feedback, add_description, add_like, \
     add_view, remove_tags_from_image, add_names
 from services.authentication.auth import get_current_user
-from services.tag_prediction.tag_prediction_tools import training_init, train_init_albums
+from services.tag_prediction.training_buffer import queue_training_update
 from api.schemas.content_schema import TagData, FeedbackData, DescriptionData, LikeData, ViewData, SelectedTagsData, \
     RemovingTagsData, FaceData
 from api.schemas.auth_schema import User
@@ -34,7 +34,7 @@ async def add_user_tag_api(data: TagData, current_user: User = Depends(get_curre
     success = await add_tags_to_images(data.tags, [data.inserted_id])
     if not success:
         raise add_tags_exception
-    await training_init([data.inserted_id])
+    await queue_training_update(image_ids=[data.inserted_id])
     return {"message": "Tags added successfully"}
 
 
@@ -56,8 +56,7 @@ async def add_tags_to_selected_api(data: SelectedTagsData, current_user: User =
                await add_tags_to_albums(data.tags, data.album_ids))
     if not success:
         raise add_tags_exception
-    await training_init(data.image_ids)
-    await train_init_albums(data.album_ids)
+    await queue_training_update(image_ids=data.image_ids, album_ids=data.album_ids)
     return {"message": "Tags added to selected items successfully"}
 
 
@@ -76,7 +75,7 @@ async def feedback_on_tags_api(data: FeedbackData, current_user: User = Depends(
     success = await add_feedback(data.tag, data.is_positive, current_user.username, data.inserted_id)
     if not success:
         raise add_feedback_exception
-    await training_init([data.inserted_id])
+    await queue_training_update(image_ids=[data.inserted_id])
     return {"message": "Feedback added successfully"}
 
 
@@ -147,7 +146,7 @@ async def remove_tags_api(data: RemovingTagsData, current_user: User = Depends(g
     success = await remove_tags_from_image(data.image_id, data.tags)
     if not success:
         raise remove_tags_exception
-    await training_init([data.image_id])
+    await queue_training_update(image_ids=[data.image_id])
     return {"message": "Tags removed successfully"}
 
 
@@ -5,9 +5,13 @@ Defines routes for image-related operations, such as uploading, processing, dele
 and performing actions like finding similar images or scraping images from external sources.
 """
 
+import time
+import asyncio
 from typing import List, Optional
 from fastapi import APIRouter, Depends, File, UploadFile, Form
 from services.image_similarity import ImageSimilarity
+from services.face_search import FaceSearch
+from services.duplicate_detection import get_duplicate_groups
 from data.databases.mongodb.async_db.database_tools import delete_images, relocate_to_album
 from services.authentication.auth import get_current_user
 from data.data_extraction.image_processing import process_and_save_images
@@ -17,9 +21,27 @@ from utils.function_utils import is_allowed_url
 from api.schemas.auth_schema import User
 from utils.exceptions import process_and_save_images_exception, delete_images_exception, relocate_images_exception, \
     find_similar_images_exception, invalid_limit_exception, scrape_and_save_images_exception, invalid_url_exception, \
-    no_images_found_exception
+    no_images_found_exception, invalid_image_exception, similarity_search_timeout_exception, no_face_query_exception, \
+    face_not_found_exception, get_duplicate_groups_exception, query_image_too_large_exception
+from utils.constants import SIMILARITY_MAX_LIMIT, SIMILARITY_UPLOAD_TIMEOUT, QUERY_IMAGE_MAX_BYTES
 
 router = APIRouter()
+image_similarity = ImageSimilarity()
+face_search = FaceSearch()
+
+
+async def read_query_image(file: UploadFile) -> bytes:
+    """
+    Reads an image file uploaded as a search query, up to QUERY_IMAGE_MAX_BYTES.
+
+    :param file: The uploaded file.
+    :return: The contents of the file.
+    :raises query_image_too_large_exception: If the file is larger than QUERY_IMAGE_MAX_BYTES.
+    """
+    contents = await file.read(QUERY_IMAGE_MAX_BYTES + 1)
+    if len(contents) > QUERY_IMAGE_MAX_BYTES:
+        raise query_image_too_large_exception
+    return contents
 
 
 @router.post("/process-images")
@@ -94,17 +116,110 @@ async def find_similar_images_api(data: SimilarImagesData):
     :return: A list of similar images.
     :rtype: dict
     """
-    if data.limit < 1:
+    if data.limit < 1 or data.limit > SIMILARITY_MAX_LIMIT:
+        raise invalid_limit_exception
+
+    similar_images = await image_similarity.find_similar_images(data.image_id, data.limit)
+    if not similar_images:
+        raise find_similar_images_exception
+
+    return {"similar_images": similar_images}
+
+
+@router.post("/find-similar-to-upload")
+async def find_similar_to_upload_api(image: UploadFile = File(...), limit: int = Form(10), current_user: User = Depends(get_current_user)):
+    """
+    Find library images similar to an uploaded image, without saving the uploaded image.
+
+    :param image: The image to find similar images for.
+    :type image: UploadFile
+    :param limit: The maximum number of similar images to return.
+    :type limit: int
+    :param current_user: The user performing the search.
+    :type current_user: User
+    :return: A list of similar images.
+    :rtype: dict
+    """
+    if limit < 1 or limit > SIMILARITY_MAX_LIMIT:
         raise invalid_limit_exception
 
-    similarity = ImageSimilarity()
-    similar_images = await similarity.find_similar_images(data.image_id, data.limit)
+    contents = await read_query_image(image)
+    deadline = time.monotonic() + SIMILARITY_UPLOAD_TIMEOUT
+    try:
+        similar_images = await asyncio.wait_for(
+            image_similarity.find_similar_to_upload(contents, limit, deadline), SIMILARITY_UPLOAD_TIMEOUT)
+    except (asyncio.TimeoutError, TimeoutError):
+        raise similarity_search_timeout_exception
+
+    if similar_images is None:
+        raise invalid_image_exception
     if not similar_images:
         raise find_similar_images_exception
 
     return {"similar_images": similar_images}
 
 
+@router.post("/find-by-face")
+async def find_by_face_api(image_id: Optional[str] = Form(None), face_index: Optional[int] = Form(None),
+                           face: Optional[UploadFile] = File(None), limit: int = Form(20),
+                           current_user: User = Depends(get_current_user)):
+    """
+    Find images containing a face, given either as a detected face of an image or as an uploaded face crop.
+
+    :param image_id: The ID of the image containing the face.
+    :type image_id: Optional[str]
+    :param face_index: The position of the face among the faces of the image.
+    :type face_index: Optional[int]
+    :param face: An uploaded face crop, used instead of an image ID and face index.
+    :type face: Optional[UploadFile]
+    :param limit: The maximum number of images to return.
+    :type limit: int
+    :param current_user: The user performing the search.
+    :type current_user: User
+    :return: A list of images containing the face, closest match first.
+    :rtype: dict
+    """
+    if limit < 1 or limit > SIMILARITY_MAX_LIMIT:
+        raise invalid_limit_exception
+
+    if face is not None:
+        images = await face_search.find_by_face_crop(await read_query_image(face), limit)
+        if images is None:
+            raise invalid_image_exception
+    elif image_id is not None and face_index is not None:
+        images = await face_search.find_by_face(image_id, face_index, limit)
+        if images is None:
+            raise face_not_found_exception
+    else:
+        raise no_face_query_exception
+
+    return {"images": images}
+
+
+@router.get("/duplicate-groups")
+async def duplicate_groups_api(skip: int = 0, limit: int = 20, current_user: User = Depends(get_current_user)):
+    """
+    List groups of near-duplicate images found by the periodic duplicate grouping job, largest first.
+
+    :param skip: The number of groups to skip.
+    :type skip: int
+    :param limit: The maximum number of groups to return.
+    :type limit: int
+    :param current_user: The user requesting the groups.
+    :type current_user: User
+    :return: A list of groups with their images.
+    :rtype: dict
+    """
+    if skip < 0 or limit < 1 or limit > SIMILARITY_MAX_LIMIT:
+        raise invalid_limit_exception
+
+    groups = await get_duplicate_groups(skip, limit)
+    if groups is None:
+        raise get_duplicate_groups_exception
+
+    return {"groups": groups}
+
+
 @router.post("/scrape-images")
 async def scrape_images_api(data: ScrapeImagesData, current_user: User = Depends(get_current_user)):
     """
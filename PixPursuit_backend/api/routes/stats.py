@@ -0,0 +1,88 @@
+"""
+api/routes/stats.py
+
+Defines routes reporting statistics of background jobs and caches, such as the periodic auto tags refresh
+the similar image search cache and password hashing, and the application metrics scraped by Prometheus.
+"""
+
+import hmac
+from fastapi import APIRouter, Depends, Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST
+from services.authentication.auth import get_current_user
+from services.tag_prediction.refresh_stats import get_refresh_stats
+from services.similarity_cache import get_similarity_cache_stats
+from services.authentication.password_hashing import get_password_hashing_stats
+from api.schemas.auth_schema import User
+from utils.constants import METRICS_TOKEN
+from utils.exceptions import get_stats_exception, credentials_exception
+from utils.metrics import render_metrics
+
+router = APIRouter()
+
+
+@router.get("/auto-tags-stats")
+async def auto_tags_stats_api(current_user: User = Depends(get_current_user)):
+    """
+    Get statistics of the last auto tags refresh, including how many images were skipped as up to date.
+
+    :param current_user: The user requesting the statistics.
+    :type current_user: User
+    :return: The statistics of the last auto tags refresh, empty if no refresh has run yet.
+    :rtype: dict
+    """
+    stats = await get_refresh_stats()
+    if stats is None:
+        raise get_stats_exception
+
+    return stats
+
+
+@router.get("/similarity-cache-stats")
+async def similarity_cache_stats_api(current_user: User = Depends(get_current_user)):
+    """
+    Get the hit rate and latency statistics of the similar image search cache.
+
+    :param current_user: The user requesting the statistics.
+    :type current_user: User
+    :return: The number of lookups, the hit rate, and the lookups and average latency of each cache tier.
+    :rtype: dict
+    """
+    stats = await get_similarity_cache_stats()
+    if stats is None:
+        raise get_stats_exception
+
+    return stats
+
+
+@router.get("/password-hashing-stats")
+async def password_hashing_stats_api(current_user: User = Depends(get_current_user)):
+    """
+    Get the queueing statistics of password hashing and verification.
+
+    :param current_user: The user requesting the statistics.
+    :type current_user: User
+    :return: The number of operations and their average time queued and running, the number of rejected
+        operations, and the operations currently queued and running.
+    :rtype: dict
+    """
+    stats = await get_password_hashing_stats()
+    if stats is None:
+        raise get_stats_exception
+
+    return stats
+
+
+@router.get("/metrics")
+async def metrics_api(request: Request):
+    """
+    Get the application metrics of the API and the Celery workers in the Prometheus text format.
+
+    :param request: The scrape request, carrying the METRICS_TOKEN bearer token if one is configured.
+    :type request: Request
+    :return: The rendered metrics.
+    :rtype: Response
+    """
+    if METRICS_TOKEN and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}"):
+        raise credentials_exception
+
+    return Response(content=await render_metrics(), media_type=CONTENT_TYPE_LATEST)
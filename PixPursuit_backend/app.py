@@ -10,10 +10,13 @@ Modules:
 - api.routes: Contains all the route modules for the application.
 - api.middleware: Contains all the middleware modules for the application.
 
-The application uses the FastAPI framework and sets up CORS middleware to allow requests from any origin. It also includes several routers for handling different types of requests, such as authentication, image handling, album management, content management, and downloads.
+The application uses the FastAPI framework and sets up CORS middleware to allow requests from any origin. It also includes several routers for handling different types of requests, such as authentication, image handling, album management, content management, downloads, and background job statistics.
 
 The application also sets up a Celery task queue and automatically discovers tasks in the 'services' and 'data' modules.
 
+On startup, the database indexes the application's queries rely on are created, and albums created before the
+materialized album hierarchy are migrated before any request is served.
+
 The LoggingMiddleware is added to the application to handle request and response logging.
 
 If the script is run directly, it starts an Uvicorn server on host 0.0.0.0 and port 8000.
@@ -21,16 +24,32 @@ If the script is run directly, it starts an Uvicorn server on host 0.0.0.0 and p
 This file is part of the PixPursuit project and is responsible for setting up and running the main application.
 """
 
+import asyncio
 from fastapi import FastAPI
 from config.celery_config import celery
 from fastapi.middleware.cors import CORSMiddleware
-from api.routes import auth, albums, content, download, images
+from api.routes import auth, albums, content, download, images, stats
 from api.middleware import LoggingMiddleware
+from config.logging_config import setup_logging
+from data.databases.mongodb.async_db.database_tools import create_indexes, has_albums_without_ancestors
+from data.databases.mongodb.sync_db.celery_database_tools import update_album_ancestors
+
+logger = setup_logging(__name__)
 
 app = FastAPI()
 
 celery.autodiscover_tasks(['services', 'data'])
 
+
+@app.on_event("startup")
+async def startup():
+    await create_indexes()
+    if await has_albums_without_ancestors():
+        # Subtree queries rely on the ancestors of albums, so they are migrated before any request is served
+        migrated = await asyncio.get_running_loop().run_in_executor(None, update_album_ancestors)
+        logger.info(f"Migrated ancestors of {migrated} albums")
+
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -44,6 +63,7 @@ app.include_router(images.router)
 app.include_router(albums.router)
 app.include_router(content.router)
 app.include_router(download.router)
+app.include_router(stats.router)
 app.add_middleware(LoggingMiddleware)
 
 if __name__ == "__main__":
@@ -0,0 +1,173 @@
+"""
+benchmarks/bench_bulk_tagging.py
+
+Round-trips and wall time of tagging a whole album tree, comparing the former per-album recursion with a
+bulk_write per image against the set-based tagging in database_tools: the subtree resolved with a single query
+on the ancestors of the albums, then one update_many per tag over the images not carrying it yet. Round-trips are
+counted with a command listener on the client.
+
+The benchmark seeds a throwaway database with an album tree of the given depth and fan-out, spreads the images
+over its albums, and drops the database afterwards.
+
+With --mock, the benchmark runs against an in-process mongomock database instead of a server, counting the
+collection calls of the tagging as round-trips. Its wall times only reflect mongomock, not a server.
+
+Usage:
+    python -m benchmarks.bench_bulk_tagging --uri mongodb://localhost:27017 --images 5000 --depth 4 --fanout 3
+    python -m benchmarks.bench_bulk_tagging --mock
+"""
+
+import argparse
+import time
+from bson import ObjectId
+from pymongo import MongoClient, UpdateOne, monitoring
+
+TAGS = ['campus', 'event', 'graduation']
+
+
+class CommandCounter(monitoring.CommandListener):
+    """
+    Counts the commands sent to the server.
+    """
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        self.count += 1
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        pass
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        pass
+
+
+class CountingDatabase:
+    """
+    Wraps a mongomock database so that every collection call counts as a command sent to the server.
+    """
+    def __init__(self, db, counter: CommandCounter):
+        self.db = db
+        self.name = db.name
+        self.counter = counter
+
+    def __getattr__(self, name: str):
+        return CountingCollection(getattr(self.db, name), self.counter)
+
+
+class CountingCollection:
+    """
+    Wraps a mongomock collection, counting each method call.
+    """
+    def __init__(self, collection, counter: CommandCounter):
+        self.collection = collection
+        self.counter = counter
+
+    def __getattr__(self, name: str):
+        method = getattr(self.collection, name)
+
+        def counted(*args, **kwargs):
+            self.counter.count += 1
+            return method(*args, **kwargs)
+        return counted
+
+
+def seed(db, images: int, depth: int, fanout: int) -> ObjectId:
+    """
+    Creates an album tree and spreads the images evenly over its albums.
+
+    :param db: The benchmark database.
+    :param images: The number of images.
+    :param depth: The number of levels below the top album.
+    :param fanout: The number of sub-albums of each album.
+    :return: The ID of the top album.
+    """
+    top_id = db.albums.insert_one({'name': 'Benchmark album', 'parent': None, 'ancestors': [], 'sons': [],
+                                   'images': []}).inserted_id
+    album_ids, level = [top_id], [top_id]
+    for _ in range(depth):
+        next_level = []
+        for parent_id in level:
+            ancestors = db.albums.find_one({'_id': parent_id}, ['ancestors'])['ancestors'] + [str(parent_id)]
+            sons = db.albums.insert_many([{'name': 'Sub-album', 'parent': str(parent_id), 'ancestors': ancestors,
+                                           'sons': [], 'images': []} for _ in range(fanout)]).inserted_ids
+            db.albums.update_one({'_id': parent_id}, {'$set': {'sons': [str(son) for son in sons]}})
+            next_level.extend(sons)
+        album_ids.extend(next_level)
+        level = next_level
+
+    documents = [{'album_id': album_ids[i % len(album_ids)], 'user_tags': ['campus']} for i in range(images)]
+    image_ids = db.images.insert_many(documents).inserted_ids
+    db.albums.bulk_write([
+        UpdateOne({'_id': album_id}, {'$set': {'images': [str(image_id) for image_id in image_ids[i::len(album_ids)]]}})
+        for i, album_id in enumerate(album_ids)
+    ])
+    return top_id
+
+
+def tag_recursively(db, album_id: ObjectId) -> None:
+    """
+    Tags an album tree the former way: one query and one tag count update per album, and one bulk_write per image.
+    """
+    album = db.albums.find_one({'_id': album_id}, ['images', 'sons'])
+    for image_id in album['images']:
+        db.images.bulk_write([UpdateOne({'_id': ObjectId(image_id)}, {'$addToSet': {'user_tags': tag}})
+                              for tag in TAGS])
+    if album['images']:
+        db.tags.bulk_write([UpdateOne({'name': tag}, {'$inc': {'count': len(album['images'])}}, upsert=True)
+                            for tag in TAGS], ordered=False)
+    for son_id in album['sons']:
+        tag_recursively(db, ObjectId(son_id))
+
+
+def tag_set_based(db, album_id: ObjectId) -> None:
+    """
+    Tags an album tree the way add_tags_to_albums does.
+    """
+    albums = db.albums.find({'$or': [{'_id': album_id}, {'ancestors': str(album_id)}]}, ['images'])
+    image_ids = [ObjectId(image_id) for album in albums for image_id in album['images']]
+
+    deltas = {}
+    for tag in TAGS:
+        result = db.images.update_many({'_id': {'$in': image_ids}, 'user_tags': {'$ne': tag}},
+                                       {'$addToSet': {'user_tags': tag}})
+        deltas[tag] = result.modified_count
+    db.tags.bulk_write([UpdateOne({'name': tag}, {'$inc': {'count': delta}}, upsert=True)
+                        for tag, delta in deltas.items() if delta > 0], ordered=False)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uri', default='mongodb://localhost:27017')
+    parser.add_argument('--images', type=int, default=5000)
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--fanout', type=int, default=3)
+    parser.add_argument('--mock', action='store_true', help='run against mongomock instead of a server')
+    args = parser.parse_args()
+
+    counter = CommandCounter()
+    if args.mock:
+        import mongomock
+        client = mongomock.MongoClient()
+        db = CountingDatabase(client.pixpursuit_tagging_benchmark, counter)
+    else:
+        client = MongoClient(args.uri, event_listeners=[counter])
+        db = client.pixpursuit_tagging_benchmark
+    try:
+        print(f"{'strategy':<16}{'round-trips':>14}{'seconds':>10}")
+        for name, tag in [('recursive', tag_recursively), ('set-based', tag_set_based)]:
+            client.drop_database(db.name)
+            db.albums.create_index('ancestors')
+            top_id = seed(db, args.images, args.depth, args.fanout)
+            counter.count = 0
+            start = time.perf_counter()
+            tag(db, top_id)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<16}{counter.count:>14}{elapsed:>10.2f}")
+    finally:
+        client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+benchmarks/bench_middleware.py
+
+Throughput of a small endpoint behind the request logging middleware, comparing the former BaseHTTPMiddleware
+writing straight to a RotatingFileHandler with the pure ASGI LoggingMiddleware logging through the log queue.
+Requests are sent in process over ASGI, so the numbers reflect the middleware and logging overhead only.
+
+Usage:
+    python -m benchmarks.bench_middleware --requests 5000 --concurrency 1 16
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+import httpx
+from fastapi import FastAPI
+from starlette.middleware.base import BaseHTTPMiddleware
+from api.middleware import LoggingMiddleware
+
+
+def make_base_http_middleware(logger: logging.Logger) -> type:
+    """
+    Builds the former request logging middleware, based on BaseHTTPMiddleware.
+
+    :param logger: The logger to log requests to.
+    :return: The middleware class.
+    """
+    class BaseLoggingMiddleware(BaseHTTPMiddleware):
+        async def dispatch(self, request, call_next):
+            response = await call_next(request)
+            logger.info(f"Request: {request.method} {request.url.path}")
+            return response
+
+    return BaseLoggingMiddleware
+
+
+def make_app(middleware: type) -> FastAPI:
+    """
+    Builds an app with a single small endpoint, like /add-view.
+
+    :param middleware: The middleware class to add.
+    :return: The app.
+    """
+    app = FastAPI()
+
+    @app.post("/add-view")
+    async def add_view():
+        return {"message": "View added successfully"}
+
+    app.add_middleware(middleware)
+    return app
+
+
+async def run(app: FastAPI, requests: int, concurrency: int) -> float:
+    """
+    Sends requests to the app from concurrent clients.
+
+    :param app: The app.
+    :param requests: The total number of requests.
+    :param concurrency: The number of concurrent clients.
+    :return: The throughput in requests per second.
+    """
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        async def worker(count: int):
+            for _ in range(count):
+                await client.post("/add-view")
+
+        await worker(50)  # Warm up
+        started_at = time.perf_counter()
+        await asyncio.gather(*(worker(requests // concurrency) for _ in range(concurrency)))
+        return requests // concurrency * concurrency / (time.perf_counter() - started_at)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16])
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    file_logger = logging.getLogger('bench.file')
+    file_logger.setLevel(logging.INFO)
+    file_logger.propagate = False
+    file_logger.addHandler(RotatingFileHandler(os.path.join(directory, 'bench.log'),
+                                               maxBytes=1000000000, backupCount=5))
+
+    apps = {
+        'BaseHTTPMiddleware + file handler': make_app(make_base_http_middleware(file_logger)),
+        'ASGI middleware + log queue': make_app(LoggingMiddleware),
+    }
+    for concurrency in args.concurrency:
+        for name, app in apps.items():
+            throughput = asyncio.run(run(app, args.requests, concurrency))
+            print(f"concurrency {concurrency:3d}  {name:36s} {throughput:8.0f} req/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""
+benchmarks/bench_projections.py
+
+Micro-benchmark comparing full-document reads with the projected reads used by the hot callers in
+database_tools (zip building, image record creation, tag removal, likes). It measures the BSON bytes
+returned per call and the per-call latency against a local MongoDB instance.
+
+The benchmark seeds a throwaway database with synthetic documents shaped like production images and
+albums, both in the legacy layout (vectors embedded as lists of doubles) and in the current layout
+(vectors in a separate collection), and drops it afterwards.
+
+With --bytes-only, no server is needed: the projections are applied to the synthetic documents in-process
+and only the BSON bytes per call are reported, which are the same bytes a server returns.
+
+Usage:
+    python -m benchmarks.bench_projections --uri mongodb://localhost:27017 --images 2000 --calls 500
+    python -m benchmarks.bench_projections --bytes-only
+"""
+
+import argparse
+import random
+import statistics
+import time
+import bson
+from bson import ObjectId
+from pymongo import MongoClient
+
+FEATURES_SIZE = 1000
+EMBEDDING_SIZE = 512
+
+
+def make_image(album_id: str, legacy: bool) -> dict:
+    """
+    Builds a synthetic image document.
+
+    :param album_id: The album the image belongs to.
+    :param legacy: Whether to embed the vectors as lists of doubles, as documents did before the vectors split.
+    :return: The image document.
+    """
+    num_faces = random.randint(0, 4)
+    image = {
+        'image_url': 'https://example.com/pixpursuit/20240101000000_abcdef.jpeg',
+        'thumbnail_url': 'https://example.com/pixpursuit/thumbnail20240101000000_abcdef.jpeg',
+        'filename': '20240101000000_abcdef.jpeg',
+        'embeddings_box': [[10.0, 20.0, 110.0, 140.0] for _ in range(num_faces)],
+        'metadata': {'ImageWidth': 4000, 'ImageLength': 3000, 'DateTime': '2024-01-01'},
+        'user_tags': ['campus', 'event'],
+        'auto_tags': ['people'],
+        'user_faces': ['anon-1'] * num_faces,
+        'auto_faces': [-1] * num_faces,
+        'backlog_faces': ['anon-1'] * num_faces,
+        'unknown_faces': 0,
+        'feedback': {'people': {'positive': 1, 'negative': 0}},
+        'feedback_history': {},
+        'description': "",
+        'likes': 3,
+        'liked_by': ['user1', 'user2', 'user3'],
+        'views': 42,
+        'added_by': 'user1',
+        'album_id': album_id,
+        'album_name': 'Benchmark album'
+    }
+    if legacy:
+        image['features'] = [[random.random() for _ in range(FEATURES_SIZE)]]
+        image['embeddings'] = [[random.random() for _ in range(EMBEDDING_SIZE)] for _ in range(num_faces)]
+    return image
+
+
+def measure(call: callable, ids: list, calls: int) -> tuple[float, float]:
+    """
+    Runs a read callable repeatedly and measures returned bytes and latency.
+
+    :param call: A callable taking a document ID and returning the read document.
+    :param ids: The document IDs to sample from.
+    :param calls: The number of calls to make.
+    :return: A tuple of the mean bytes per call and the median latency in microseconds.
+    """
+    sizes, latencies = [], []
+    for _ in range(calls):
+        doc_id = random.choice(ids)
+        start = time.perf_counter()
+        document = call(doc_id)
+        latencies.append((time.perf_counter() - start) * 1e6)
+        sizes.append(len(bson.encode(document)) if document else 0)
+    return statistics.mean(sizes), statistics.median(latencies)
+
+
+def project(document: dict, fields: list[str] or None) -> dict:
+    """
+    Applies an inclusion projection to a document the way the server does.
+
+    :param document: The document.
+    :param fields: The projected fields, or None for the full document.
+    :return: The projected document.
+    """
+    if fields is None:
+        return document
+    return {key: value for key, value in document.items() if key == '_id' or key in fields}
+
+
+def main_bytes_only(images: int) -> None:
+    """
+    Reports the BSON bytes per call of each case without a server.
+
+    :param images: The number of synthetic images of each layout.
+    """
+    album_id = ObjectId()
+    album = {'_id': album_id, 'name': 'Benchmark album', 'parent': None, 'sons': [], 'images': []}
+    legacy_images = [dict(make_image(str(album_id), legacy=True), _id=ObjectId()) for _ in range(images)]
+    current_images = [dict(make_image(str(album_id), legacy=False), _id=ObjectId()) for _ in range(images)]
+    album['images'] = [str(image['_id']) for image in current_images]
+
+    cases = [
+        ('zip: filename (legacy, full)', legacy_images, None),
+        ('zip: filename (full)', current_images, None),
+        ('zip: filename (projected)', current_images, ['filename']),
+        ('likes re-read (legacy, full)', legacy_images, None),
+        ('likes re-read (projected)', current_images, ['likes']),
+        ('album name (full)', [album], None),
+        ('album name (projected)', [album], ['name']),
+    ]
+
+    print(f"{'case':<32}{'bytes/call':>12}")
+    for name, documents, fields in cases:
+        size = statistics.mean(len(bson.encode(project(document, fields))) for document in documents)
+        print(f"{name:<32}{size:>12.0f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uri', default='mongodb://localhost:27017')
+    parser.add_argument('--images', type=int, default=2000)
+    parser.add_argument('--calls', type=int, default=500)
+    parser.add_argument('--bytes-only', action='store_true', help='report bytes per call without a server')
+    args = parser.parse_args()
+
+    if args.bytes_only:
+        main_bytes_only(args.images)
+        return
+
+    client = MongoClient(args.uri)
+    db = client.pixpursuit_projection_benchmark
+    try:
+        album_id = db.albums.insert_one({'name': 'Benchmark album', 'parent': None, 'sons': [],
+                                         'images': []}).inserted_id
+        legacy_ids = db.legacy_images.insert_many(
+            [make_image(str(album_id), legacy=True) for _ in range(args.images)]).inserted_ids
+        image_ids = db.images.insert_many(
+            [make_image(str(album_id), legacy=False) for _ in range(args.images)]).inserted_ids
+        db.albums.update_one({'_id': album_id}, {'$set': {'images': [str(i) for i in image_ids]}})
+
+        cases = [
+            ('zip: filename (legacy, full)', lambda i: db.legacy_images.find_one({'_id': i}), legacy_ids),
+            ('zip: filename (full)', lambda i: db.images.find_one({'_id': i}), image_ids),
+            ('zip: filename (projected)', lambda i: db.images.find_one({'_id': i}, ['filename']), image_ids),
+            ('likes re-read (legacy, full)', lambda i: db.legacy_images.find_one({'_id': i}), legacy_ids),
+            ('likes re-read (projected)', lambda i: db.images.find_one({'_id': i}, ['likes']), image_ids),
+            ('album name (full)', lambda i: db.albums.find_one({'_id': i}), [album_id]),
+            ('album name (projected)', lambda i: db.albums.find_one({'_id': i}, ['name']), [album_id]),
+        ]
+
+        print(f"{'case':<32}{'bytes/call':>12}{'median us':>12}")
+        for name, call, ids in cases:
+            size, latency = measure(call, ids, args.calls)
+            print(f"{name:<32}{size:>12.0f}{latency:>12.0f}")
+    finally:
+        client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
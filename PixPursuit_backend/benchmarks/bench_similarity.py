@@ -0,0 +1,124 @@
+"""
+benchmarks/bench_similarity.py
+
+Benchmark of the two-stage similar image search in services/similarity_index.py. It measures the build time
+and memory of the index, the per-query latency for several result limits, and the ranking quality of the
+multi-signal re-ranker compared with ranking by features alone.
+
+The benchmark runs on a synthetic collection: images belong to hidden subjects, and every signal is a noisy
+view of the subject. Features are a subject centroid plus heavy noise; tags, faces, albums and uploaders are
+drawn mostly from the subject's own pools. An image counts as relevant to a query if it shares its subject,
+and ranking quality is reported as precision@k.
+
+Usage:
+    python -m benchmarks.bench_similarity --images 20000 --queries 200
+"""
+
+import argparse
+import random
+import statistics
+import time
+import numpy as np
+from bson import ObjectId
+from services.similarity_index import SimilarityIndex
+from utils.constants import WEIGHTS
+from utils.vector_codec import encode_vector
+
+FEATURES_SIZE = 1000
+LIMITS = (10, 50, 100)
+
+
+def make_collection(images: int, subjects: int, noise: float, seed: int) -> tuple[list[dict], dict, list[int]]:
+    """
+    Builds synthetic image documents and feature vectors.
+
+    :param images: The number of images.
+    :param subjects: The number of hidden subjects.
+    :param noise: The standard deviation of the feature noise relative to the centroids.
+    :param seed: The random seed.
+    :return: A tuple of the image documents, their encoded features keyed by ID, and the subject of each image.
+    """
+    rng = np.random.default_rng(seed)
+    rand = random.Random(seed)
+    centroids = rng.standard_normal((subjects, FEATURES_SIZE)).astype(np.float32)
+    tag_pools = [[f"tag{s}_{i}" for i in range(8)] for s in range(subjects)]
+    face_pools = [[f"person{s}_{i}" for i in range(3)] for s in range(subjects)]
+    albums = [str(ObjectId()) for _ in range(subjects * 2)]
+    users = [f"user{i}" for i in range(20)]
+
+    def draw(pool: list, other: list, count: int, own: float) -> list:
+        return [rand.choice(pool) if rand.random() < own else rand.choice(rand.choice(other)) for _ in range(count)]
+
+    documents, features, labels = [], {}, []
+    for _ in range(images):
+        subject = rand.randrange(subjects)
+        image_id = ObjectId()
+        vector = centroids[subject] + noise * rng.standard_normal(FEATURES_SIZE).astype(np.float32)
+        documents.append({
+            '_id': image_id,
+            'thumbnail_url': f"https://example.com/{image_id}.jpg",
+            'user_tags': draw(tag_pools[subject], tag_pools, rand.randint(0, 3), 0.8),
+            'auto_tags': draw(tag_pools[subject], tag_pools, rand.randint(1, 5), 0.6),
+            'user_faces': draw(face_pools[subject], face_pools, rand.randint(0, 2), 0.8) + ['anon-1'],
+            'auto_faces': [subject * 3 + rand.randrange(3) if rand.random() < 0.5 else -1],
+            'album_id': albums[subject * 2 + rand.randrange(2)] if rand.random() < 0.7 else rand.choice(albums),
+            'added_by': users[subject % len(users)] if rand.random() < 0.5 else rand.choice(users)
+        })
+        features[image_id] = encode_vector(vector)
+        labels.append(subject)
+    return documents, features, labels
+
+
+def index_bytes(index: SimilarityIndex) -> int:
+    """
+    Estimates the memory held by the arrays of an index.
+
+    :param index: The index.
+    :return: The size in bytes.
+    """
+    size = index.features.nbytes
+    for matrix in index.sets.values():
+        size += matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+    size += sum(sizes.nbytes for sizes in index.set_sizes.values())
+    size += sum(codes.nbytes for codes in index.codes.values())
+    return size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=20000)
+    parser.add_argument('--subjects', type=int, default=200)
+    parser.add_argument('--noise', type=float, default=2.5)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    documents, features, labels = make_collection(args.images, args.subjects, args.noise, args.seed)
+    start = time.perf_counter()
+    index = SimilarityIndex.build(documents, features)
+    build_time = time.perf_counter() - start
+    print(f"index: {len(index)} images, built in {build_time:.2f} s, {index_bytes(index) / 2 ** 20:.1f} MiB")
+
+    rand = random.Random(args.seed)
+    query_ids = [index.ids[rand.randrange(len(index))] for _ in range(args.queries)]
+    features_only = {'features': WEIGHTS['features']}
+
+    print(f"{'k':>4}{'p50 ms':>10}{'p95 ms':>10}{'P@k features':>15}{'P@k reranked':>15}")
+    for limit in LIMITS:
+        latencies, precision_features, precision_reranked = [], [], []
+        for image_id in query_ids:
+            subject = labels[index.positions[image_id]]
+            start = time.perf_counter()
+            query = index.query_for(image_id)
+            reranked = index.search(query, limit, exclude=image_id)
+            latencies.append((time.perf_counter() - start) * 1000)
+            baseline = index.search(query, limit, exclude=image_id, weights=features_only)
+            precision_reranked.append(sum(labels[p] == subject for p, _ in reranked) / limit)
+            precision_features.append(sum(labels[p] == subject for p, _ in baseline) / limit)
+        latencies.sort()
+        print(f"{limit:>4}{statistics.median(latencies):>10.2f}{latencies[int(len(latencies) * 0.95) - 1]:>10.2f}"
+              f"{statistics.mean(precision_features):>15.3f}{statistics.mean(precision_reranked):>15.3f}")
+
+
+if __name__ == '__main__':
+    main()
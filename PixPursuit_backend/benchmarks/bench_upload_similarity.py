@@ -0,0 +1,142 @@
+"""
+benchmarks/bench_upload_similarity.py
+
+Load test of the search by upload path (/find-similar-to-upload) without the HTTP layer. Each request decodes
+an uploaded JPEG with decode_query_image, extracts its features with the ResNet50 feature model and searches
+a synthetic SimilarityIndex, with feature extraction serialized on a single thread as in ImageSimilarity.
+
+It reports the decode time at full and at reduced scale, and the end-to-end latency percentiles, throughput
+and share of requests over SIMILARITY_UPLOAD_TIMEOUT for several numbers of concurrent clients.
+
+Latency does not depend on the model weights, so --random-weights can be used where the pretrained weights
+cannot be downloaded.
+
+Usage:
+    python -m benchmarks.bench_upload_similarity --images 20000 --requests 40 --concurrency 1 2 4
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import numpy as np
+import torch
+from PIL import Image
+from torchvision import models
+from torchvision.models import ResNet50_Weights
+from benchmarks.bench_similarity import make_collection
+from config.models_config import get_feature_transform
+from services.similarity_index import SimilarityIndex
+from utils.constants import SIMILARITY_UPLOAD_TIMEOUT
+from utils.function_utils import decode_query_image
+
+
+def make_photo(width: int, height: int, seed: int) -> bytes:
+    """
+    Builds a photo-like JPEG: smooth gradients with mild noise, so it compresses like a real photo.
+
+    :param width: The width in pixels.
+    :param height: The height in pixels.
+    :param seed: The random seed.
+    :return: The JPEG bytes.
+    """
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 1, width, dtype=np.float32)
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    channels = [np.sin(6 * x + 4 * y + phase) for phase in rng.uniform(0, 6, 3)]
+    pixels = np.stack(channels, axis=-1) * 100 + 128 + rng.normal(0, 6, (height, width, 3))
+    buffer = BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def time_call(call: callable, repeats: int) -> float:
+    """
+    Measures the median duration of a call.
+
+    :param call: The call to measure.
+    :param repeats: The number of repetitions.
+    :return: The median duration in milliseconds.
+    """
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        call()
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
+
+
+async def run_load(search: callable, photo: bytes, requests: int, concurrency: int) -> tuple[list[float], float]:
+    """
+    Sends requests from a number of concurrent clients.
+
+    :param search: The coroutine function handling one request.
+    :param photo: The uploaded JPEG bytes.
+    :param requests: The total number of requests.
+    :param concurrency: The number of concurrent clients.
+    :return: A tuple of the request latencies in milliseconds and the wall time in seconds.
+    """
+    latencies = []
+    remaining = iter(range(requests))
+
+    async def client():
+        for _ in remaining:
+            start = time.perf_counter()
+            await search(photo)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    return latencies, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--random-weights', action='store_true')
+    args = parser.parse_args()
+
+    resnet = models.resnet50(weights=None if args.random_weights else ResNet50_Weights.DEFAULT).eval()
+    transform = get_feature_transform()
+    documents, features, _ = make_collection(args.images, 200, 2.5, 0)
+    index = SimilarityIndex.build(documents, features)
+    photo = make_photo(4000, 3000, 0)
+    print(f"cpu threads: {torch.get_num_threads()}, index: {len(index)} images, upload: {len(photo) / 2 ** 20:.1f} MiB")
+
+    def extract(contents: bytes) -> list[float]:
+        image = decode_query_image(contents)
+        with torch.no_grad():
+            return resnet(transform(image).unsqueeze(0)).tolist()
+
+    extract(photo)  # warm up
+    full = time_call(lambda: transform(Image.open(BytesIO(photo)).convert('RGB')), 5)
+    reduced = time_call(lambda: transform(decode_query_image(photo)), 5)
+    model = time_call(lambda: extract(photo), 5)
+    print(f"decode+transform full scale: {full:.1f} ms, reduced scale: {reduced:.1f} ms, "
+          f"decode+transform+model: {model:.1f} ms")
+
+    feature_executor = ThreadPoolExecutor(max_workers=1)
+    executor = ThreadPoolExecutor(max_workers=4)
+
+    async def search(contents: bytes) -> list:
+        loop = asyncio.get_running_loop()
+        vector = await loop.run_in_executor(feature_executor, extract, contents)
+        query = index.query_from({}, vector)
+        return await loop.run_in_executor(executor, index.search, query, args.limit)
+
+    print(f"{'clients':>8}{'p50 ms':>10}{'p95 ms':>10}{'req/s':>8}{'over SLO':>10}")
+    for concurrency in args.concurrency:
+        latencies, wall = asyncio.run(run_load(search, photo, args.requests, concurrency))
+        latencies.sort()
+        over = sum(latency > SIMILARITY_UPLOAD_TIMEOUT * 1000 for latency in latencies) / len(latencies)
+        print(f"{concurrency:>8}{statistics.median(latencies):>10.0f}{latencies[int(len(latencies) * 0.95) - 1]:>10.0f}"
+              f"{len(latencies) / wall:>8.1f}{over:>10.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -9,7 +9,9 @@ from celery import Celery
 from celery.schedules import crontab
 from utils.constants import (CELERY_BROKER_URL, CELERY_RESULT_BACKEND,
                              UPDATE_AUTO_TAGS_SCHEDULE, CLUSTER_FACES_SCHEDULE, BEAT_SCHEDULE_FILE_PATH,
-                             PREDICT_ALL_TAGS_TASK, GROUP_FACES_TASK)
+                             PREDICT_ALL_TAGS_TASK, GROUP_FACES_TASK, TRAIN_MODEL_SCHEDULE, TRAIN_MODEL_TASK,
+                             GROUP_DUPLICATES_SCHEDULE, GROUP_DUPLICATES_TASK, FLUSH_IMAGE_VIEWS_SCHEDULE,
+                             FLUSH_IMAGE_VIEWS_TASK)
 
 
 def make_celery(app_name=__name__) -> Celery:
@@ -37,6 +39,18 @@ def make_celery(app_name=__name__) -> Celery:
             'task': GROUP_FACES_TASK,
             'schedule': crontab(minute='0', hour=CLUSTER_FACES_SCHEDULE),
         },
+        'train-tag-predictor-every-5-minutes': {
+            'task': TRAIN_MODEL_TASK,
+            'schedule': crontab(minute=TRAIN_MODEL_SCHEDULE),
+        },
+        'group-duplicates-every-6-hours': {
+            'task': GROUP_DUPLICATES_TASK,
+            'schedule': crontab(minute='30', hour=GROUP_DUPLICATES_SCHEDULE),
+        },
+        'flush-image-views-every-minute': {
+            'task': FLUSH_IMAGE_VIEWS_TASK,
+            'schedule': crontab(minute=FLUSH_IMAGE_VIEWS_SCHEDULE),
+        },
     }
 
     # Save the schedule to a file
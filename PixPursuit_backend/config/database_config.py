@@ -11,6 +11,7 @@ from botocore.client import BaseClient
 from pymongo import MongoClient
 from botocore.config import Config
 from config.logging_config import setup_logging
+from utils.metrics import MongoCommandMetrics, instrument_space_client
 import boto3
 from utils.constants import (
     MONGODB_URI, DO_REGION, DO_SPACE_ENDPOINT,
@@ -28,9 +29,9 @@ def get_mongodb_client(async_mode: bool = True):
     :return: MongoDB client instance.
     """
     if async_mode:
-        return motor.motor_asyncio.AsyncIOMotorClient(MONGODB_URI)
+        return motor.motor_asyncio.AsyncIOMotorClient(MONGODB_URI, event_listeners=[MongoCommandMetrics()])
     else:
-        return MongoClient(MONGODB_URI)
+        return MongoClient(MONGODB_URI, event_listeners=[MongoCommandMetrics()])
 
 
 def retry_connection(connect: callable, attempts: int = 5, delay: int = 3):
@@ -64,7 +65,7 @@ def connect_to_mongodb(async_mode: bool = True):
     if client:
         logger.info(f"Successfully connected to MongoDB server - {'async' if async_mode else 'sync'} mode")
         return get_collections(client)
-    return None, None, None, None, None
+    return None, None, None, None, None, None
 
 
 def get_collections(client):
@@ -80,7 +81,8 @@ def get_collections(client):
         db.tags,
         db.faces,
         db.users,
-        db.albums
+        db.albums,
+        db.image_vectors
     )
 
 
@@ -99,6 +101,7 @@ def connect_to_space() -> BaseClient or None:
                                 aws_access_key_id=DO_SPACE_ACCESS_KEY,
                                 aws_secret_access_key=DO_SPACE_SECRET_KEY,
                                 config=config)
+        instrument_space_client(client)
         return client
     except Exception as e:
         logger.error(f"Failed to connect to Digital Ocean Space: {e}")
@@ -3,17 +3,78 @@ config/logging_config.py
 
 Establishes the logging configuration used across the application, setting up log file
 rotation, format, and log level. This module centralizes logging setup to ensure consistent
-logging behavior.
+logging behavior. Loggers hand their records to a queue, and a single background thread writes
+them to the rotating log file, so logging never blocks on file I/O in the calling thread. Forked
+children start their own queue and thread.
 """
 
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import os
+import queue
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from utils.constants import LOG_FILE_PATH, LOG_FORMAT
 
+_log_queue = None
+_listener = None
+_queue_handlers = []
+
+
+def _start_listener() -> None:
+    """
+    Creates the log queue and starts the thread writing its records to the rotating log file.
+    """
+    global _log_queue, _listener
+    handler = RotatingFileHandler(
+        LOG_FILE_PATH,
+        maxBytes=1000000000,  # 1GB
+        backupCount=5
+    )
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    _log_queue = queue.SimpleQueue()
+    _listener = QueueListener(_log_queue, handler, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop_listener() -> None:
+    """
+    Stops the listener of this process, flushing the records still queued.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _restart_listener_after_fork() -> None:
+    """
+    Gives a forked child, such as a Celery prefork worker, its own queue and listener. The child inherits the
+    queue of its parent but not the thread consuming it, so its records would otherwise never be written.
+    """
+    if _log_queue is None:
+        return
+    _start_listener()
+    for queue_handler in _queue_handlers:
+        queue_handler.queue = _log_queue
+
+
+def get_log_queue() -> queue.SimpleQueue:
+    """
+    Returns the queue log records are written to, starting the thread writing them to the log file on first use.
+
+    :return: The log queue.
+    """
+    if _log_queue is None:
+        _start_listener()
+        atexit.register(_stop_listener)  # Flushes the records still queued on exit
+        os.register_at_fork(after_in_child=_restart_listener_after_fork)
+    return _log_queue
+
 
 def setup_logging(name: str) -> logging.Logger:
     """
-    Configure and return a logger with a rotating file handler.
+    Configure and return a logger writing to the rotating log file through the log queue.
 
     :param name: Name of the logger to configure.
     :return: Configured logger instance.
@@ -21,15 +82,8 @@ def setup_logging(name: str) -> logging.Logger:
     logger = logging.getLogger(name)
     if not logger.hasHandlers():  # Check if the logger already has handlers
         logger.setLevel(logging.INFO)
-
-        handler = RotatingFileHandler(
-            LOG_FILE_PATH,
-            maxBytes=1000000000,  # 1GB
-            backupCount=5
-        )
-        formatter = logging.Formatter(LOG_FORMAT)
-        handler.setFormatter(formatter)
-
-        logger.addHandler(handler)
+        queue_handler = QueueHandler(get_log_queue())
+        _queue_handlers.append(queue_handler)
+        logger.addHandler(queue_handler)
 
     return logger
@@ -7,6 +7,20 @@ import torch
 logger = setup_logging(__name__)
 
 
+def get_feature_transform() -> transforms.Compose:
+    """
+    Return the transforms preparing images for the ResNet50 feature model.
+
+    :return: The transforms.
+    """
+    return transforms.Compose([
+        transforms.Resize(256),
+        transforms.CenterCrop(224),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+    ])
+
+
 def activate_feature_models() -> tuple[models.ResNet, transforms.Compose]:
     """
     Activate and return the pretrained ResNet50 model and its corresponding transforms.
@@ -17,12 +31,7 @@ def activate_feature_models() -> tuple[models.ResNet, transforms.Compose]:
     resnet = models.resnet50(weights=weights)
     resnet.eval()
 
-    transform = transforms.Compose([
-        transforms.Resize(256),
-        transforms.CenterCrop(224),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-    ])
+    transform = get_feature_transform()
     logger.info("Activated pretrained ResNet50 model")
     return resnet, transform
 
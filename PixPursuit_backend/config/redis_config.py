@@ -0,0 +1,23 @@
+"""
+config/redis_config.py
+
+Configures the Redis clients used for shared application state, such as the tag predictor training
+buffer, kept separately from the database used by Celery as its broker and result backend.
+"""
+
+import redis
+import redis.asyncio as aioredis
+from utils.constants import REDIS_URL
+
+
+def get_redis_client(async_mode: bool = True):
+    """
+    Create a Redis client instance.
+
+    :param async_mode: Flag to determine if the client should be asynchronous.
+    :return: Redis client instance.
+    """
+    if async_mode:
+        return aioredis.Redis.from_url(REDIS_URL)
+    else:
+        return redis.Redis.from_url(REDIS_URL)
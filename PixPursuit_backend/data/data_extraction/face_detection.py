@@ -5,15 +5,31 @@ from utils.constants import MIN_FACE_SIZE
 from config.logging_config import setup_logging
 from utils.constants import FACE_SIZE_THRESHOLD
 from torchvision import transforms
+from utils.vector_codec import encode_vector
+from utils.metrics import MODEL_INFERENCE
 
 logger = setup_logging(__name__)
 
 device, mtcnn, resnet = activate_face_models()
 
 
-def get_face_embeddings(image: Image) -> tuple[list[list[float]], list[list[int]], list[str]]:
+def get_face_embedding(face: Image) -> list[float]:
+    """
+    Compute the embedding of a face crop with the FaceNet model.
+
+    :param face: The face crop.
+    :return: The face embedding.
+    """
+    face_tensor = transforms.ToTensor()(face).unsqueeze(0).to(device)
+    with MODEL_INFERENCE.labels('facenet').time():
+        embedding = resnet(face_tensor)
+    return embedding.detach().cpu().numpy().flatten().tolist()
+
+
+def get_face_embeddings(image: Image, inserted_id: str = None) -> tuple[list[list[float]], list[list[int]], list[str]]:
     try:
-        boxes, _ = mtcnn.detect(image)
+        with MODEL_INFERENCE.labels('mtcnn').time():
+            boxes, _ = mtcnn.detect(image)
         if boxes is None:
             logger.info("No faces detected.")
             return [], [], []
@@ -28,9 +44,7 @@ def get_face_embeddings(image: Image) -> tuple[list[list[float]], list[list[int]
                     face = image.crop((box[0], box[1], box[2], box[3]))
                     if face.size[0] < MIN_FACE_SIZE or face.size[1] < MIN_FACE_SIZE:
                         continue
-                    face_tensor = transforms.ToTensor()(face).unsqueeze(0).to(device)
-                    embedding = resnet(face_tensor)
-                    embedding = embedding.detach().cpu().numpy().flatten().tolist()
+                    embedding = get_face_embedding(face)
 
                     boxes_list.append(box.tolist())
                     embeddings_list.append(embedding)
@@ -39,7 +53,8 @@ def get_face_embeddings(image: Image) -> tuple[list[list[float]], list[list[int]
                     continue
 
         if embeddings_list:
-            faces_records = [{"face_emb": emb, 'group': ""} for emb in embeddings_list]
+            faces_records = [{"face_emb": encode_vector(emb), 'group': "", 'image_id': inserted_id, 'face_index': idx}
+                             for idx, emb in enumerate(embeddings_list)]
             insert_many_faces(faces_records)
 
         return embeddings_list, boxes_list, user_faces_list
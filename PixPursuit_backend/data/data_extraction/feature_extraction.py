@@ -9,6 +9,7 @@ from config.models_config import activate_feature_models
 import torch
 from PIL import Image
 from config.logging_config import setup_logging
+from utils.metrics import MODEL_INFERENCE
 
 logger = setup_logging(__name__)
 
@@ -24,7 +25,7 @@ def extract_features(image: Image) -> list[float] or None:
     """
     try:
         image = transform(image).unsqueeze(0)
-        with torch.no_grad():
+        with torch.no_grad(), MODEL_INFERENCE.labels('resnet50').time():
             features = resnet(image)
 
         features.numpy()
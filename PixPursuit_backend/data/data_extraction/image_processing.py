@@ -4,42 +4,63 @@ data/data_extraction/image_processing.py
 Manages the complete workflow of image processing, including reading, transforming,
 extracting features, detecting faces, and saving the processed data to the database.
 It orchestrates the calls to various services and utilities to handle images uploaded
-by users.
+by users. Uploads are identified by a digest of the file's contents; an upload of a file that
+was already processed reuses the stored image and its extracted data instead of processing
+it again.
 """
 
+import hashlib
 from bson import ObjectId
 from data.databases.space_manager import SpaceManager
 from data.data_extraction.metadata_extraction import get_exif_data
 from data.data_extraction.face_detection import get_face_embeddings
+from data.databases.mongodb.sync_db.face_operations import insert_many_faces
 from data.data_extraction.feature_extraction import extract_features
+from data.data_extraction.perceptual_hashing import compute_dhash
 from PIL import Image, UnidentifiedImageError
 from fastapi import UploadFile
 from io import BytesIO
 from config.logging_config import setup_logging
-from data.databases.mongodb.async_db.database_tools import save_image_to_database
-from data.databases.mongodb.sync_db.celery_database_tools import add_field_to_image
+from data.databases.mongodb.async_db.database_tools import save_image_to_database, get_image_by_content_hash
+from data.databases.mongodb.sync_db.celery_database_tools import add_fields_to_image, save_image_vectors, \
+    get_image_vectors_sync, get_image_document_sync
+from data.databases.redis_db.redis_tools import bump_similarity_index_generation_sync, publish_face_index_update, \
+    publish_similarity_index_update_sync
 from services.tag_prediction.tag_prediction_tools import predict_and_update_tags
 import asyncio
 from utils.function_utils import image_to_byte_array
+from utils.vector_codec import encode_vector, encode_vectors, decode_vectors, vector_digest
 from celery import shared_task
 from utils.dirs import cleanup_dir
 import os
-from utils.constants import EXTRACT_DATA_TASK, MAIN_QUEUE
+from utils.constants import EXTRACT_DATA_TASK, REUSE_DATA_TASK, MAIN_QUEUE
 
 logger = setup_logging(__name__)
 
 SpaceManager = SpaceManager()
 
 
-async def read_image(file: UploadFile, size: tuple[int, int] = None) -> Image:
+def compute_content_hash(contents: bytes, size: tuple[int, int] = None) -> str:
     """
-    Asynchronously reads an image from an uploaded file and optionally resizes it.
+    Computes the digest identifying an uploaded file. Uploads resized to different sizes are stored
+    differently, so the size is part of the digest.
 
-    :param file: The uploaded file to read the image from.
+    :param contents: The contents of the uploaded file.
+    :param size: Optional tuple specifying the size to which the image is resized.
+    :return: The hex digest.
+    """
+    digest = hashlib.sha256(contents).hexdigest()
+    return f"{digest}:{size[0]}x{size[1]}" if size else digest
+
+
+async def read_image(contents: bytes, size: tuple[int, int] = None) -> Image:
+    """
+    Reads an image from the contents of an uploaded file and optionally resizes it.
+
+    :param contents: The contents of the uploaded file.
     :param size: Optional tuple specifying the size to which the image should be resized.
     :return: The PIL Image object, or None if an error occurs during reading or resizing.
     """
-    contents = await file.read()
     try:
         image = Image.open(BytesIO(contents))
         if size:
@@ -50,27 +71,26 @@ async def read_image(file: UploadFile, size: tuple[int, int] = None) -> Image:
         return None
 
 
-async def process_image(file: UploadFile, size: tuple[int, int] = None) -> tuple[str, str, str, dict] or None:
+async def process_image(contents: bytes, size: tuple[int, int] = None) -> tuple[tuple[str, str, str, dict], bytes] or None:
     """
     Processes an uploaded image file by reading, saving to cloud storage, and extracting EXIF data.
 
-    :param file: The uploaded file to process.
+    :param contents: The contents of the uploaded file to process.
     :param size: Optional tuple specifying the size to which the image should be resized.
-    :return: A tuple containing the image URL, thumbnail URL, filename, and EXIF data, or None if an error occurs.
+    :return: A tuple containing the image data (image URL, thumbnail URL, filename, and EXIF data) and the
+             image byte array used for data extraction, or None if an error occurs.
     """
     try:
-        image = await read_image(file, size)
+        image = await read_image(contents, size)
 
         image_byte_arr = await image_to_byte_array(image)
         image_url, thumbnail_url, filename = await SpaceManager.save_image_to_space(image)
         exif_data = await get_exif_data(image)
-
-        extract_data.delay(image_byte_arr, filename)
     except RuntimeError as e:
         logger.error(f"Runtime error occurred: {e}")
-        return None, None, None, None
+        return None
 
-    return image_url, thumbnail_url, filename, exif_data
+    return (image_url, thumbnail_url, filename, exif_data), image_byte_arr
 
 
 async def process_and_save_images(images: list[UploadFile], user: str, album_id: ObjectId or str, size: [int, int] = None) -> bool:
@@ -108,8 +128,24 @@ async def process_and_save_image(image: UploadFile, user: str, album_id: ObjectI
     :return: The ID of the saved image in the database, or None if an error occurs.
     """
     try:
-        result = await process_image(image, size)
-        inserted_id = await save_image_to_database(result, user, album_id)
+        contents = await image.read()
+        content_hash = compute_content_hash(contents, size)
+        source = await get_image_by_content_hash(content_hash, ['image_url', 'thumbnail_url', 'filename', 'metadata'])
+        if source:
+            data = (source['image_url'], source['thumbnail_url'], source['filename'], source['metadata'])
+            inserted_id = await save_image_to_database(data, user, album_id, content_hash)
+            if inserted_id:
+                reuse_extracted_data.delay(str(source['_id']), inserted_id)
+            return inserted_id
+
+        result = await process_image(contents, size)
+        if not result:
+            return None
+
+        data, image_byte_arr = result
+        inserted_id = await save_image_to_database(data, user, album_id, content_hash)
+        if inserted_id:
+            extract_data.delay(image_byte_arr, inserted_id)
         return inserted_id
     except Exception as e:
         logger.error(f"Failed to process and save image: {e}")
@@ -159,23 +195,73 @@ async def process_images_from_directory(directory: str, user: str, album_id: Obj
 
 
 @shared_task(name=EXTRACT_DATA_TASK, queue=MAIN_QUEUE)
-def extract_data(image_byte_arr: bytes, filename: str) -> None:
+def extract_data(image_byte_arr: bytes, inserted_id: str) -> None:
     """
         Extracts various types of data from an image and saves it to the database.
 
+        Feature vectors and face embeddings go to the vectors collection, the remaining
+        face data is stored on the image document.
+
         :param image_byte_arr: Byte array of the image to extract data from.
-        :param filename: The filename of the image.
+        :param inserted_id: The ID of the image document.
     """
     try:
         image = Image.open(BytesIO(image_byte_arr))
         image = image.convert("RGB")  # Convert image to RGB format
-        embeddings_list, boxes_list, user_faces_list = get_face_embeddings(image)  # Extract face embeddings
+        embeddings_list, boxes_list, user_faces_list = get_face_embeddings(image, inserted_id)  # Extract face embeddings
         features_list = extract_features(image)  # Extract image features
 
-        for name_of_data, data in zip(['embeddings', 'embeddings_box', 'user_faces', 'backlog_faces', 'features'],
-                                      [embeddings_list, boxes_list, user_faces_list, user_faces_list, features_list]):
-            add_field_to_image(name_of_data, data, filename)
+        features = encode_vector(features_list)
+        save_image_vectors(inserted_id, features, encode_vectors(embeddings_list))
+        if embeddings_list:
+            # Published only once the vectors are saved, so an index loaded in between sees the faces either way
+            publish_face_index_update(inserted_id, embeddings_list)
+        add_fields_to_image({
+            'features_digest': vector_digest(features),
+            'dhash': compute_dhash(image),
+            'embeddings_box': boxes_list,
+            'user_faces': user_faces_list,
+            'backlog_faces': user_faces_list
+        }, inserted_id)
+        publish_similarity_index_update_sync('add', [inserted_id])
+        bump_similarity_index_generation_sync()
     except RuntimeError as e:
         logger.error(f"Runtime error occurred: {e}")
         return
 
+
+@shared_task(name=REUSE_DATA_TASK, queue=MAIN_QUEUE)
+def reuse_extracted_data(source_id: str, inserted_id: str) -> None:
+    """
+    Copies the data extracted from an image to an image uploaded from the same file, in place of
+    extracting it again.
+
+    :param source_id: The ID of the processed image.
+    :param inserted_id: The ID of the image document to copy the data to.
+    """
+    try:
+        vectors = get_image_vectors_sync(source_id, ['features', 'embeddings'])
+        source = get_image_document_sync(source_id, ['features_digest', 'dhash', 'embeddings_box'])
+        if not vectors or not source:
+            logger.error(f"No extracted data found for image: {source_id}")
+            return
+
+        embeddings = vectors.get('embeddings', [])
+        save_image_vectors(inserted_id, vectors.get('features'), embeddings)
+        if embeddings:
+            insert_many_faces([{"face_emb": emb, 'group': "", 'image_id': inserted_id, 'face_index': idx}
+                               for idx, emb in enumerate(embeddings)])
+            publish_face_index_update(inserted_id, decode_vectors(embeddings))
+
+        user_faces_list = ["anon-1"] * len(embeddings)
+        add_fields_to_image({
+            'features_digest': source.get('features_digest'),
+            'dhash': source.get('dhash'),
+            'embeddings_box': source.get('embeddings_box', []),
+            'user_faces': user_faces_list,
+            'backlog_faces': user_faces_list
+        }, inserted_id)
+        publish_similarity_index_update_sync('add', [inserted_id])
+        bump_similarity_index_generation_sync()
+    except Exception as e:
+        logger.error(f"Error reusing extracted data of image {source_id}: {e}")
@@ -0,0 +1,27 @@
+"""
+data/data_extraction/perceptual_hashing.py
+
+Computes perceptual hashes of images. Unlike a digest of the file bytes, a perceptual hash changes little when
+an image is re-encoded, resized or slightly edited, so near-duplicate images have hashes within a small Hamming
+distance of each other.
+"""
+
+import numpy as np
+from PIL import Image
+from utils.constants import DHASH_SIZE
+
+
+def compute_dhash(image: Image, hash_size: int = DHASH_SIZE) -> str:
+    """
+    Computes the difference hash (dHash) of an image: the image is reduced to a grayscale grid of
+    hash_size rows and hash_size + 1 columns, and each bit records whether a cell is brighter than
+    its right neighbour.
+
+    :param image: The image to hash.
+    :param hash_size: The number of rows and bits per row of the hash.
+    :return: The hash as a hexadecimal string of hash_size ** 2 bits.
+    """
+    pixels = np.asarray(image.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    value = int(''.join('1' if bit else '0' for bit in bits), 2)
+    return f"{value:0{hash_size * hash_size // 4}x}"
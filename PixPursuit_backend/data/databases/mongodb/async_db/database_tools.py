@@ -2,41 +2,44 @@ from bson import ObjectId
 from config.database_config import connect_to_mongodb
 from config.logging_config import setup_logging
 from data.databases.space_manager import SpaceManager
+from data.databases.redis_db.redis_tools import bump_tag_vocabulary_version, bump_similarity_index_generation, \
+    buffer_image_view, publish_similarity_index_update
 from pymongo import UpdateOne
 from tenacity import retry, stop_after_attempt, wait_fixed
 from utils.function_utils import to_object_id
 from data.databases.mongodb.sync_db.face_operations import update_names
 from data.databases.mongodb.sync_db.face_operations import delete_faces_associated_with_images
+from services.authentication.user_cache import user_cache
 
 logger = setup_logging(__name__)
 
-images_collection, tags_collection, faces_collection, user_collection, album_collection = connect_to_mongodb()
+(images_collection, tags_collection, faces_collection, user_collection, album_collection,
+ vectors_collection) = connect_to_mongodb()
 SpaceManager = SpaceManager()
 
 
-async def get_image_record(data: tuple[str, str, str, dict],
-                           username: str, album_id: ObjectId or str) -> dict or None:
+async def get_image_record(data: tuple[str, str, str, dict], username: str, album_id: ObjectId or str,
+                           content_hash: str = None) -> dict or None:
     """
     Get the image record to be saved in the database.
 
     :param data: A tuple containing the image URL, thumbnail URL, filename, and EXIF data.
     :param username: The username of the user adding the image.
     :param album_id: The ID of the album to which the image belongs.
+    :param content_hash: The digest of the uploaded file, used to recognize re-uploads of the same file.
     :return: A dictionary containing the image record.
     """
     try:
         image_url, thumbnail_url, filename, exif_data = data
 
-        album_name = (await get_album(album_id))['name']
+        album_name = (await get_album(album_id, ['name']))['name']
 
         image_record = {
             'image_url': image_url,
             'thumbnail_url': thumbnail_url,
             'filename': filename,
-            'embeddings': [],
             'embeddings_box': [],
             'metadata': exif_data,
-            'features': [],
             'user_tags': [],
             'auto_tags': [],
             'user_faces': [],
@@ -53,6 +56,8 @@ async def get_image_record(data: tuple[str, str, str, dict],
             'album_id': str(album_id),
             'album_name': album_name
         }
+        if content_hash:
+            image_record['content_hash'] = content_hash
         return image_record
     except Exception as e:
         logger.error(f"Error getting image record: {e}")
@@ -60,13 +65,15 @@ async def get_image_record(data: tuple[str, str, str, dict],
 
 
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
-async def save_image_to_database(data: tuple[str, str, str, dict], username: str, album_id: ObjectId or str) -> str or None:
+async def save_image_to_database(data: tuple[str, str, str, dict], username: str, album_id: ObjectId or str,
+                                content_hash: str = None) -> str or None:
     """
     Save image data to the database.
 
     :param data: A tuple containing the image URL, thumbnail URL, filename, and EXIF data.
     :param username: The username of the user adding the image.
     :param album_id: The ID of the album to which the image belongs.
+    :param content_hash: The digest of the uploaded file.
     :return: The ID of the inserted image record.
     """
     try:
@@ -77,7 +84,7 @@ async def save_image_to_database(data: tuple[str, str, str, dict], username: str
             if not album_id:
                 return None
 
-        image_record = await get_image_record(data, username, album_id)
+        image_record = await get_image_record(data, username, album_id, content_hash)
         if not image_record:
             return None
 
@@ -109,9 +116,14 @@ async def create_album(album_name: str, parent_id: ObjectId or str = None) -> Ob
     if not parent_id:
         return None
 
+    parent = await get_album(parent_id, ['ancestors'])
+    if not parent:
+        return None
+
     new_album = {
         "name": album_name,
         "parent": str(parent_id),
+        "ancestors": parent.get('ancestors', []) + [str(parent_id)],
         "sons": [],
         "images": []
     }
@@ -129,61 +141,60 @@ async def create_album(album_name: str, parent_id: ObjectId or str = None) -> Ob
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
 async def add_tags_to_images(tags: list[str], inserted_ids: list[str]) -> bool:
     """
-    Add tags to images in the database.
+    Add tags to images in the database, with one update per tag over all the images.
+
     :param tags: A list of tags to add.
     :param inserted_ids: A list of image IDs to which to add the tags.
     :return: True if the tags were added successfully, False otherwise.
     """
-    for inserted_id in inserted_ids:
-        inserted_id = to_object_id(inserted_id)
-        if not inserted_id:
-            continue
-
-        if not tags:
-            return False
-
-        try:
-            tags = [tag for tag in tags if tag != '']
-
-            bulk_operations = [UpdateOne({'_id': inserted_id}, {'$addToSet': {'user_tags': tag}}) for tag in tags]
-            await images_collection.bulk_write(bulk_operations)
+    if not tags:
+        return False
 
-            await increment_tags_count(tags)
+    tags = list(dict.fromkeys(tag for tag in tags if tag != ''))
+    image_ids = list(dict.fromkeys(filter(None, (to_object_id(inserted_id) for inserted_id in inserted_ids))))
+    if not tags or not image_ids:
+        return True
 
-        except Exception as e:
-            logger.error(f"Error adding tags to image {inserted_id}: {e}")
-            continue
+    try:
+        deltas = {}
+        for tag in tags:
+            # Only matches images not tagged yet, so the modified count is exactly the change of the tag count
+            result = await images_collection.update_many(
+                {'_id': {'$in': image_ids}, 'user_tags': {'$ne': tag}},
+                {'$addToSet': {'user_tags': tag}}
+            )
+            deltas[tag] = result.modified_count
 
-    return True
+        await update_tags_count({tag: delta for tag, delta in deltas.items() if delta > 0})
+        await publish_similarity_index_update('update', image_ids)
+        return True
+    except Exception as e:
+        logger.error(f"Error adding tags to images: {e}")
+        return False
 
 
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
 async def add_tags_to_albums(tags: list[str], album_ids: list[str]) -> bool:
     """
-    Add tags to albums in the database.
+    Add tags to all images in albums and in their sub-albums.
 
     :param tags: A list of tags to add.
     :param album_ids: A list of album IDs to which to add the tags.
     :return: True if the tags were added successfully, False otherwise.
     """
-    for album_id in album_ids:
-        try:
-            album = await get_album(album_id)
-            if not album:
-                continue
-
-            image_ids = album.get('images', [])
-            await add_tags_to_images(tags, image_ids)
-
-            sub_album_ids = album.get('sons', [])
-            if sub_album_ids:
-                await add_tags_to_albums(tags, sub_album_ids)
+    if not album_ids:
+        return True
 
-        except Exception as e:
-            logger.error(f"Error while adding tags to albums: {e}")
-            continue
+    try:
+        albums = await get_album_subtree(album_ids, ['images'])
+        image_ids = [image_id for album in albums for image_id in album.get('images', [])]
+        if not image_ids:
+            return True
 
-    return True
+        return await add_tags_to_images(tags, image_ids)
+    except Exception as e:
+        logger.error(f"Error while adding tags to albums: {e}")
+        return False
 
 
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
@@ -198,7 +209,7 @@ async def add_feedback(tag: str, is_positive: bool, user: str, inserted_id: Obje
     """
     try:
         inserted_id = to_object_id(inserted_id)
-        image_document = await get_image_document(inserted_id)
+        image_document = await get_image_document(inserted_id, ['feedback', 'feedback_history'])
         if not image_document:
             logger.error(f"No image found with ID: {str(inserted_id)}")
             return False
@@ -260,69 +271,71 @@ async def add_description(description: str, inserted_id: ObjectId or str) -> boo
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
 async def add_like(is_positive: bool, username: str, inserted_id: ObjectId or str) -> bool:
     """
-    Add a like to an image in the database.
+    Add a like to an image in the database, or remove it. The image is only updated if the user's like
+    changes, so the count of likes stays equal to the number of users who like the image.
 
     :param is_positive: Whether the like is positive or negative.
     :param username: The username of the user adding the like.
     :param inserted_id: The ID of the image to which to add the like.
-    :return: True if the like was added successfully, False otherwise.
+    :return: True if the image exists, False otherwise.
     """
     inserted_id = to_object_id(inserted_id)
     if not inserted_id:
         return False
 
     try:
-        update_result = await images_collection.update_one(
-            {'_id': inserted_id},
-            {'$inc': {'likes': 1 if is_positive else -1}}
-        )
-
-        image_document = await images_collection.find_one({'_id': inserted_id})
-        if image_document['likes'] < 0:
-            await images_collection.update_one(
-                {'_id': inserted_id},
-                {'$set': {'likes': 0}}
+        if is_positive:
+            update_result = await images_collection.update_one(
+                {'_id': inserted_id, 'liked_by': {'$ne': username}},
+                {'$addToSet': {'liked_by': username}, '$inc': {'likes': 1}}
+            )
+        else:
+            update_result = await images_collection.update_one(
+                {'_id': inserted_id, 'liked_by': username},
+                {'$pull': {'liked_by': username}, '$inc': {'likes': -1}}
             )
 
+        if update_result.modified_count == 0:
+            # The user's like did not change, which is only a success if the image exists
+            return await images_collection.count_documents({'_id': inserted_id}, limit=1) > 0
+
         operation = '$addToSet' if is_positive else '$pull'
         await user_collection.update_one(
             {'username': username},
             {operation: {'liked': str(inserted_id)}}
         )
-        await images_collection.update_one(
-            {'_id': inserted_id},
-            {operation: {'liked_by': username}}
-        )
+        user_cache.invalidate(username)
 
         logger.info(f"Successfully added like to image: {str(inserted_id)}")
-        return update_result.matched_count > 0 and update_result.modified_count > 0
+        return True
     except Exception as e:
         logger.error(f"Error updating likes: {e}")
         return False
 
 
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
 async def add_view(inserted_id: ObjectId or str) -> bool:
     """
-    Add a view to an image in the database.
+    Add a view to an image. Views are buffered in Redis and written to the database in bulk by the
+    flush_image_views task, so the stored count lags by up to a minute.
 
     :param inserted_id: The ID of the image to which to add the view.
-    :return: True if the view was added successfully, False otherwise.
+    :return: True if the view was added successfully, False otherwise, including if the image does not exist.
     """
     inserted_id = to_object_id(inserted_id)
     if not inserted_id:
         return False
 
     try:
-        update_result = await images_collection.update_one(
-            {'_id': inserted_id},
-            {'$inc': {'views': 1}}
-        )
-        return update_result.matched_count > 0 and update_result.modified_count > 0
+        # Only existing images are buffered, so unknown IDs cannot fill the buffer
+        if not await images_collection.count_documents({'_id': inserted_id}, limit=1):
+            logger.error(f"No image found with ID: {str(inserted_id)}")
+            return False
     except Exception as e:
-        logger.error(f"Error updating views: {e}")
+        logger.error(f"Error while adding view: {e}")
         return False
 
+    return await buffer_image_view(str(inserted_id))
+
 
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
 async def add_photos_to_album(image_ids: ObjectId or str, album_id: ObjectId or str) -> bool:
@@ -375,6 +388,7 @@ async def relocate_to_album(prev_album_id: ObjectId or str, new_album_id: Object
 
         if bulk_operations:
             await images_collection.bulk_write(bulk_operations)
+            await publish_similarity_index_update('update', image_ids)
 
         await add_photos_to_album(image_ids, new_album_id)
 
@@ -389,49 +403,41 @@ async def relocate_to_album(prev_album_id: ObjectId or str, new_album_id: Object
 
 
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
-async def delete_albums(album_ids: list[str], is_top_level: bool = True) -> bool:
+async def delete_albums(album_ids: list[str]) -> bool:
     """
-    Delete albums from the database.
+    Delete albums from the database, together with their sub-albums and all of their images.
 
     :param album_ids: A list of album IDs to delete.
-    :param is_top_level: Whether the album is root of the local tree.
     :return: True if the albums were deleted successfully, False otherwise.
     """
     all_deleted_successfully = True
-    for album_id in album_ids:
-        try:
-            album_id = to_object_id(album_id)
-            album = await get_album(album_id)
-            if not album:
+    try:
+        albums = await get_album_subtree(album_ids, ['images', 'parent'])
+        found_ids = {str(album['_id']) for album in albums}
+        for album_id in album_ids:
+            if album_id not in found_ids:
                 logger.error(f"No album found with ID: {album_id}")
                 all_deleted_successfully = False
-                continue
 
-            image_ids = album['images']
-            for image_id in image_ids:
-                delete_image_result = await delete_images([image_id])
-                if not delete_image_result:
-                    logger.error(f"Error deleting image {image_id} in album {album_id}")
-                    all_deleted_successfully = False
-                    continue
-
-            sub_album_ids = album['sons']
-            sub_delete_success = await delete_albums(sub_album_ids, is_top_level=False)
-            all_deleted_successfully = all_deleted_successfully and sub_delete_success
-
-            if is_top_level and album['parent']:
-                parent_id = to_object_id(album['parent'])
-                await album_collection.update_one(
-                    {'_id': parent_id},
-                    {'$pull': {'sons': str(album_id)}}
-                )
-
-            await album_collection.delete_one({'_id': album_id})
-            logger.info(f"Successfully deleted album: {album_id}")
-        except Exception as e:
-            logger.error(f"Error deleting album {album_id}: {e}")
+        image_ids = [image_id for album in albums for image_id in album['images']]
+        if image_ids and not await delete_images(image_ids):
+            logger.error(f"Error deleting images in albums {album_ids}")
             all_deleted_successfully = False
 
+        top_albums = [album for album in albums if str(album['_id']) in album_ids]
+        parent_ids = [to_object_id(album['parent']) for album in top_albums if album['parent']]
+        if parent_ids:
+            await album_collection.update_many(
+                {'_id': {'$in': parent_ids}},
+                {'$pull': {'sons': {'$in': [str(album['_id']) for album in top_albums]}}}
+            )
+
+        result = await album_collection.delete_many({'_id': {'$in': [album['_id'] for album in albums]}})
+        logger.info(f"Successfully deleted {result.deleted_count} albums")
+    except Exception as e:
+        logger.error(f"Error deleting albums {album_ids}: {e}")
+        all_deleted_successfully = False
+
     return all_deleted_successfully
 
 
@@ -444,10 +450,13 @@ async def delete_images(image_ids: list[str]) -> bool:
     :return: True if the images were deleted successfully, False otherwise.
     """
     all_deleted_successfully = True
+    tag_deltas = {}
+    deleted_ids = []
     for image_id in image_ids:
         try:
             image_id = to_object_id(image_id)
-            image_document = await get_image_document(image_id)
+            image_document = await get_image_document(image_id, ['user_tags', 'image_url', 'thumbnail_url',
+                                                                 'content_hash'])
             if not image_document:
                 logger.error(f"No image found with ID: {str(image_id)}")
                 all_deleted_successfully = False
@@ -459,23 +468,48 @@ async def delete_images(image_ids: list[str]) -> bool:
                 {},
                 {'$pull': {'liked': str(image_id)}}
             )
+            user_cache.invalidate()
 
             await album_collection.update_many({}, {"$pull": {"images": str(image_id)}})
 
-            await decrement_tags_count(image_document['user_tags'])
-
-            await SpaceManager.delete_image_from_space(image_document['image_url'])
-            await SpaceManager.delete_image_from_space(image_document['thumbnail_url'])
+            if not await is_image_shared(image_document):
+                await SpaceManager.delete_image_from_space(image_document['image_url'])
+                await SpaceManager.delete_image_from_space(image_document['thumbnail_url'])
             await images_collection.delete_one({"_id": image_id})
+            deleted_ids.append(image_id)
+
+            for tag in image_document['user_tags']:
+                tag_deltas[tag] = tag_deltas.get(tag, 0) - 1
 
             logger.info(f"Successfully deleted image: {str(image_id)}")
         except Exception as e:
             logger.error(f"Error deleting image {image_id}: {e}")
             all_deleted_successfully = False
 
+    await update_tags_count(tag_deltas)
+    if deleted_ids:
+        await publish_similarity_index_update('delete', deleted_ids)
+    await bump_similarity_index_generation()
     return all_deleted_successfully
 
 
+async def is_image_shared(image_document: dict) -> bool:
+    """
+    Checks whether other images reuse the stored objects of an image, as re-uploads of the same file do.
+
+    :param image_document: The image document, with its 'image_url' and 'content_hash' fields.
+    :return: True if another image references the same stored image, False otherwise.
+    """
+    if not image_document.get('content_hash'):
+        return False
+    shared = await images_collection.count_documents({
+        'content_hash': image_document['content_hash'],
+        'image_url': image_document['image_url'],
+        '_id': {'$ne': image_document['_id']}
+    }, limit=1)
+    return shared > 0
+
+
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
 async def remove_tags_from_image(image_id: ObjectId or str, tags_to_remove: list[str]) -> bool:
     """
@@ -486,16 +520,16 @@ async def remove_tags_from_image(image_id: ObjectId or str, tags_to_remove: list
     """
     try:
         image_id = to_object_id(image_id)
-        image = await get_image_document(image_id)
-        if not image:
-            logger.error(f"No image found with ID: {str(image_id)}")
-            return False
-
-        await images_collection.update_one(
+        update_result = await images_collection.update_one(
             {"_id": image_id},
             {"$pull": {"user_tags": {"$in": tags_to_remove}}}
         )
+        if update_result.matched_count == 0:
+            logger.error(f"No image found with ID: {str(image_id)}")
+            return False
+
         await decrement_tags_count(tags_to_remove)
+        await publish_similarity_index_update('update', [image_id])
         return True
     except Exception as e:
         logger.error(f"Error while removing tags: {e}")
@@ -503,6 +537,54 @@ async def remove_tags_from_image(image_id: ObjectId or str, tags_to_remove: list
 
 
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
+async def update_tags_count(deltas: dict[str, int]) -> bool:
+    """
+    Apply changes to the counts of tags in the database with a single unordered bulk write.
+
+    Tags with a positive change are upserted, so new tags are created. A tag whose count drops to zero is
+    renamed to 'NULL' in the same update, keeping its position in the tag vocabulary.
+
+    :param deltas: A mapping of tag names to the change of their count.
+    :return: True if the counts were updated successfully, False otherwise.
+    """
+    operations = []
+    for tag, delta in deltas.items():
+        if delta > 0:
+            operations.append(UpdateOne({'name': tag}, {'$inc': {'count': delta}}, upsert=True))
+        elif delta < 0:
+            count = {'$add': [{'$ifNull': ['$count', 0]}, delta]}
+            operations.append(UpdateOne({'name': tag}, [{'$set': {
+                'count': count,
+                'name': {'$cond': [{'$lte': [count, 0]}, 'NULL', '$name']}
+            }}]))
+    if not operations:
+        return True
+
+    try:
+        result = await tags_collection.bulk_write(operations, ordered=False)
+        # New tags extend the vocabulary; removals may have renamed tags to 'NULL'
+        if result.upserted_count > 0 or any(delta < 0 for delta in deltas.values()):
+            await bump_tag_vocabulary_version()
+        return True
+    except Exception as e:
+        logger.error(f"Error while updating tags count: {e}")
+        return False
+
+
+def count_tags(tags: list[str], sign: int = 1) -> dict[str, int]:
+    """
+    Aggregate a list of tags, possibly with repetitions, into count changes.
+
+    :param tags: The tags.
+    :param sign: 1 to count the tags up, -1 to count them down.
+    :return: A mapping of tag names to the change of their count.
+    """
+    deltas = {}
+    for tag in tags:
+        deltas[tag] = deltas.get(tag, 0) + sign
+    return deltas
+
+
 async def increment_tags_count(tags: list[str]) -> bool:
     """
     Increment the count of unique tags in the database.
@@ -510,20 +592,9 @@ async def increment_tags_count(tags: list[str]) -> bool:
     :param tags: A list of tags to increment.
     :return: True if the tags were incremented successfully, False otherwise.
     """
-    try:
-        for tag in tags:
-            if not await tags_collection.find_one({'name': tag}):
-                await tags_collection.insert_one({"name": tag, "count": 1})
-            else:
-                await tags_collection.update_one({"name": tag}, {"$inc": {"count": 1}}, upsert=True)
-
-        return True
-    except Exception as e:
-        logger.error(f"Error while incrementing tags count: {e}")
-        return False
+    return await update_tags_count(count_tags(tags))
 
 
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
 async def decrement_tags_count(tags: list[str]) -> bool:
     """
     Decrement the count of unique tags in the database.
@@ -531,19 +602,7 @@ async def decrement_tags_count(tags: list[str]) -> bool:
     :param tags: A list of tags to decrement.
     :return: True if the tags were decremented successfully, False otherwise.
     """
-    try:
-        for tag in tags:
-            await tags_collection.update_one(
-                {"name": tag},
-                {"$inc": {"count": -1}}
-            )
-            tag_doc = await tags_collection.find_one({"name": tag})
-            if tag_doc and tag_doc['count'] <= 0:
-                await tags_collection.update_one({"name": tag}, {"$set": {"name": "NULL"}})
-
-    except Exception as e:
-        logger.error(f"Error while decrementing tags count: {e}")
-        return False
+    return await update_tags_count(count_tags(tags, -1))
 
 
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
@@ -559,6 +618,7 @@ async def get_root_id() -> ObjectId or None:
             root_album = {
                 "name": "root",
                 "parent": None,
+                "ancestors": [],
                 "sons": [],
                 "images": []
             }
@@ -607,6 +667,7 @@ async def create_user(email: str, password: str) -> dict or None:
             "liked": []
         }
         result = await user_collection.insert_one(user)
+        user_cache.invalidate(username)
         return result
     except Exception as e:
         logger.error(f"Error creating user: {e}")
@@ -630,6 +691,8 @@ async def mark_email_as_verified(user_id: ObjectId or str) -> bool:
             {"_id": user_id},
             {"$set": {"verified": True}}
         )
+        if result:
+            user_cache.invalidate(result['username'])
         logger.info(f"Successfully marked email as verified for user: {result['username']}")
         return True if result else False
     except Exception as e:
@@ -638,11 +701,12 @@ async def mark_email_as_verified(user_id: ObjectId or str) -> bool:
 
 
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
-async def get_image_document(inserted_id: ObjectId or str) -> dict or None:
+async def get_image_document(inserted_id: ObjectId or str, projection: list[str] or dict = None) -> dict or None:
     """
     Get an image document by ID from the database.
 
     :param inserted_id: The ID of the image to retrieve.
+    :param projection: Optional fields to return, as a list of field names or a MongoDB projection.
     :return: The image document if found, None otherwise.
     """
     inserted_id = to_object_id(inserted_id)
@@ -650,18 +714,100 @@ async def get_image_document(inserted_id: ObjectId or str) -> dict or None:
         return None
 
     try:
-        return await images_collection.find_one({'_id': inserted_id})
+        return await images_collection.find_one({'_id': inserted_id}, projection)
     except Exception as e:
         logger.error(f"Error retrieving image document: {e}")
         return None
 
 
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
-async def get_album(album_id: ObjectId or str) -> dict or None:
+async def get_image_by_content_hash(content_hash: str, projection: list[str] or dict = None) -> dict or None:
+    """
+    Retrieves a processed image uploaded from the same file, identified by the file's digest.
+
+    :param content_hash: The digest of the uploaded file.
+    :param projection: Optional fields to return, as a list of field names or a MongoDB projection.
+    :return: The image document as a dictionary if found, otherwise None.
+    """
+    try:
+        return await images_collection.find_one(
+            {'content_hash': content_hash, 'features_digest': {'$exists': True}}, projection)
+    except Exception as e:
+        logger.error(f"Error retrieving image by content hash: {e}")
+        return None
+
+
+async def merge_duplicate_tags() -> int:
+    """
+    Merges tags in use that share a name, as concurrent upserts could create before tag names were unique.
+    The counts are added to the oldest tag, which keeps its position in the tag vocabulary, and the others
+    are renamed to 'NULL' with a count of zero.
+
+    :return: The number of merged tags.
+    """
+    cursor = tags_collection.aggregate([
+        {'$match': {'count': {'$gt': 0}}},
+        {'$sort': {'_id': 1}},
+        {'$group': {'_id': '$name', 'ids': {'$push': '$_id'}, 'count': {'$sum': '$count'}}},
+        {'$match': {'ids.1': {'$exists': True}}}
+    ])
+    operations, merged = [], 0
+    for group in await cursor.to_list(length=None):
+        first_id, *other_ids = group['ids']
+        operations.append(UpdateOne({'_id': first_id}, {'$set': {'count': group['count']}}))
+        operations += [UpdateOne({'_id': tag_id}, {'$set': {'name': 'NULL', 'count': 0}}) for tag_id in other_ids]
+        merged += len(other_ids)
+    if not operations:
+        return 0
+
+    await tags_collection.bulk_write(operations, ordered=False)
+    await bump_tag_vocabulary_version()
+    return merged
+
+
+async def create_indexes() -> None:
+    """
+    Creates the indexes the application's queries rely on, if they do not exist yet. Failures are raised, so
+    the application does not start without the indexes its queries and the uniqueness of tag names rely on.
+    """
+    await images_collection.create_index('content_hash', sparse=True)
+    # Only grouped images carry the field, so listing the duplicate groups scans just them
+    await images_collection.create_index('duplicate_group', sparse=True)
+    # Removed tags are all renamed to 'NULL', so only tags in use need unique names
+    merged = await merge_duplicate_tags()
+    if merged:
+        logger.info(f"Merged {merged} tags with duplicate names")
+    await tags_collection.create_index('name', unique=True, partialFilterExpression={'count': {'$gt': 0}})
+    await album_collection.create_index('ancestors')
+
+
+@retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
+async def get_image_vectors(inserted_id: ObjectId or str, projection: list[str] or dict = None) -> dict or None:
+    """
+    Get the vectors document (features and face embeddings) of an image from the database.
+
+    :param inserted_id: The ID of the image whose vectors to retrieve.
+    :param projection: Optional fields to return, as a list of field names or a MongoDB projection.
+    :return: The vectors document if found, None otherwise.
+    """
+    inserted_id = to_object_id(inserted_id)
+    if not inserted_id:
+        return None
+
+    try:
+        return await vectors_collection.find_one({'_id': inserted_id}, projection)
+    except Exception as e:
+        logger.error(f"Error retrieving image vectors: {e}")
+        return None
+
+
+@retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
+async def get_album(album_id: ObjectId or str, projection: list[str] or dict = None) -> dict or None:
     """
     Get an album by ID from the database.
 
     :param album_id: The ID of the album to retrieve.
+    :param projection: Optional fields to return, as a list of field names or a MongoDB projection.
     :return: The album document if found, None otherwise.
     """
     album_id = to_object_id(album_id)
@@ -669,12 +815,45 @@ async def get_album(album_id: ObjectId or str) -> dict or None:
         return None
 
     try:
-        return await album_collection.find_one({'_id': album_id})
+        return await album_collection.find_one({'_id': album_id}, projection)
     except Exception as e:
         logger.error(f"Error retrieving album: {e}")
         return None
 
 
+@retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
+async def get_album_subtree(album_ids: list[str], projection: list[str] or dict = None) -> list[dict]:
+    """
+    Get albums together with all their sub-albums, with a single query on the indexed ancestors of the albums.
+
+    :param album_ids: The IDs of the albums at the top of the subtrees.
+    :param projection: Optional fields to return, as a list of field names or a MongoDB projection.
+    :return: The album documents.
+    """
+    object_ids = [album_id for album_id in map(to_object_id, album_ids) if album_id]
+    if not object_ids:
+        return []
+
+    cursor = album_collection.find(
+        {'$or': [{'_id': {'$in': object_ids}}, {'ancestors': {'$in': [str(album_id) for album_id in object_ids]}}]},
+        projection
+    )
+    return await cursor.to_list(length=None)
+
+
+async def has_albums_without_ancestors() -> bool:
+    """
+    Checks whether some albums predate the ancestors field and still need to be migrated.
+
+    :return: True if an album without ancestors exists or the check failed, False otherwise.
+    """
+    try:
+        return await album_collection.count_documents({'ancestors': {'$exists': False}}, limit=1) > 0
+    except Exception as e:
+        logger.error(f"Error checking album ancestors: {e}")
+        return True
+
+
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
 async def rename_album(name: str, album_id: ObjectId or str) -> bool:
     """
@@ -719,7 +898,7 @@ async def add_names(inserted_id: ObjectId or str, anonymous_index: int, new_name
         if not inserted_id:
             return False
 
-        image = await get_image_document(inserted_id)
+        image = await get_image_document(inserted_id, ['user_faces', 'backlog_faces'])
         if not image:
             logger.error(f"Image not found with ID: {inserted_id}")
             return False
@@ -749,6 +928,7 @@ async def add_names(inserted_id: ObjectId or str, anonymous_index: int, new_name
             )
             update_names.delay(old_name, new_name)
 
+        await publish_similarity_index_update('update', [inserted_id])
         logger.info(f"Successfully updated name for image: {inserted_id}")
         return True
     except Exception as e:
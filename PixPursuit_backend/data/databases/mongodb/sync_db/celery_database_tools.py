@@ -2,45 +2,93 @@
 data/databases/mongodb/sync/celery_database_tools.py
 
 Contains utility functions for interacting with the database within Celery tasks. This includes
-adding data to images, retrieving image documents synchronously, paginating image IDs, and managing
-tags and feedback for images.
+adding data to images, retrieving image documents synchronously, streaming images for periodic jobs,
+managing tags and feedback for images, migrating stored vectors to the compact encoding and albums to
+the materialized hierarchy, and writing buffered image views.
 """
 
 from bson import ObjectId
+from celery import shared_task
+from pymongo import UpdateOne
 from tenacity import retry, stop_after_attempt, wait_fixed
 from config.logging_config import setup_logging
 from config.database_config import connect_to_mongodb
 from utils.function_utils import to_object_id
+from utils.vector_codec import encode_vector, encode_vectors, decode_vector, decode_vectors
+from data.databases.redis_db.redis_tools import take_buffered_image_views, clear_taken_image_views, \
+    publish_similarity_index_update_sync
+from utils.constants import MIGRATE_VECTORS_TASK, FLUSH_IMAGE_VIEWS_TASK, BEAT_QUEUE, VECTOR_MIGRATION_BATCH_SIZE, \
+    MIGRATE_ALBUM_ANCESTORS_TASK, ALBUM_MIGRATION_BATCH_SIZE
 
 logger = setup_logging(__name__)
 
-sync_images_collection, sync_tags_collection, sync_faces_collection, _, _ = connect_to_mongodb(async_mode=False)
+(sync_images_collection, sync_tags_collection, sync_faces_collection, _, sync_album_collection,
+ sync_vectors_collection) = connect_to_mongodb(async_mode=False)
 
 
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
-def add_field_to_image(field_to_set: str, data: any, filename: str) -> None:
+def add_fields_to_image(fields: dict, inserted_id: ObjectId or str) -> None:
     """
-    Adds specified data to a field in an image document identified by filename.
+    Sets the given fields in an image document identified by its ID.
 
-    :param field_to_set: The field name in the document where data should be set.
-    :param data: The data to add to the field.
-    :param filename: The filename identifying the image document.
+    :param fields: A mapping of field names to the data to set.
+    :param inserted_id: The ID of the image document to update.
     """
     try:
         sync_images_collection.update_one(
-            {'filename': filename},
-            {'$set': {field_to_set: data}}
+            {'_id': to_object_id(inserted_id)},
+            {'$set': fields}
+        )
+    except Exception as e:
+        logger.error(f"Error adding {', '.join(fields)} to image: {e}")
+
+
+@retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
+def save_image_vectors(inserted_id: ObjectId or str, features: bytes or None, embeddings: list[bytes]) -> None:
+    """
+    Saves the encoded feature vector and face embeddings of an image to the vectors collection.
+
+    :param inserted_id: The ID of the image the vectors belong to.
+    :param features: The encoded feature vector.
+    :param embeddings: The encoded face embeddings.
+    """
+    try:
+        sync_vectors_collection.update_one(
+            {'_id': to_object_id(inserted_id)},
+            {'$set': {'features': features, 'embeddings': embeddings}},
+            upsert=True
         )
     except Exception as e:
-        logger.error(f"Error adding {field_to_set} to image: {e}")
+        logger.error(f"Error saving image vectors: {e}")
 
 
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
-def get_image_document_sync(inserted_id: ObjectId or str) -> dict or None:
+def get_image_vectors_sync(inserted_id: ObjectId or str, projection: list[str] or dict = None) -> dict or None:
+    """
+    Retrieves the vectors document of an image synchronously by its ID.
+
+    :param inserted_id: The ID of the image whose vectors to retrieve.
+    :param projection: Optional fields to return, as a list of field names or a MongoDB projection.
+    :return: The vectors document as a dictionary if found, otherwise None.
+    """
+    inserted_id = to_object_id(inserted_id)
+    if not inserted_id:
+        return None
+
+    try:
+        return sync_vectors_collection.find_one({'_id': inserted_id}, projection)
+    except Exception as e:
+        logger.error(f"Error retrieving image vectors: {e}")
+        return None
+
+
+@retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
+def get_image_document_sync(inserted_id: ObjectId or str, projection: list[str] or dict = None) -> dict or None:
     """
     Retrieves an image document synchronously by its ID.
 
     :param inserted_id: The ID of the image document to retrieve.
+    :param projection: Optional fields to return, as a list of field names or a MongoDB projection.
     :return: The image document as a dictionary if found, otherwise None.
     """
     inserted_id = to_object_id(inserted_id)
@@ -48,97 +96,446 @@ def get_image_document_sync(inserted_id: ObjectId or str) -> dict or None:
         return None
 
     try:
-        return sync_images_collection.find_one({'_id': inserted_id})
+        return sync_images_collection.find_one({'_id': inserted_id}, projection)
     except Exception as e:
         logger.error(f"Error retrieving image document: {e}")
         return None
 
 
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
-def get_image_ids_paginated(last_id: ObjectId or str = None, page_size: int = 100) -> list[str]:
+def get_image_vectors_batch_sync(image_ids: list[ObjectId or str],
+                                 projection: list[str] or dict = None) -> dict[str, dict]:
+    """
+    Retrieves the vectors documents of multiple images synchronously with a single query.
+
+    :param image_ids: The IDs of the images whose vectors to retrieve.
+    :param projection: Optional fields to return, as a list of field names or a MongoDB projection.
+    :return: A mapping of image IDs (as strings) to their vectors documents. Missing images are omitted.
+    """
+    object_ids = [object_id for object_id in map(to_object_id, image_ids) if object_id]
+    if not object_ids:
+        return {}
+
+    try:
+        cursor = sync_vectors_collection.find({'_id': {'$in': object_ids}}, projection)
+        return {str(document['_id']): document for document in cursor}
+    except Exception as e:
+        logger.error(f"Error retrieving image vectors: {e}")
+        return {}
+
+
+@retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
+def get_image_documents_batch_sync(image_ids: list[ObjectId or str],
+                                   projection: list[str] or dict = None) -> dict[str, dict]:
+    """
+    Retrieves multiple image documents synchronously with a single query.
+
+    :param image_ids: The IDs of the image documents to retrieve.
+    :param projection: Optional fields to return, as a list of field names or a MongoDB projection.
+    :return: A mapping of image IDs (as strings) to their documents. Missing images are omitted.
+    """
+    object_ids = [object_id for object_id in map(to_object_id, image_ids) if object_id]
+    if not object_ids:
+        return {}
+
+    try:
+        cursor = sync_images_collection.find({'_id': {'$in': object_ids}}, projection)
+        return {str(document['_id']): document for document in cursor}
+    except Exception as e:
+        logger.error(f"Error retrieving image documents: {e}")
+        return {}
+
+
+@retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
+def get_album_subtree_sync(album_ids: list[ObjectId or str], projection: list[str] or dict = None) -> list[dict]:
     """
-    Retrieves a paginated list of image document IDs.
+    Retrieves albums together with all their sub-albums, with a single query on their indexed ancestors.
 
-    :param last_id: The last ID retrieved, used for pagination.
-    :param page_size: The number of document IDs to retrieve per page.
-    :return: A list of image document IDs.
+    :param album_ids: The IDs of the albums at the top of the subtrees.
+    :param projection: Optional fields to return, as a list of field names or a MongoDB projection.
+    :return: The album documents, or an empty list if an error occurs.
     """
-    if last_id is not None:
-        last_id = to_object_id(last_id)
-        cursor = sync_images_collection.find({'_id': {'$gt': last_id}}, {'_id': 1}).limit(page_size)
-    else:
-        cursor = sync_images_collection.find({}, {'_id': 1}).limit(page_size)
+    object_ids = [album_id for album_id in map(to_object_id, album_ids) if album_id]
+    if not object_ids:
+        return []
 
-    return [str(document['_id']) for document in cursor]
+    try:
+        cursor = sync_album_collection.find(
+            {'$or': [{'_id': {'$in': object_ids}}, {'ancestors': {'$in': [str(album_id) for album_id in object_ids]}}]},
+            projection
+        )
+        return list(cursor)
+    except Exception as e:
+        logger.error(f"Error retrieving album subtree: {e}")
+        return []
 
 
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
 def get_unique_tags() -> list[str] or None:
     """
-    Retrieves a list of unique tags from the tags collection.
+    Retrieves a list of unique tags from the tags collection, in the order they were created.
+    The order is stable, so the position of a tag in the list can be used as its index in the model output.
 
     :return: A list of unique tag names or None if an error occurs.
     """
-    documents = sync_tags_collection.find({}, {'name': 1})
+    documents = sync_tags_collection.find({}, {'name': 1}).sort('_id', 1)
     names = [doc['name'] for doc in documents]
     return names
 
 
+def auto_tags_pipeline(predicted_tags: list[str], stamp: dict = None) -> list[dict]:
+    """
+    Builds an update pipeline setting the predicted tags of an image server-side, in a single round trip.
+    Tags already marked by the user are filtered out. If any tags are left, they become the auto tags and the
+    feedback is pruned to entries for them, keeping existing counts and adding empty entries for new tags.
+    If no tags are left, the auto tags and feedback are kept as they are.
+
+    :param predicted_tags: The tags predicted by the model.
+    :param stamp: Optional fields recording what the prediction was based on, set even if no tags are added.
+    :return: The update pipeline.
+    """
+    has_new_tags = {'$gt': [{'$size': '$_new_auto_tags'}, 0]}
+    fields = {
+        'auto_tags': {'$cond': [has_new_tags, '$_new_auto_tags', '$auto_tags']},
+        'feedback': {'$cond': [has_new_tags, {'$mergeObjects': [
+            {'$arrayToObject': {'$map': {
+                'input': '$_new_auto_tags',
+                'in': {'k': '$$this', 'v': {'positive': 0, 'negative': 0}}
+            }}},
+            {'$arrayToObject': {'$filter': {
+                'input': {'$objectToArray': {'$ifNull': ['$feedback', {}]}},
+                'cond': {'$in': ['$$this.k', '$_new_auto_tags']}
+            }}}
+        ]}, '$feedback']}
+    }
+    fields.update({field: {'$literal': value} for field, value in (stamp or {}).items()})
+    return [
+        {'$set': {'_new_auto_tags': {'$filter': {
+            'input': {'$literal': predicted_tags},
+            'cond': {'$not': [{'$in': ['$$this', {'$ifNull': ['$user_tags', []]}]}]}
+        }}}},
+        {'$set': fields},
+        {'$unset': '_new_auto_tags'}
+    ]
+
+
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
 def add_auto_tags(inserted_id: ObjectId or str, predicted_tags: list[str]) -> None:
     """
-    Adds automatically predicted tags to an image document.
+    Adds automatically predicted tags to an image document and prunes its feedback, in a single update.
 
     :param inserted_id: The ID of the image document to update.
     :param predicted_tags: A list of tags predicted by the model.
     """
     try:
-        image_document = get_image_document_sync(inserted_id)
-        if not image_document:
-            logger.error(f"No document found with id: {str(inserted_id)}")
+        if not predicted_tags:
             return
 
-        # Filter out tags that are already marked by the user
-        user_tags = image_document.get('user_tags', [])
-        auto_tags_to_add = [tag for tag in predicted_tags if tag not in user_tags]
+        result = sync_images_collection.update_one(
+            {'_id': to_object_id(inserted_id)},
+            auto_tags_pipeline(predicted_tags)
+        )
+        if result.matched_count == 0:
+            logger.error(f"No document found with id: {str(inserted_id)}")
+        elif result.modified_count:
+            publish_similarity_index_update_sync('update', [inserted_id])
+    except Exception as e:
+        logger.error(f"Error while adding auto tags: {e}")
+
 
-        # Update the document with the new automatic tags if there are any to add
-        if auto_tags_to_add:
-            inserted_id = to_object_id(inserted_id)
-            sync_images_collection.update_one(
-                {'_id': inserted_id},
-                {'$set': {'auto_tags': auto_tags_to_add}}
-            )
-            # Add feedback entry for new tags
-            add_feedback_sync(auto_tags_to_add, inserted_id)
+def make_auto_tags_update(image_id: ObjectId or str, predicted_tags: list[str], stamp: dict = None) -> UpdateOne or None:
+    """
+    Builds the bulk operation setting the predicted tags of an image, following the rules of auto_tags_pipeline.
 
+    :param image_id: The ID of the image document to update.
+    :param predicted_tags: The tags predicted by the model.
+    :param stamp: Optional fields recording what the prediction was based on, set even if no tags are added.
+    :return: The update operation, or None if there is nothing to write.
+    """
+    if not predicted_tags and not stamp:
+        return None
+    return UpdateOne({'_id': to_object_id(image_id)}, auto_tags_pipeline(predicted_tags, stamp))
+
+
+@retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
+def add_auto_tags_bulk(predicted_tags: dict[str, list[str]], stamps: dict[str, dict] = None) -> int:
+    """
+    Adds automatically predicted tags to multiple image documents with a single bulk write,
+    without reading the documents first.
+
+    :param predicted_tags: A mapping of image IDs to the tags predicted by the model.
+    :param stamps: An optional mapping of image IDs to fields recording what the prediction was based on.
+    :return: The number of updated image documents.
+    """
+    stamps = stamps or {}
+    try:
+        operations = [make_auto_tags_update(image_id, tags, stamps.get(image_id))
+                      for image_id, tags in predicted_tags.items() if to_object_id(image_id)]
+        modified = bulk_update_images([operation for operation in operations if operation])
+        if modified:
+            publish_similarity_index_update_sync('update', [image_id for image_id, tags in predicted_tags.items()
+                                                            if tags and to_object_id(image_id)])
+        return modified
     except Exception as e:
         logger.error(f"Error while adding auto tags: {e}")
+        return 0
 
 
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
-def add_feedback_sync(auto_tags: list[str], inserted_id: ObjectId or str) -> bool:
+def bulk_update_images(operations: list) -> int:
     """
-    Adds feedback entries for automatically generated tags in the image document.
+    Applies update operations to the images collection with a single unordered bulk write.
 
-    :param auto_tags: A list of tags to add feedback for.
-    :param inserted_id: The ID of the image document to update.
-    :return: True if feedback was successfully added, False otherwise.
+    :param operations: The update operations.
+    :return: The number of modified image documents.
+    """
+    return _flush(sync_images_collection, operations)
+
+
+def stream_image_hashes(batch_size: int = 1000):
+    """
+    Streams the perceptual hashes and current duplicate groups of all hashed images.
+
+    :param batch_size: The number of documents fetched from the server per round trip.
+    :return: A cursor over image documents with '_id', 'dhash' and 'duplicate_group'.
+    """
+    return sync_images_collection.find(
+        {'$or': [{'dhash': {'$exists': True}}, {'duplicate_group': {'$exists': True}}]},
+        {'dhash': 1, 'duplicate_group': 1}
+    ).batch_size(batch_size)
+
+
+def stream_images_for_tagging(after_id: ObjectId or str = None, batch_size: int = 1000, model_version: str = None):
+    """
+    Streams the IDs of images whose auto tags should be refreshed, in ascending ID order.
+
+    If a model version is given, only stale images are returned: images whose auto tags were predicted by
+    another model version or from different features than the image currently has. Images without features
+    are left out once marked by mark_images_without_features, until their features are extracted.
+
+    :param after_id: If given, only images with a greater ID are returned, used to resume an interrupted pass.
+    :param batch_size: The number of documents fetched from the server per round trip.
+    :param model_version: The version of the model that will predict the tags.
+    :return: A cursor over the IDs of the image documents.
+    """
+    conditions = []
+    if after_id:
+        conditions.append({'_id': {'$gt': to_object_id(after_id)}})
+    if model_version:
+        conditions.append({'$or': [
+            {'auto_tags_model_version': {'$ne': model_version}},
+            {'features_digest': {'$exists': False}},
+            {'$expr': {'$ne': ['$auto_tags_features_digest', '$features_digest']}}
+        ]})
+    query = {'$and': conditions} if conditions else {}
+    return (sync_images_collection.find(query, ['_id'])
+            .sort('_id', 1)
+            .batch_size(batch_size))
+
+
+def mark_images_without_features(image_ids: list[str], model_version: str) -> int:
+    """
+    Stamps images that have no features to predict tags from as refreshed by a model version, so the periodic
+    refresh skips them until their features are extracted. A features digest stored meanwhile is kept, so the
+    image is refreshed by the next pass.
+
+    :param image_ids: The IDs of the images without features.
+    :param model_version: The version of the model of the refresh.
+    :return: The number of updated image documents.
+    """
+    operations = [UpdateOne({'_id': to_object_id(image_id)}, [{'$set': {
+        'auto_tags_model_version': {'$literal': model_version},
+        'auto_tags_features_digest': None,
+        'features_digest': {'$ifNull': ['$features_digest', None]}
+    }}]) for image_id in image_ids if to_object_id(image_id)]
+    return _flush(sync_images_collection, operations)
+
+
+def count_images() -> int:
+    """
+    Returns the estimated number of image documents.
+
+    :return: The number of images, or 0 if an error occurs.
     """
     try:
-        image_document = get_image_document_sync(inserted_id)
-        existing_feedback = image_document.get('feedback', {})
-        for tag in auto_tags:
-            existing_feedback.setdefault(tag, {"positive": 0, "negative": 0})
+        return sync_images_collection.estimated_document_count()
+    except Exception as e:
+        logger.error(f"Error counting images: {e}")
+        return 0
 
-        existing_feedback = {tag: data for tag, data in existing_feedback.items() if tag in auto_tags}
 
-        sync_images_collection.update_one(
-            {'_id': inserted_id},
-            {'$set': {'feedback': existing_feedback}}
-        )
+def _flush(collection, operations: list) -> int:
+    """
+    Applies pending bulk operations to a collection.
+
+    :param collection: The collection to write to.
+    :param operations: The pending operations.
+    :return: The number of upserted or modified documents.
+    """
+    if not operations:
+        return 0
+    result = collection.bulk_write(operations, ordered=False)
+    return result.modified_count + result.upserted_count
+
+
+def _migrate_image_vectors() -> int:
+    """
+    Moves vectors still embedded in image documents to the vectors collection, re-encoding them compactly.
+
+    Vectors are written to the vectors collection before they are removed from the image documents,
+    so an interrupted migration can simply be re-run.
+
+    :return: The number of migrated images.
+    """
+    migrated = 0
+    vector_operations, image_operations = [], []
+    cursor = sync_images_collection.find(
+        {'$or': [{'features': {'$exists': True}}, {'embeddings': {'$exists': True}}]},
+        {'features': 1, 'embeddings': 1},
+        batch_size=VECTOR_MIGRATION_BATCH_SIZE
+    )
+    for document in cursor:
+        features = decode_vector(document.get('features'))
+        vectors = {
+            'features': encode_vector(features) if features.size else None,
+            'embeddings': encode_vectors(decode_vectors(document.get('embeddings')))
+        }
+        vector_operations.append(UpdateOne({'_id': document['_id']}, {'$set': vectors}, upsert=True))
+        image_operations.append(UpdateOne({'_id': document['_id']}, {'$unset': {'features': "", 'embeddings': ""}}))
+        if len(image_operations) >= VECTOR_MIGRATION_BATCH_SIZE:
+            _flush(sync_vectors_collection, vector_operations)
+            migrated += _flush(sync_images_collection, image_operations)
+            vector_operations, image_operations = [], []
+
+    _flush(sync_vectors_collection, vector_operations)
+    migrated += _flush(sync_images_collection, image_operations)
+    return migrated
+
+
+def _migrate_face_vectors() -> int:
+    """
+    Re-encodes face embeddings in the faces collection that still use the legacy list encoding.
+
+    :return: The number of migrated faces.
+    """
+    migrated = 0
+    operations = []
+    cursor = sync_faces_collection.find({'face_emb': {'$type': 'array'}}, {'face_emb': 1},
+                                        batch_size=VECTOR_MIGRATION_BATCH_SIZE)
+    for document in cursor:
+        face_emb = encode_vector(decode_vector(document.get('face_emb')))
+        operations.append(UpdateOne({'_id': document['_id']}, {'$set': {'face_emb': face_emb}}))
+        if len(operations) >= VECTOR_MIGRATION_BATCH_SIZE:
+            migrated += _flush(sync_faces_collection, operations)
+            operations = []
+
+    migrated += _flush(sync_faces_collection, operations)
+    return migrated
+
+
+@shared_task(name=MIGRATE_VECTORS_TASK, queue=BEAT_QUEUE)
+def migrate_vectors() -> None:
+    """
+    Migrates feature vectors and face embeddings to the compact Binary encoding and moves image vectors
+    out of the image documents into the vectors collection.
+
+    The task is idempotent and only touches documents that still use the legacy layout, so it can be
+    re-run safely, e.g. with `celery -A app.celery call celery_database_tools.migrate_vectors.beat`.
+    """
+    try:
+        images_migrated = _migrate_image_vectors()
+        faces_migrated = _migrate_face_vectors()
+        logger.info(f"Migrated vectors of {images_migrated} images and {faces_migrated} faces")
+    except Exception as e:
+        logger.error(f"Error migrating vectors: {e}")
 
-        return True
+
+def compute_album_ancestors(parents: dict[str, str or None]) -> dict[str, list[str]]:
+    """
+    Computes the ancestors of every album from the parent of each album.
+
+    :param parents: The ID of the parent of each album, by album ID, None for the root.
+    :return: The IDs of the ancestors of each album, from the root down to its parent, by album ID.
+    """
+    ancestors = {}
+    for album_id in parents:
+        chain, current = [], album_id
+        # Walk up until an album with known ancestors, the root, a missing parent or a cycle
+        while current not in ancestors and parents.get(current) and parents[current] not in chain:
+            chain.append(current)
+            current = parents[current]
+        known = ancestors.get(current, [])
+        if current not in ancestors:
+            ancestors[current] = known
+        for descendant in reversed(chain):
+            known = known + [parents[descendant]]
+            ancestors[descendant] = known
+    return {album_id: ancestors[album_id] for album_id in parents}
+
+
+def update_album_ancestors() -> int:
+    """
+    Stores the ancestors of every album, computed from the parent links, on albums where they are missing
+    or out of date.
+
+    :return: The number of updated albums.
+    """
+    albums = list(sync_album_collection.find({}, {'parent': 1, 'ancestors': 1}))
+    parents = {str(album['_id']): album.get('parent') for album in albums}
+    ancestors = compute_album_ancestors(parents)
+
+    migrated = 0
+    operations = []
+    for album in albums:
+        album_ancestors = ancestors[str(album['_id'])]
+        if album.get('ancestors') != album_ancestors:
+            operations.append(UpdateOne({'_id': album['_id']}, {'$set': {'ancestors': album_ancestors}}))
+        if len(operations) >= ALBUM_MIGRATION_BATCH_SIZE:
+            migrated += _flush(sync_album_collection, operations)
+            operations = []
+
+    migrated += _flush(sync_album_collection, operations)
+    return migrated
+
+
+@shared_task(name=MIGRATE_ALBUM_ANCESTORS_TASK, queue=BEAT_QUEUE)
+def migrate_album_ancestors() -> None:
+    """
+    Recomputes the ancestors of every album from the parent links. The API already migrates albums
+    without ancestors on startup; the task repairs ancestors that went out of date.
+
+    The task is idempotent, so it can be re-run safely, e.g. with
+    `celery -A app.celery call celery_database_tools.migrate_album_ancestors.beat`.
+    """
+    try:
+        migrated = update_album_ancestors()
+        logger.info(f"Migrated ancestors of {migrated} albums")
+    except Exception as e:
+        logger.error(f"Error migrating album ancestors: {e}")
+
+
+@shared_task(name=FLUSH_IMAGE_VIEWS_TASK, queue=BEAT_QUEUE)
+def flush_image_views() -> None:
+    """
+    Writes the image views buffered in Redis to the image documents with a single bulk write. Views of
+    deleted images are dropped.
+
+    Each image written is stamped with the ID of the flush, and images already carrying it are skipped, so a
+    flush retried after a partial failure does not count the views it already wrote twice.
+
+    This function is a Celery task that runs on the BEAT_QUEUE.
+    """
+    try:
+        flush_id, views = take_buffered_image_views()
+        if not views:
+            return
+        operations = []
+        for image_id, count in views.items():
+            image_id = to_object_id(image_id)
+            if image_id:
+                operations.append(UpdateOne({'_id': image_id, 'views_flush_id': {'$ne': flush_id}},
+                                            {'$inc': {'views': count}, '$set': {'views_flush_id': flush_id}}))
+        updated = _flush(sync_images_collection, operations)
+        clear_taken_image_views()
+        logger.info(f"Flushed {sum(views.values())} views of {len(views)} images, updated {updated} images")
     except Exception as e:
-        logger.error(f"Error updating feedback: {e}")
-        return False
+        logger.error(f"Error flushing image views: {e}")
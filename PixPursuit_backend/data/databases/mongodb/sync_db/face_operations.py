@@ -8,13 +8,15 @@ from tenacity import retry, stop_after_attempt, wait_fixed
 from utils.function_utils import to_object_id
 from pymongo import DeleteOne
 from sklearn.neighbors import BallTree
+from utils.vector_codec import decode_vector, decode_vectors
+from data.databases.redis_db.redis_tools import publish_face_index_update, publish_similarity_index_update_sync
 from utils.constants import (
     GROUP_FACES_TASK, DELETE_FACES_TASK, UPDATE_NAMES_TASK, MAIN_QUEUE, BEAT_QUEUE,
     DBSCAN_EPS, DBSCAN_MIN_SAMPLES, FACE_DELETE_THRESHOLD)
 
 logger = setup_logging(__name__)
 
-sync_images_collection, _, sync_faces_collection, _, _ = connect_to_mongodb(async_mode=False)
+sync_images_collection, _, sync_faces_collection, _, _, sync_vectors_collection = connect_to_mongodb(async_mode=False)
 dbscan = DBSCAN(eps=DBSCAN_EPS, min_samples=DBSCAN_MIN_SAMPLES)
 
 
@@ -37,12 +39,13 @@ def cluster_embeddings(embeddings: list[np.ndarray]) -> np.ndarray or None:
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
 def fetch_images() -> list[dict]:
     """
-    Fetches all image documents from the sync_images_collection where the 'embeddings' field exists and is not empty.
+    Fetches the vectors documents of all images whose 'embeddings' field exists and is not empty.
+    The documents are keyed by image ID and only contain the face embeddings.
 
-    :return: A list of image documents, or an empty list if an error occurs.
+    :return: A list of vectors documents, or an empty list if an error occurs.
     """
     try:
-        cursor = sync_images_collection.find({'embeddings': {'$exists': True, '$not': {'$size': 0}}})
+        cursor = sync_vectors_collection.find({'embeddings': {'$exists': True, '$not': {'$size': 0}}}, {'embeddings': 1})
         return list(cursor)
     except Exception as e:
         logger.error(f"Error fetching images: {e}")
@@ -57,18 +60,19 @@ def process_images(images: list[dict]) -> None:
     :param images: A list of image documents to process.
     """
     try:
-        all_embeddings = [emb for image in images for emb in image['embeddings']]
+        all_embeddings = [decode_vectors(image['embeddings']) for image in images if image['embeddings']]
 
         if not all_embeddings:
             logger.info("No embeddings found for clustering.")
             return
 
-        embeddings_array = np.array(all_embeddings)
+        embeddings_array = np.vstack(all_embeddings)
         clustering = dbscan.fit(embeddings_array)
 
         label_idx = 0
         for image in images:
-            current_document = sync_images_collection.find_one({'_id': image['_id']})
+            current_document = sync_images_collection.find_one(
+                {'_id': image['_id']}, {'unknown_faces': 1, 'backlog_faces': 1, 'user_faces': 1})
             unknown_faces = current_document.get('unknown_faces', 0)
             backlog_faces = current_document.get('backlog_faces', [])
             user_faces = current_document.get('user_faces', [])
@@ -105,7 +109,7 @@ def update_faces(image: dict, image_clusters: np.ndarray) -> None:
     :param image_clusters: The array of cluster labels for each face embedding in the image.
     """
     try:
-        current_document = sync_images_collection.find_one({'_id': image['_id']})
+        current_document = sync_images_collection.find_one({'_id': image['_id']}, {'user_faces': 1, 'backlog_faces': 1})
         current_user_faces = current_document.get('user_faces', [])
         current_backlog_faces = current_document.get('backlog_faces', [])
 
@@ -190,7 +194,7 @@ def fetch_all_embeddings() -> tuple[list[np.ndarray], list[ObjectId]] or None:
         embeddings = []
         ids = []
         for doc in cursor:
-            embeddings.append(np.array(doc['face_emb']))
+            embeddings.append(decode_vector(doc['face_emb']))
             ids.append(doc['_id'])
         return embeddings, ids
     except Exception as e:
@@ -258,6 +262,9 @@ def group_faces() -> None:
     """
     images = fetch_images()
     process_images(images)
+    if images:
+        # The auto faces of the images are reassigned, which the similarity index scores
+        publish_similarity_index_update_sync('update', [image['_id'] for image in images])
 
     embeddings, ids = fetch_all_embeddings()
     if not embeddings:
@@ -283,6 +290,7 @@ def update_names(old_name: str, new_name: str) -> bool:
             logger.error("Names must be strings")
             return False
 
+        image_ids = sync_images_collection.distinct('_id', {"user_faces": old_name})
         update_result = sync_images_collection.update_many(
             {"user_faces": old_name},
             {"$set": {
@@ -292,6 +300,7 @@ def update_names(old_name: str, new_name: str) -> bool:
         )
 
         if update_result.modified_count > 0:
+            publish_similarity_index_update_sync('update', image_ids)
             logger.info(f"Successfully updated {update_result.modified_count} documents.")
             return True
         else:
@@ -305,38 +314,44 @@ def update_names(old_name: str, new_name: str) -> bool:
 @shared_task(name=DELETE_FACES_TASK, queue=MAIN_QUEUE)
 def delete_faces_associated_with_images(image_ids: list) -> bool:
     """
-    Deletes faces associated with given images from the sync_faces_collection.
+    Deletes faces associated with given images from the sync_faces_collection, together with
+    the images' documents in the vectors collection.
 
     :param image_ids: The list of IDs of the images whose associated faces are to be deleted.
     :return: True if the deletion was successful, False otherwise.
     """
-    delete_operations = []
-
-    image_embeddings = {}
-    for image_id in image_ids:
-        image_id = to_object_id(image_id)
-        image_doc = sync_images_collection.find_one({'_id': image_id})
-        if image_doc is not None:
-            image_embeddings[image_id] = image_doc.get('embeddings', [])
-
-    face_docs = list(sync_faces_collection.find({}))
-    face_embeddings = [doc.get('face_emb', []) for doc in face_docs]
-
-    tree = BallTree(face_embeddings)
+    try:
+        image_ids = [to_object_id(image_id) for image_id in image_ids]
+        image_embeddings = {}
+        for vectors_doc in sync_vectors_collection.find({'_id': {'$in': image_ids}}, {'embeddings': 1}):
+            image_embeddings[vectors_doc['_id']] = decode_vectors(vectors_doc.get('embeddings', []))
+
+        # Done before matching the faces, so deleted images leave the vectors collection and face indexes
+        # even if the matching fails
+        sync_vectors_collection.delete_many({'_id': {'$in': image_ids}})
+        for image_id in image_ids:
+            publish_face_index_update(image_id, None)
+
+        if not any(len(embeddings) for embeddings in image_embeddings.values()):
+            return True
 
-    for image_id, embeddings in image_embeddings.items():
-        for emb in embeddings:
-            indices = tree.query_radius([emb], r=FACE_DELETE_THRESHOLD)
+        face_docs = list(sync_faces_collection.find({}, {'face_emb': 1}))
+        if not face_docs:
+            return True
 
-            for index in indices[0]:
-                delete_operations.append(DeleteOne({'_id': to_object_id(face_docs[index]['_id'])}))
+        tree = BallTree([decode_vector(doc.get('face_emb')) for doc in face_docs])
+        delete_operations = []
+        for embeddings in image_embeddings.values():
+            for emb in embeddings:
+                indices = tree.query_radius([emb], r=FACE_DELETE_THRESHOLD)
+                for index in indices[0]:
+                    delete_operations.append(DeleteOne({'_id': to_object_id(face_docs[index]['_id'])}))
 
-    if delete_operations:
-        try:
+        if delete_operations:
             delete_result = sync_faces_collection.bulk_write(delete_operations)
             logger.info(f"Successfully deleted {delete_result.deleted_count} faces.")
-        except Exception as e:
-            logger.error(f"Error performing bulk delete operation: {e}")
-            return False
+    except Exception as e:
+        logger.error(f"Error deleting faces associated with images: {e}")
+        return False
 
     return True
@@ -0,0 +1,258 @@
+"""
+data/databases/redis_db/redis_tools.py
+
+Contains utility functions for application state shared through Redis between the API and the Celery
+workers, such as version counters used to invalidate in-process caches, the streams of face and similarity index
+updates and the buffer of image views written to the database in bulk.
+"""
+
+import uuid
+import numpy as np
+from config.logging_config import setup_logging
+from redis.exceptions import ResponseError
+from config.redis_config import get_redis_client
+from utils.constants import TAG_VOCABULARY_VERSION_KEY, SIMILARITY_INDEX_GENERATION_KEY, FACE_INDEX_STREAM_KEY, \
+    FACE_INDEX_STREAM_MAX_LEN, IMAGE_VIEWS_PENDING_KEY, IMAGE_VIEWS_FLUSHING_KEY, SIMILARITY_INDEX_STREAM_KEY, \
+    SIMILARITY_INDEX_STREAM_MAX_LEN, IMAGE_VIEWS_FLUSH_ID_FIELD
+
+logger = setup_logging(__name__)
+
+async_redis_client = get_redis_client(async_mode=True)
+sync_redis_client = get_redis_client(async_mode=False)
+
+
+async def bump_tag_vocabulary_version() -> None:
+    """
+    Increments the tag vocabulary version, signalling cached vocabularies to reload.
+    """
+    try:
+        await async_redis_client.incr(TAG_VOCABULARY_VERSION_KEY)
+    except Exception as e:
+        logger.error(f"Error bumping tag vocabulary version: {e}")
+
+
+def get_tag_vocabulary_version() -> int or None:
+    """
+    Retrieves the current tag vocabulary version.
+
+    :return: The version, or None if it was never bumped or cannot be read.
+    """
+    try:
+        version = sync_redis_client.get(TAG_VOCABULARY_VERSION_KEY)
+        return int(version) if version is not None else None
+    except Exception as e:
+        logger.error(f"Error retrieving tag vocabulary version: {e}")
+        return None
+
+
+async def bump_similarity_index_generation() -> None:
+    """
+    Increments the similarity index generation, signalling that images were added or removed, so cached
+    similar image results are no longer served and similarity indexes are rebuilt.
+    """
+    try:
+        await async_redis_client.incr(SIMILARITY_INDEX_GENERATION_KEY)
+    except Exception as e:
+        logger.error(f"Error bumping similarity index generation: {e}")
+
+
+def bump_similarity_index_generation_sync() -> None:
+    """
+    Increments the similarity index generation from a Celery worker.
+    """
+    try:
+        sync_redis_client.incr(SIMILARITY_INDEX_GENERATION_KEY)
+    except Exception as e:
+        logger.error(f"Error bumping similarity index generation: {e}")
+
+
+async def get_similarity_index_generation() -> int or None:
+    """
+    Retrieves the current similarity index generation.
+
+    :return: The generation, 0 if it was never bumped, or None if it cannot be read.
+    """
+    try:
+        generation = await async_redis_client.get(SIMILARITY_INDEX_GENERATION_KEY)
+        return int(generation) if generation is not None else 0
+    except Exception as e:
+        logger.error(f"Error retrieving similarity index generation: {e}")
+        return None
+
+
+def publish_face_index_update(image_id: str, embeddings: list[list[float]] or None) -> None:
+    """
+    Appends an update of the faces of an image to the face index stream.
+
+    :param image_id: The ID of the image.
+    :param embeddings: The face embeddings of the image, or None if the image was deleted.
+    """
+    try:
+        fields = {'image_id': str(image_id)}
+        if embeddings is None:
+            fields['op'] = 'delete'
+        else:
+            embeddings = np.asarray(embeddings, dtype=np.float32)
+            fields.update({'op': 'add', 'count': len(embeddings), 'embeddings': embeddings.tobytes()})
+        sync_redis_client.xadd(FACE_INDEX_STREAM_KEY, fields, maxlen=FACE_INDEX_STREAM_MAX_LEN, approximate=True)
+    except Exception as e:
+        logger.error(f"Error publishing face index update: {e}")
+
+
+def decode_face_index_update(fields: dict) -> tuple[str, np.ndarray or None]:
+    """
+    Decodes an entry of the face index stream.
+
+    :param fields: The fields of the stream entry.
+    :return: A tuple of the image ID and its face embeddings as a 2D array, or None if the image was deleted.
+    """
+    image_id = fields[b'image_id'].decode()
+    if fields[b'op'] == b'delete':
+        return image_id, None
+    count = int(fields[b'count'])
+    embeddings = np.frombuffer(fields[b'embeddings'], dtype=np.float32)
+    return image_id, embeddings.reshape(count, -1) if count else np.empty((0, 0), dtype=np.float32)
+
+
+async def get_face_index_stream_position() -> str:
+    """
+    Retrieves the ID of the latest entry of the face index stream.
+
+    :return: The entry ID, or '0-0' if the stream is empty.
+    """
+    entries = await async_redis_client.xrevrange(FACE_INDEX_STREAM_KEY, count=1)
+    return entries[0][0].decode() if entries else '0-0'
+
+
+async def read_face_index_updates(position: str) -> list[tuple[str, str, np.ndarray or None]] or None:
+    """
+    Reads the face index updates published after a stream position.
+
+    :param position: The ID of the last entry already applied, or '0-0'.
+    :return: A list of (entry ID, image ID, embeddings) tuples, or None if entries after the position were
+        already trimmed from the stream and the index must be rebuilt.
+    """
+    if position != '0-0' and not await async_redis_client.xrange(FACE_INDEX_STREAM_KEY, position, position):
+        return None
+    entries = await async_redis_client.xrange(FACE_INDEX_STREAM_KEY, f"({position}", '+')
+    return [(entry_id.decode(), *decode_face_index_update(fields)) for entry_id, fields in entries]
+
+
+def similarity_index_update_fields(op: str, image_ids: list) -> dict:
+    """
+    Builds the fields of an entry of the similarity index stream.
+
+    :param op: 'add' for images whose features were stored, 'update' for images whose tags, faces or album
+        changed, or 'delete' for deleted images.
+    :param image_ids: The IDs of the images.
+    :return: The fields of the stream entry.
+    """
+    return {'op': op, 'image_ids': ','.join(str(image_id) for image_id in image_ids)}
+
+
+async def publish_similarity_index_update(op: str, image_ids: list) -> None:
+    """
+    Appends an update of images to the similarity index stream.
+
+    :param op: 'add', 'update' or 'delete', as described in similarity_index_update_fields.
+    :param image_ids: The IDs of the images.
+    """
+    if not image_ids:
+        return
+    try:
+        await async_redis_client.xadd(SIMILARITY_INDEX_STREAM_KEY, similarity_index_update_fields(op, image_ids),
+                                      maxlen=SIMILARITY_INDEX_STREAM_MAX_LEN, approximate=True)
+    except Exception as e:
+        logger.error(f"Error publishing similarity index update: {e}")
+
+
+def publish_similarity_index_update_sync(op: str, image_ids: list) -> None:
+    """
+    Appends an update of images to the similarity index stream from a Celery worker.
+
+    :param op: 'add', 'update' or 'delete', as described in similarity_index_update_fields.
+    :param image_ids: The IDs of the images.
+    """
+    if not image_ids:
+        return
+    try:
+        sync_redis_client.xadd(SIMILARITY_INDEX_STREAM_KEY, similarity_index_update_fields(op, image_ids),
+                               maxlen=SIMILARITY_INDEX_STREAM_MAX_LEN, approximate=True)
+    except Exception as e:
+        logger.error(f"Error publishing similarity index update: {e}")
+
+
+async def get_similarity_index_stream_position() -> str:
+    """
+    Retrieves the ID of the latest entry of the similarity index stream.
+
+    :return: The entry ID, or '0-0' if the stream is empty.
+    """
+    entries = await async_redis_client.xrevrange(SIMILARITY_INDEX_STREAM_KEY, count=1)
+    return entries[0][0].decode() if entries else '0-0'
+
+
+async def read_similarity_index_updates(position: str) -> list[tuple[str, str, list[str]]] or None:
+    """
+    Reads the similarity index updates published after a stream position.
+
+    :param position: The ID of the last entry already applied, or '0-0'.
+    :return: A list of (entry ID, op, image IDs) tuples, or None if entries after the position were already
+        trimmed from the stream and the index must be rebuilt.
+    """
+    if position != '0-0' and not await async_redis_client.xrange(SIMILARITY_INDEX_STREAM_KEY, position, position):
+        return None
+    entries = await async_redis_client.xrange(SIMILARITY_INDEX_STREAM_KEY, f"({position}", '+')
+    return [(entry_id.decode(), fields[b'op'].decode(), fields[b'image_ids'].decode().split(','))
+            for entry_id, fields in entries]
+
+
+async def buffer_image_view(image_id: str) -> bool:
+    """
+    Records a view of an image in the view buffer, to be written to the database by the next flush.
+
+    :param image_id: The ID of the viewed image.
+    :return: True if the view was recorded, False otherwise.
+    """
+    try:
+        await async_redis_client.hincrby(IMAGE_VIEWS_PENDING_KEY, str(image_id), 1)
+        return True
+    except Exception as e:
+        logger.error(f"Error buffering image view: {e}")
+        return False
+
+
+def take_buffered_image_views() -> tuple[str or None, dict[str, int]]:
+    """
+    Takes the views buffered since the last flush. The buffer is moved aside atomically, so views recorded
+    meanwhile go to a new buffer. Views taken by a flush that did not finish are returned again, before any
+    newer views, with the same flush ID.
+
+    :return: A tuple of the ID of the flush, which stays the same until the views are cleared, and a mapping
+        of image IDs to their number of views.
+    """
+    try:
+        if not sync_redis_client.exists(IMAGE_VIEWS_FLUSHING_KEY):
+            try:
+                sync_redis_client.rename(IMAGE_VIEWS_PENDING_KEY, IMAGE_VIEWS_FLUSHING_KEY)
+            except ResponseError:  # No views were buffered
+                return None, {}
+        # Only set if missing, so a retried flush keeps the ID the views were first written with
+        sync_redis_client.hsetnx(IMAGE_VIEWS_FLUSHING_KEY, IMAGE_VIEWS_FLUSH_ID_FIELD, uuid.uuid4().hex)
+        views = {field.decode(): value.decode() for field, value in
+                 sync_redis_client.hgetall(IMAGE_VIEWS_FLUSHING_KEY).items()}
+        flush_id = views.pop(IMAGE_VIEWS_FLUSH_ID_FIELD)
+        return flush_id, {image_id: int(count) for image_id, count in views.items()}
+    except Exception as e:
+        logger.error(f"Error taking buffered image views: {e}")
+        return None, {}
+
+
+def clear_taken_image_views() -> None:
+    """
+    Discards the views taken by take_buffered_image_views once they are written to the database.
+    """
+    try:
+        sync_redis_client.delete(IMAGE_VIEWS_FLUSHING_KEY)
+    except Exception as e:
+        logger.error(f"Error clearing taken image views: {e}")
@@ -3,7 +3,8 @@ services/authentication/auth.py
 
 Provides authentication functionalities for the application, including user authentication,
 password verification, token creation, and retrieval of current user information based on tokens.
-Utilizes JWT for token management and Argon2 for password hashing.
+Utilizes JWT for token management and Argon2 for password hashing. Users of verified tokens
+are served from an in-process cache with a short TTL.
 """
 
 from datetime import datetime, timedelta
@@ -11,29 +12,30 @@ from jose import JWTError, jwt
 from fastapi import Depends, Request
 from fastapi.security import OAuth2PasswordBearer
 from data.databases.mongodb.async_db.database_tools import get_user
-from argon2 import PasswordHasher
 import argon2.exceptions
 from config.logging_config import setup_logging
 from api.schemas.auth_schema import TokenData, User
+from services.authentication.user_cache import user_cache
+from services.authentication.password_hashing import password_hashing
+from utils.metrics import CACHE_LOOKUPS
 from utils.constants import SECRET_KEY_AUTH, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS
 from utils.exceptions import credentials_exception, invalid_credentials_exception, create_token_exception
 
 logger = setup_logging(__name__)
 
-ph = PasswordHasher()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
 async def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
-    Verifies if the given plain password matches the hashed password using Argon2.
+    Verifies if the given plain password matches the hashed password using Argon2, off the event loop.
 
     :param plain_password: The plain text password to verify.
     :param hashed_password: The hashed password to compare against.
     :return: True if the passwords match, False otherwise.
     """
     try:
-        ph.verify(hashed_password, plain_password)
+        await password_hashing.verify(hashed_password, plain_password)
         return True
     except argon2.exceptions.VerifyMismatchError:
         return False
@@ -132,10 +134,18 @@ async def decode_token(token: str, expected_type: str) -> User or None:
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
+
+    user_model = user_cache.get(token_data.username)
+    CACHE_LOOKUPS.labels('user', 'miss' if user_model is None else 'local').inc()
+    if user_model is not None:
+        return user_model
+
     user = await get_user(username=token_data.username)
     if user is None:
         raise credentials_exception
-    return User(**user)
+    user_model = User(**user)
+    user_cache.set(user_model)
+    return user_model
 
 
 async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)) -> User or None:
@@ -0,0 +1,157 @@
+"""
+services/authentication/password_hashing.py
+
+Runs Argon2 password hashing and verification off the event loop. Argon2 is deliberately CPU- and memory-hard,
+so each operation takes tens of milliseconds; run inline, a burst of logins would stall every other request
+served by the worker. Operations run in a small thread pool, with at most PASSWORD_HASHING_WORKERS at a time
+and at most PASSWORD_HASHING_MAX_QUEUE waiting, beyond which they are rejected. The time operations spend
+queued and running is recorded, so the API can report how close logins are to saturating the pool.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from argon2 import PasswordHasher
+from config.logging_config import setup_logging
+from config.redis_config import get_redis_client
+from utils.constants import PASSWORD_HASHING_WORKERS, PASSWORD_HASHING_MAX_QUEUE, PASSWORD_HASHING_STATS_KEY
+from utils.exceptions import password_hashing_busy_exception
+
+logger = setup_logging(__name__)
+
+async_redis_client = get_redis_client(async_mode=True)
+
+OPERATIONS = ('hash', 'verify')
+
+
+class PasswordHashingPool:
+    """
+    A bounded pool running Argon2 operations.
+
+    Attributes:
+        hasher (PasswordHasher): The Argon2 password hasher.
+        executor (ThreadPoolExecutor): The threads running the operations.
+        workers (int): The maximum number of operations running at a time.
+        max_queue (int): The maximum number of operations waiting to run.
+        semaphore (asyncio.Semaphore or None): Caps the running operations, created on first use.
+        queued (int): The number of operations waiting to run.
+        running (int): The number of operations running.
+    """
+    def __init__(self, workers: int = PASSWORD_HASHING_WORKERS, max_queue: int = PASSWORD_HASHING_MAX_QUEUE):
+        """
+        Initializes the pool.
+
+        :param workers: The maximum number of operations running at a time.
+        :param max_queue: The maximum number of operations waiting to run.
+        """
+        self.hasher = PasswordHasher()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='argon2')
+        self.workers = workers
+        self.max_queue = max_queue
+        self.semaphore = None
+        self.queued = 0
+        self.running = 0
+
+    async def _run(self, operation: str, function, *args):
+        """
+        Runs an Argon2 operation in the pool once a worker is free.
+
+        :param operation: The name of the operation ('hash' or 'verify').
+        :param function: The function to run.
+        :param args: The arguments of the function.
+        :return: The result of the function.
+        :raises password_hashing_busy_exception: If too many operations are already waiting.
+        """
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.workers)
+        if self.queued >= self.max_queue:
+            await record_password_hashing('rejected')
+            raise password_hashing_busy_exception
+
+        queued_at = time.perf_counter()
+        self.queued += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.queued -= 1
+
+        started_at = time.perf_counter()
+        self.running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, function, *args)
+        finally:
+            self.running -= 1
+            self.semaphore.release()
+            await record_password_hashing(operation, started_at - queued_at, time.perf_counter() - started_at)
+
+    async def hash(self, password: str) -> str:
+        """
+        Hashes a password.
+
+        :param password: The plain text password to hash.
+        :return: The hashed password.
+        """
+        return await self._run('hash', self.hasher.hash, password)
+
+    async def verify(self, hashed_password: str, plain_password: str) -> bool:
+        """
+        Verifies a password against a hash.
+
+        :param hashed_password: The hashed password to compare against.
+        :param plain_password: The plain text password to verify.
+        :return: True if the passwords match.
+        :raises argon2.exceptions.VerifyMismatchError: If the passwords do not match.
+        :raises argon2.exceptions.InvalidHashError: If the hash is malformed.
+        """
+        return await self._run('verify', self.hasher.verify, hashed_password, plain_password)
+
+
+password_hashing = PasswordHashingPool()
+
+
+async def record_password_hashing(operation: str, wait_seconds: float = 0.0, run_seconds: float = 0.0) -> None:
+    """
+    Records an Argon2 operation in the statistics.
+
+    :param operation: The name of the operation ('hash' or 'verify'), or 'rejected' for a rejected operation.
+    :param wait_seconds: The time in seconds the operation waited for a worker.
+    :param run_seconds: The time in seconds the operation ran.
+    """
+    try:
+        async with async_redis_client.pipeline(transaction=False) as pipe:
+            pipe.hincrby(PASSWORD_HASHING_STATS_KEY, f"{operation}_count", 1)
+            if operation in OPERATIONS:
+                pipe.hincrbyfloat(PASSWORD_HASHING_STATS_KEY, f"{operation}_wait_seconds", wait_seconds)
+                pipe.hincrbyfloat(PASSWORD_HASHING_STATS_KEY, f"{operation}_run_seconds", run_seconds)
+            await pipe.execute()
+    except Exception as e:
+        logger.error(f"Error recording password hashing stats: {e}")
+
+
+async def get_password_hashing_stats() -> dict or None:
+    """
+    Retrieves the queueing statistics of password hashing and verification.
+
+    :return: A dictionary with, for each operation, the number of operations and their average time queued and
+        running in milliseconds, the number of rejected operations, and the operations currently queued and
+        running in this process, or None if an error occurs.
+    """
+    try:
+        raw = await async_redis_client.hgetall(PASSWORD_HASHING_STATS_KEY)
+        raw = {key.decode(): float(value) for key, value in raw.items()}
+        stats = {}
+        for operation in OPERATIONS:
+            count = int(raw.get(f"{operation}_count", 0))
+            stats[operation] = {
+                'count': count,
+                'avg_wait_ms': round(raw.get(f"{operation}_wait_seconds", 0.0) / count * 1000, 3) if count else None,
+                'avg_run_ms': round(raw.get(f"{operation}_run_seconds", 0.0) / count * 1000, 3) if count else None
+            }
+        stats['rejected'] = int(raw.get('rejected_count', 0))
+        stats['queued'] = password_hashing.queued
+        stats['running'] = password_hashing.running
+        return stats
+    except Exception as e:
+        logger.error(f"Error retrieving password hashing stats: {e}")
+        return None
@@ -8,18 +8,16 @@ argon2 for password hashing.
 
 from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
 from jose import jwt
-from argon2 import PasswordHasher
 from config.logging_config import setup_logging
 from utils.constants import (
     SECRET_KEY_AUTH, ALGORITHM, MAIL_USERNAME, MAIL_APP_PASSWORD,
     MAIL_FROM, MAIL_FROM_NAME, CONFIRMATION_URL, EMAIL_SUBTYPE, EMAIL_BODY_TEMPLATE, EMAIL_SUBJECT
 )
+from services.authentication.password_hashing import password_hashing
 from utils.exceptions import send_confirmation_email_exception
 
 logger = setup_logging(__name__)
 
-ph = PasswordHasher()
-
 
 def get_connection_config() -> ConnectionConfig:
     """
@@ -43,12 +41,12 @@ def get_connection_config() -> ConnectionConfig:
 
 async def hash_password(password: str) -> str:
     """
-    Hashes a password using the Argon2 algorithm.
+    Hashes a password using the Argon2 algorithm, off the event loop.
 
     :param password: The plain text password to hash.
     :return: The hashed password.
     """
-    return ph.hash(password)
+    return await password_hashing.hash(password)
 
 
 def create_confirmation_token(user_id: str) -> str:
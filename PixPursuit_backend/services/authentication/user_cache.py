@@ -0,0 +1,75 @@
+"""
+services/authentication/user_cache.py
+
+Caches the User models of authenticated users in process, so requests with a verified token do not look the
+user up in the database every time. Entries expire after a short TTL, which bounds how long other API workers
+can serve a user changed elsewhere; writes to a user document in this process invalidate the user's entry
+right away.
+"""
+
+import time
+from collections import OrderedDict
+from api.schemas.auth_schema import User
+from utils.constants import USER_CACHE_MAX_SIZE, USER_CACHE_TTL
+
+
+class UserCache:
+    """
+    An in-process LRU cache of User models with a TTL.
+
+    Attributes:
+        max_size (int): The maximum number of cached users.
+        ttl (float): The time in seconds users stay cached.
+        entries (OrderedDict): The cached users by username, least recently used first, as (expires at, user).
+    """
+    def __init__(self, max_size: int = USER_CACHE_MAX_SIZE, ttl: float = USER_CACHE_TTL):
+        """
+        Initializes the cache.
+
+        :param max_size: The maximum number of cached users.
+        :param ttl: The time in seconds users stay cached.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+
+    def get(self, username: str) -> User or None:
+        """
+        Looks up a cached user.
+
+        :param username: The username of the user.
+        :return: The User model, or None if the user is not cached or the entry expired.
+        """
+        entry = self.entries.get(username)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self.entries[username]
+            return None
+        self.entries.move_to_end(username)
+        return entry[1]
+
+    def set(self, user: User) -> None:
+        """
+        Caches a user, evicting the least recently used users beyond the maximum size.
+
+        :param user: The User model to cache.
+        """
+        self.entries[user.username] = (time.monotonic() + self.ttl, user)
+        self.entries.move_to_end(user.username)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, username: str = None) -> None:
+        """
+        Drops a user from the cache.
+
+        :param username: The username of the user, or None to drop all users.
+        """
+        if username is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(username, None)
+
+
+user_cache = UserCache()
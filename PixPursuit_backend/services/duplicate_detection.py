@@ -0,0 +1,97 @@
+"""
+services/duplicate_detection.py
+
+Groups near-duplicate images across the library. Every processed image stores the perceptual hash of its
+contents; a periodic job indexes all hashes in a MultiIndexHash, groups the images whose hashes are within
+DUPLICATE_MAX_DISTANCE of the group's oldest image, and records the group on each image as 'duplicate_group', the
+ID of that image. The API lists the groups from these fields.
+"""
+
+from celery import shared_task
+from pymongo import UpdateOne
+from config.logging_config import setup_logging
+from data.databases.mongodb.async_db.database_tools import images_collection
+from data.databases.mongodb.sync_db.celery_database_tools import stream_image_hashes, bulk_update_images
+from services.hash_index import MultiIndexHash
+from utils.constants import GROUP_DUPLICATES_TASK, BEAT_QUEUE, DHASH_SIZE, DUPLICATE_MAX_DISTANCE, \
+    DUPLICATE_GROUPS_BATCH_SIZE
+
+logger = setup_logging(__name__)
+
+
+def find_duplicate_groups(hashes: dict) -> dict:
+    """
+    Groups near-duplicate images by their perceptual hashes.
+
+    :param hashes: A mapping of image IDs to their hashes as hexadecimal strings.
+    :return: A mapping of the IDs of grouped images to the ID of their group's oldest image.
+    """
+    index = MultiIndexHash(DHASH_SIZE * DHASH_SIZE, DUPLICATE_MAX_DISTANCE)
+    # Indexed oldest first, so the oldest image of each group is its representative
+    for image_id in sorted(hashes):
+        index.add(image_id, int(hashes[image_id], 16))
+
+    assignments = {}
+    for group in index.groups():
+        group_id = str(group[0])
+        for image_id in group:
+            assignments[image_id] = group_id
+    return assignments
+
+
+@shared_task(name=GROUP_DUPLICATES_TASK, queue=BEAT_QUEUE)
+def group_duplicates() -> None:
+    """
+    Groups the near-duplicate images of the library and updates the images whose group changed.
+
+    This function is a Celery task that runs on the BEAT_QUEUE.
+    """
+    hashes, current = {}, {}
+    for image in stream_image_hashes(DUPLICATE_GROUPS_BATCH_SIZE):
+        if image.get('dhash'):
+            hashes[image['_id']] = image['dhash']
+        if image.get('duplicate_group'):
+            current[image['_id']] = image['duplicate_group']
+
+    assignments = find_duplicate_groups(hashes)
+
+    operations = [UpdateOne({'_id': image_id}, {'$set': {'duplicate_group': group_id}})
+                  for image_id, group_id in assignments.items() if current.get(image_id) != group_id]
+    operations += [UpdateOne({'_id': image_id}, {'$unset': {'duplicate_group': ''}})
+                   for image_id in current if image_id not in assignments]
+
+    updated = 0
+    for start in range(0, len(operations), DUPLICATE_GROUPS_BATCH_SIZE):
+        updated += bulk_update_images(operations[start:start + DUPLICATE_GROUPS_BATCH_SIZE])
+
+    groups = len(set(assignments.values()))
+    logger.info(f"Grouped {len(assignments)} of {len(hashes)} hashed images into {groups} duplicate groups, "
+                f"updated {updated} images")
+
+
+async def get_duplicate_groups(skip: int = 0, limit: int = 20) -> list[dict] or None:
+    """
+    Lists groups of near-duplicate images, largest first.
+
+    :param skip: The number of groups to skip.
+    :param limit: The maximum number of groups to return.
+    :return: A list of groups, each with the group ID, the number of images and the images' IDs and thumbnail
+        URLs, oldest first, or None if an error occurs.
+    """
+    try:
+        pipeline = [
+            {'$match': {'duplicate_group': {'$exists': True}}},
+            {'$sort': {'_id': 1}},
+            {'$group': {
+                '_id': '$duplicate_group',
+                'count': {'$sum': 1},
+                'images': {'$push': {'_id': {'$toString': '$_id'}, 'thumbnail_url': '$thumbnail_url'}}
+            }},
+            {'$sort': {'count': -1, '_id': 1}},
+            {'$skip': skip},
+            {'$limit': limit}
+        ]
+        return await images_collection.aggregate(pipeline).to_list(length=limit)
+    except Exception as e:
+        logger.error(f"Error retrieving duplicate groups: {e}")
+        return None
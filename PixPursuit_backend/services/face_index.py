@@ -0,0 +1,185 @@
+"""
+services/face_index.py
+
+This module contains the FaceIndex class, an exact in-memory index of face embeddings with back-references to
+the image each face belongs to and its position among the image's faces. Faces of an image are added and removed
+together, so the index can be updated incrementally as images are processed or deleted. Searches compute the
+Euclidean distance to every face, as the faces are grouped by DBSCAN, and rank images by their closest face.
+"""
+
+import numpy as np
+
+INITIAL_CAPACITY = 1024
+
+
+class FaceIndex:
+    """
+    An exact index of face embeddings.
+
+    Attributes:
+        embeddings (np.ndarray or None): The float32 embedding matrix, with spare rows for appending.
+        squared_norms (np.ndarray or None): The squared norm of each embedding.
+        image_codes (np.ndarray): For each row, the code of the image the face belongs to.
+        face_numbers (np.ndarray): For each row, the position of the face among the faces of its image.
+        active (np.ndarray): For each row, whether the face is still indexed.
+        size (int): The number of used rows, including removed faces.
+        count (int): The number of indexed faces.
+        image_ids (list[str]): The image ID of each image code.
+        image_rows (dict[str, np.ndarray]): A mapping of image IDs to the rows of their faces.
+    """
+    def __init__(self):
+        self.embeddings = None
+        self.squared_norms = None
+        self.image_codes = np.empty(0, dtype=np.int64)
+        self.face_numbers = np.empty(0, dtype=np.int32)
+        self.active = np.empty(0, dtype=bool)
+        self.size = 0
+        self.count = 0
+        self.image_ids = []
+        self.image_rows = {}
+
+    def __len__(self) -> int:
+        return self.count
+
+    @classmethod
+    def build(cls, images: list[tuple[str, np.ndarray]]) -> 'FaceIndex':
+        """
+        Builds the index from the face embeddings of images.
+
+        :param images: A list of (image ID, embeddings) tuples, the embeddings as a 2D array.
+        :return: The built index.
+        """
+        index = cls()
+        for image_id, embeddings in images:
+            index.add(image_id, embeddings)
+        return index
+
+    def _reserve(self, rows: int, dimension: int) -> None:
+        """
+        Grows the arrays so `rows` more faces can be appended.
+
+        :param rows: The number of rows to append.
+        :param dimension: The embedding dimension.
+        """
+        if self.embeddings is None:
+            self.embeddings = np.empty((0, dimension), dtype=np.float32)
+            self.squared_norms = np.empty(0, dtype=np.float32)
+        capacity = len(self.embeddings)
+        if self.size + rows <= capacity:
+            return
+        capacity = max(INITIAL_CAPACITY, capacity * 2, self.size + rows)
+        embeddings = np.zeros((capacity, dimension), dtype=np.float32)
+        embeddings[:self.size] = self.embeddings[:self.size]
+        self.embeddings = embeddings
+        self.squared_norms = np.resize(self.squared_norms, capacity)
+        self.image_codes = np.resize(self.image_codes, capacity)
+        self.face_numbers = np.resize(self.face_numbers, capacity)
+        self.active = np.resize(self.active, capacity)
+        self.active[self.size:] = False
+
+    def add(self, image_id: str, embeddings: np.ndarray) -> None:
+        """
+        Indexes the faces of an image, replacing any faces indexed for it before.
+
+        :param image_id: The ID of the image.
+        :param embeddings: The face embeddings of the image as a 2D array, in the order of the image's faces.
+        """
+        image_id = str(image_id)
+        self.remove(image_id)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim != 2 or embeddings.shape[0] == 0:
+            return
+        if self.embeddings is not None and embeddings.shape[1] != self.embeddings.shape[1]:
+            return
+
+        self._reserve(len(embeddings), embeddings.shape[1])
+        rows = np.arange(self.size, self.size + len(embeddings))
+        self.embeddings[rows] = embeddings
+        self.squared_norms[rows] = np.einsum('ij,ij->i', embeddings, embeddings)
+        self.image_codes[rows] = len(self.image_ids)
+        self.face_numbers[rows] = np.arange(len(embeddings))
+        self.active[rows] = True
+        self.image_ids.append(image_id)
+        self.image_rows[image_id] = rows
+        self.size += len(embeddings)
+        self.count += len(embeddings)
+
+    def remove(self, image_id: str) -> None:
+        """
+        Removes the faces of an image from the index. The rows are reclaimed once most rows are removed.
+
+        :param image_id: The ID of the image.
+        """
+        rows = self.image_rows.pop(str(image_id), None)
+        if rows is None:
+            return
+        self.active[rows] = False
+        self.count -= len(rows)
+        if self.size > INITIAL_CAPACITY and self.count < self.size // 2:
+            self._compact()
+
+    def apply(self, updates: list[tuple[str, np.ndarray or None]]) -> None:
+        """
+        Applies updates of the faces of images in order.
+
+        :param updates: A list of (image ID, embeddings) tuples, the embeddings None for a deleted image.
+        """
+        for image_id, embeddings in updates:
+            if embeddings is None:
+                self.remove(image_id)
+            else:
+                self.add(image_id, embeddings)
+
+    def _compact(self) -> None:
+        """
+        Drops the rows of removed faces.
+        """
+        images = [(image_id, self.embeddings[rows]) for image_id, rows in self.image_rows.items()]
+        compacted = FaceIndex.build(images)
+        self.__dict__.update(compacted.__dict__)
+
+    def embedding(self, image_id: str, face_number: int) -> np.ndarray or None:
+        """
+        Returns the embedding of a face of an indexed image.
+
+        :param image_id: The ID of the image.
+        :param face_number: The position of the face among the faces of the image.
+        :return: The embedding, or None if the face is not indexed.
+        """
+        rows = self.image_rows.get(str(image_id))
+        if rows is None or not 0 <= face_number < len(rows):
+            return None
+        return self.embeddings[rows[face_number]]
+
+    def search(self, query: np.ndarray, limit: int, max_distance: float,
+               exclude: str = None) -> list[tuple[str, int, float]]:
+        """
+        Finds the images with the faces closest to a query face.
+
+        :param query: The query face embedding.
+        :param limit: The maximum number of images to return.
+        :param max_distance: The maximum distance of a matching face.
+        :param exclude: The ID of an image to leave out, usually the image of the query face.
+        :return: A list of (image ID, face position, distance) tuples for the closest face of each
+            matching image, closest first.
+        """
+        if self.size == 0:
+            return []
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        if query.size != self.embeddings.shape[1]:
+            return []
+
+        squared = self.squared_norms[:self.size] + query @ query - 2 * (self.embeddings[:self.size] @ query)
+        matching = self.active[:self.size] & (squared <= max_distance ** 2)
+        excluded = self.image_rows.get(str(exclude)) if exclude is not None else None
+        if excluded is not None:
+            matching[excluded] = False
+
+        rows = np.flatnonzero(matching)
+        rows = rows[np.argsort(squared[rows], kind='stable')]
+        # The first occurrence of each image in distance order is its closest face
+        _, first = np.unique(self.image_codes[rows], return_index=True)
+        rows = rows[np.sort(first)][:limit]
+        distances = np.sqrt(np.maximum(squared[rows], 0))
+        return [(self.image_ids[self.image_codes[row]], int(self.face_numbers[row]), float(distance))
+                for row, distance in zip(rows, distances)]
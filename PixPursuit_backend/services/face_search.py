@@ -0,0 +1,172 @@
+"""
+services/face_search.py
+
+This module contains the FaceSearch class which finds the images containing a given face. The face is either
+a detected face of a library image, given by the image ID and the position of the face, or an uploaded face crop.
+Faces are searched in an in-memory FaceIndex built from the face embeddings in the vectors collection on first use
+and kept up to date by replaying the face index stream, to which data extraction appends the faces of every
+processed image and face deletion appends the deleted images.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from config.logging_config import setup_logging
+from data.databases.mongodb.async_db.database_tools import images_collection, vectors_collection
+from data.databases.redis_db.redis_tools import get_face_index_stream_position, read_face_index_updates
+from data.data_extraction.face_detection import get_face_embedding
+from services.face_index import FaceIndex
+from utils.constants import FACE_MATCH_THRESHOLD, FACE_CROP_DECODE_SIZE
+from utils.function_utils import decode_query_image, to_object_id
+from utils.vector_codec import decode_vectors
+
+logger = setup_logging(__name__)
+
+
+class FaceSearch:
+    def __init__(self):
+        """
+        Initializes the FaceSearch class with a ThreadPoolExecutor and an empty index.
+        """
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.index = None
+        self.position = '0-0'
+        self.lock = None
+
+    async def _load_index(self) -> tuple[FaceIndex, str]:
+        """
+        Loads the face embeddings of all images from the database and builds the face index.
+
+        :return: A tuple of the built index and the face index stream position it reflects.
+        """
+        # Updates published while loading are replayed afterwards; replaying an image twice is harmless
+        position = await get_face_index_stream_position()
+        cursor = vectors_collection.find({'embeddings': {'$exists': True, '$ne': []}}, {'embeddings': 1})
+        documents = [(str(doc['_id']), doc['embeddings']) async for doc in cursor]
+        loop = asyncio.get_running_loop()
+        index = await loop.run_in_executor(self.executor, self._build_index, documents)
+        logger.info(f"Built face index with {len(index)} faces")
+        return index, position
+
+    @staticmethod
+    def _build_index(documents: list[tuple[str, list]]) -> FaceIndex:
+        """
+        Decodes the stored face embeddings of images and builds the face index from them.
+
+        :param documents: A list of (image ID, encoded embeddings) tuples.
+        :return: The built index.
+        """
+        return FaceIndex.build([(image_id, decode_vectors(embeddings)) for image_id, embeddings in documents])
+
+    async def _update_index(self) -> FaceIndex or None:
+        """
+        Builds the face index on first use and applies the updates published since. Must be called
+        with the lock held.
+
+        :return: The face index, or None if it could not be built.
+        """
+        try:
+            updates = await read_face_index_updates(self.position) if self.index is not None else None
+            if updates is None:
+                self.index, self.position = await self._load_index()
+                updates = await read_face_index_updates(self.position) or []
+            if updates:
+                # Replaying a burst of deletions or uploads is CPU-bound, so it runs off the event loop
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(self.executor, self.index.apply,
+                                           [(image_id, embeddings) for _, image_id, embeddings in updates])
+                self.position = updates[-1][0]
+        except Exception as e:
+            logger.error(f"Error updating face index: {e}", exc_info=True)
+        return self.index
+
+    async def _search_index(self, query: np.ndarray or tuple[str, int], limit: int,
+                            exclude: str = None) -> list[tuple[str, int, float]] or None:
+        """
+        Brings the face index up to date and searches it. The lock is held throughout, so the index is never
+        updated while a search reads it.
+
+        :param query: The query face embedding, or an (image ID, face position) tuple of an indexed face.
+        :param limit: The maximum number of images to return.
+        :param exclude: The ID of an image to leave out.
+        :return: A list of (image ID, face position, distance) tuples, or None if the query face is not indexed.
+        """
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            index = await self._update_index()
+            if index is None:
+                return []
+            if isinstance(query, tuple):
+                query = index.embedding(*query)
+                if query is None:
+                    return None
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.executor, index.search, query, limit, FACE_MATCH_THRESHOLD, exclude)
+
+    async def find_by_face(self, image_id: str, face_index: int, limit: int) -> list[dict] or None:
+        """
+        Finds the images containing a face of a library image.
+
+        :param image_id: The ID of the image containing the face.
+        :param face_index: The position of the face among the faces of the image.
+        :param limit: The maximum number of images to return.
+        :return: A list of dictionaries containing '_id', 'thumbnail_url', 'face_index' and 'distance' of the
+            matching images, closest first, or None if the face is not indexed.
+        """
+        matches = await self._search_index((image_id, face_index), limit, exclude=image_id)
+        if matches is None:
+            return None
+        return await self._attach_thumbnails(matches)
+
+    async def find_by_face_crop(self, contents: bytes, limit: int) -> list[dict] or None:
+        """
+        Finds the images containing the face of an uploaded face crop.
+
+        :param contents: The bytes of the uploaded face crop.
+        :param limit: The maximum number of images to return.
+        :return: A list of dictionaries containing '_id', 'thumbnail_url', 'face_index' and 'distance' of the
+            matching images, closest first, or None if the upload is not a readable image.
+        """
+        loop = asyncio.get_running_loop()
+        query = await loop.run_in_executor(self.executor, self._embed_face_crop, contents)
+        if query is None:
+            return None
+        matches = await self._search_index(np.asarray(query, dtype=np.float32), limit)
+        return await self._attach_thumbnails(matches)
+
+    @staticmethod
+    def _embed_face_crop(contents: bytes) -> list[float] or None:
+        """
+        Decodes an uploaded face crop and computes its embedding.
+
+        :param contents: The bytes of the uploaded face crop.
+        :return: The face embedding, or None if the upload is not a readable image.
+        """
+        face = decode_query_image(contents, FACE_CROP_DECODE_SIZE)
+        if face is None:
+            return None
+        try:
+            return get_face_embedding(face)
+        except RuntimeError as e:
+            logger.error(f"Error computing face crop embedding: {e}")
+            return None
+
+    @staticmethod
+    async def _attach_thumbnails(matches: list[tuple[str, int, float]]) -> list[dict]:
+        """
+        Attaches the thumbnails of the matching images, leaving out images that no longer exist.
+
+        :param matches: A list of (image ID, face position, distance) tuples.
+        :return: A list of dictionaries containing '_id', 'thumbnail_url', 'face_index' and 'distance' of the
+            matching images, in the order of the matches.
+        """
+        if not matches:
+            return []
+        cursor = images_collection.find({'_id': {'$in': [to_object_id(image_id) for image_id, _, _ in matches]}},
+                                        {'thumbnail_url': 1})
+        thumbnails = {str(doc['_id']): doc.get('thumbnail_url') async for doc in cursor}
+        return [{'_id': image_id, 'thumbnail_url': thumbnails[image_id], 'face_index': face_number,
+                 'distance': round(distance, 4)}
+                for image_id, face_number, distance in matches if image_id in thumbnails]
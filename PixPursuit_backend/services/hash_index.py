@@ -0,0 +1,115 @@
+"""
+services/hash_index.py
+
+This module contains the MultiIndexHash class, an index of fixed-length binary hashes supporting lookups of all
+hashes within a Hamming distance r. Each hash is split into r + 1 disjoint chunks, and every chunk is indexed in
+its own hash table. By the pigeonhole principle, two hashes within distance r agree exactly on at least one chunk,
+so a lookup only verifies the hashes sharing a bucket with the query instead of scanning the whole library.
+"""
+
+from collections import defaultdict
+
+
+def hamming_distance(first: int, second: int) -> int:
+    """
+    Counts the differing bits of two hashes.
+
+    :param first: The first hash.
+    :param second: The second hash.
+    :return: The Hamming distance.
+    """
+    return bin(first ^ second).count('1')
+
+
+class MultiIndexHash:
+    """
+    A multi-index hash table over binary hashes.
+
+    Attributes:
+        bits (int): The length of the hashes in bits.
+        max_distance (int): The largest Hamming distance lookups support.
+        chunks (list[tuple[int, int]]): The (shift, mask) of each chunk.
+        tables (list[dict[int, list[int]]]): For each chunk, a mapping of chunk values to the positions of hashes.
+        keys (list): The key of each indexed hash, e.g. an image ID.
+        hashes (list[int]): The indexed hashes.
+    """
+    def __init__(self, bits: int, max_distance: int):
+        """
+        Initializes an empty index.
+
+        :param bits: The length of the hashes in bits.
+        :param max_distance: The largest Hamming distance lookups support.
+        """
+        self.bits = bits
+        self.max_distance = max_distance
+        count = max_distance + 1
+        widths = [bits // count + (1 if i < bits % count else 0) for i in range(count)]
+        self.chunks, shift = [], 0
+        for width in widths:
+            self.chunks.append((shift, (1 << width) - 1))
+            shift += width
+        self.tables = [defaultdict(list) for _ in self.chunks]
+        self.keys = []
+        self.hashes = []
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def add(self, key, value: int) -> None:
+        """
+        Indexes a hash.
+
+        :param key: The key the hash belongs to.
+        :param value: The hash.
+        """
+        position = len(self.hashes)
+        self.keys.append(key)
+        self.hashes.append(value)
+        for table, (shift, mask) in zip(self.tables, self.chunks):
+            table[(value >> shift) & mask].append(position)
+
+    def _candidates(self, value: int) -> set[int]:
+        candidates = set()
+        for table, (shift, mask) in zip(self.tables, self.chunks):
+            candidates.update(table.get((value >> shift) & mask, ()))
+        return candidates
+
+    def query(self, value: int, max_distance: int = None) -> list[tuple[object, int]]:
+        """
+        Finds the indexed hashes within a Hamming distance of a hash.
+
+        :param value: The hash to look up.
+        :param max_distance: The largest distance to return, at most the index's max_distance.
+        :return: A list of (key, distance) tuples, closest first.
+        """
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        matches = []
+        for position in self._candidates(value):
+            distance = hamming_distance(value, self.hashes[position])
+            if distance <= max_distance:
+                matches.append((self.keys[position], distance))
+        return sorted(matches, key=lambda match: match[1])
+
+    def groups(self) -> list[list]:
+        """
+        Groups the indexed hashes around representatives, taken in index order: each hash not grouped yet becomes
+        the representative of a group with all the hashes not grouped yet within max_distance of it. Grouping is not
+        transitive, so the members of a group are within max_distance of its representative, not of each other,
+        and a chain of near matches is split rather than merged into one group.
+
+        :return: A list of groups of keys, each with at least two keys and starting with its representative.
+        """
+        grouped = [False] * len(self.hashes)
+        groups = []
+        for position, value in enumerate(self.hashes):
+            if grouped[position]:
+                continue
+            grouped[position] = True
+            members = sorted(candidate for candidate in self._candidates(value)
+                             if not grouped[candidate]
+                             and hamming_distance(value, self.hashes[candidate]) <= self.max_distance)
+            for candidate in members:
+                grouped[candidate] = True
+            if members:
+                groups.append([self.keys[position]] + [self.keys[candidate] for candidate in members])
+        return groups
@@ -2,18 +2,29 @@
 image_similarity.py
 
 This module contains the ImageSimilarity class which is used to find images that are similar to a given image.
-The similarity is calculated based on the features of the images. The module uses Dask arrays for efficient computation on large datasets and
-ThreadPoolExecutor for parallel processing.
+Similar images are found with an in-memory SimilarityIndex: candidates are retrieved by the features of the images
+and re-ranked with all the factors of the WEIGHTS table. The index is loaded on first use and kept up to date by
+replaying the similarity index stream, to which the workers and the API append the images they add, update or
+delete, so only the documents and features of those images are read again. Results are cached per index
+generation in a SimilarityCache. Images that are not in the library can be used as queries too: their features
+are extracted on the fly, without storing anything. Scoring and feature extraction run in thread pools
+so the event loop is never blocked.
 """
 
-import heapq
-import numpy as np
-import dask.array as da
+import time
+import asyncio
 from concurrent.futures import ThreadPoolExecutor
 from config.logging_config import setup_logging
-from data.databases.mongodb.async_db.database_tools import images_collection, get_image_document
-from utils.function_utils import to_object_id
-import asyncio
+from data.databases.mongodb.async_db.database_tools import images_collection, vectors_collection, \
+    get_image_document, get_image_vectors
+from data.databases.redis_db.redis_tools import get_similarity_index_generation, \
+    get_similarity_index_stream_position, read_similarity_index_updates
+from data.data_extraction.feature_extraction import extract_features
+from services.similarity_cache import SimilarityCache, record_similarity_lookup
+from services.similarity_index import SimilarityIndex, INDEX_PROJECTION
+from utils.function_utils import decode_query_image, to_object_id
+from utils.constants import SIMILARITY_UPLOAD_MAX_PENDING
+from utils.exceptions import similarity_search_busy_exception
 
 logger = setup_logging(__name__)
 
@@ -21,127 +32,215 @@ logger = setup_logging(__name__)
 class ImageSimilarity:
     def __init__(self):
         """
-        Initializes the ImageSimilarity class with a ThreadPoolExecutor.
+        Initializes the ImageSimilarity class with thread pools for scoring and feature extraction, an empty index
+        and a result cache. Feature extraction runs one image at a time, as the model already uses all CPU cores.
         """
         self.executor = ThreadPoolExecutor(max_workers=4)
-
-    @staticmethod
-    def _prepare_features(features: list) -> da.Array or None:
+        self.feature_executor = ThreadPoolExecutor(max_workers=1)
+        self.pending_uploads = 0
+        self.cache = SimilarityCache()
+        self.index = None
+        self.index_generation = None
+        self.position = '0-0'
+        self.index_lock = None
+
+    async def _load_index(self) -> tuple[SimilarityIndex, str]:
         """
-        Prepares the features for similarity calculation by converting them into a Dask array.
+        Loads all images and their features from the database and builds the similarity index.
 
-        :param features: A list of features to be prepared.
-        :return: A Dask array of the prepared features.
+        :return: A tuple of the built index and the similarity index stream position it reflects.
         """
-        if not features:
-            return None
-        features_array = np.array(features[0])
-        if features_array.size == 0 or features_array.shape == (1, 1):
-            return None
-        return da.from_array(features_array, chunks=(1000,))
+        # Updates published while loading are replayed afterwards; replaying an image twice is harmless
+        position = await get_similarity_index_stream_position()
+        documents = await images_collection.find({}, INDEX_PROJECTION).to_list(length=None)
+        features = {doc['_id']: doc.get('features')
+                    async for doc in vectors_collection.find({}, {'features': 1})}
+        loop = asyncio.get_running_loop()
+        index = await loop.run_in_executor(self.executor, SimilarityIndex.build, documents, features)
+        logger.info(f"Built similarity index with {len(index)} images")
+        return index, position
 
-    @staticmethod
-    def _calculate_similarities(reference_features: da.Array, features_matrix: da.Array) -> np.array:
+    async def _load_updates(self, updates: list[tuple[str, str, list[str]]]) -> tuple[list[dict], dict, list[str]]:
         """
-        Calculates the similarities between the reference features and a matrix of features.
+        Reads the documents, and the features where needed, of the images changed by stream updates.
 
-        :param reference_features: A Dask array of the reference features.
-        :param features_matrix: A Dask array of the features' matrix.
-        :return: A NumPy array of the calculated similarities.
+        :param updates: A list of (entry ID, op, image IDs) tuples, in stream order.
+        :return: A tuple of the documents of the added and updated images, the features of the images to
+            (re-)add to the index, by image ID, and the IDs of the deleted images.
         """
-        if reference_features is None or features_matrix.shape[0] == 0:
-            return np.array([])
-
-        # Calculate cosine similarity using Dask arrays
-        norm_ref = da.linalg.norm(reference_features)
-        norms = da.linalg.norm(features_matrix, axis=1)
-        dot_products = da.dot(features_matrix, reference_features.T)
-        similarities = dot_products / (norms * norm_ref)
-        return similarities.compute()
-
-    async def _process_image_features(self, images: list) -> da.Array or None:
+        ops = {}
+        for _, op, image_ids in updates:
+            for image_id in image_ids:
+                # An image added and then updated still needs its features
+                if not (op == 'update' and ops.get(image_id) == 'add'):
+                    ops[image_id] = op
+
+        changed = [to_object_id(image_id) for image_id, op in ops.items() if op != 'delete']
+        changed = [image_id for image_id in changed if image_id]
+        documents = await images_collection.find({'_id': {'$in': changed}}, INDEX_PROJECTION).to_list(length=None)
+        found = {str(doc['_id']) for doc in documents}
+        removed = [image_id for image_id, op in ops.items() if op == 'delete' or image_id not in found]
+
+        added = [doc['_id'] for doc in documents
+                 if ops[str(doc['_id'])] == 'add' or str(doc['_id']) not in self.index.positions]
+        features = {}
+        if added:
+            features = {doc['_id']: doc.get('features')
+                        async for doc in vectors_collection.find({'_id': {'$in': added}}, {'features': 1})}
+        return documents, features, removed
+
+    async def get_index(self, generation: int or None) -> SimilarityIndex or None:
         """
-        Processes the features of a list of images asynchronously.
+        Returns the similarity index, building it on first use and applying the updates published since.
+        Indexes are replaced rather than modified, so searches can keep using an index while it is updated.
 
-        :param images: A list of images whose features are to be processed.
-        :return: A Dask array of the processed features.
+        :param generation: The current index generation.
+        :return: The similarity index, or None if it could not be built.
         """
-        loop = asyncio.get_running_loop()
-        # Parallelize feature preparation
-        futures = [loop.run_in_executor(self.executor, self._prepare_features, img.get('features')) for img in images if img.get('features') is not None]
-        features_list = await asyncio.gather(*futures)
-
-        # Filter out None results and ensure valid feature shapes
-        valid_features = [f for f in features_list if f is not None and f.shape[0] > 1]
-        if not valid_features:
-            return None
-        return da.vstack(valid_features)
+        if self.index_lock is None:
+            self.index_lock = asyncio.Lock()
+        async with self.index_lock:
+            try:
+                updates = await read_similarity_index_updates(self.position) if self.index is not None else None
+                if updates is None:
+                    self.index, self.position = await self._load_index()
+                    updates = await read_similarity_index_updates(self.position) or []
+                if updates:
+                    documents, features, removed = await self._load_updates(updates)
+                    loop = asyncio.get_running_loop()
+                    self.index = await loop.run_in_executor(self.executor, self.index.updated,
+                                                            documents, features, removed)
+                    self.position = updates[-1][0]
+                # Updates are published before the generation is bumped, so the index reflects this generation
+                self.index_generation = generation
+            except Exception as e:
+                logger.error(f"Error updating similarity index: {e}", exc_info=True)
+        return self.index
 
     async def find_similar_images(self, image_id: str, sample_size: int = 20) -> list[dict]:
         """
-        Processes the features of a list of images asynchronously and returns a list of dictionaries
-        containing image IDs and thumbnail URLs of similar images.
+        Finds the images most similar to a given image and returns a list of dictionaries
+        containing image IDs and thumbnail URLs of similar images, most similar first.
 
         :param image_id: The ID of the image for which to find similar images.
-        :param sample_size: The number of images to sample for comparison.
+        :param sample_size: The number of similar images to return.
         :return: A list of dictionaries containing '_id' and 'thumbnail_url' of similar images.
         """
+        start = time.perf_counter()
         try:
-            image_document = await get_image_document(image_id)
-            if not image_document or 'features' not in image_document:
-                logger.warning(f"No features found for image ID: {image_id}")
-                return []
+            generation = await get_similarity_index_generation()
+            if generation is not None:
+                cached, source = await self.cache.get(generation, image_id, sample_size)
+                if cached is not None:
+                    await record_similarity_lookup(source, time.perf_counter() - start)
+                    return cached
+
+            similar_images = await self._search(image_id, sample_size, generation)
+            # Results of an index older than the generation could miss new images, so they are not cached
+            if similar_images and generation is not None and generation == self.index_generation:
+                await self.cache.set(generation, image_id, sample_size, similar_images)
+            await record_similarity_lookup('miss', time.perf_counter() - start)
+            return similar_images
+        except Exception as e:
+            logger.error(f"Unhandled exception in find_similar_images: {e}")
+            return []
 
-            reference_features = self._prepare_features(image_document['features'])
-            if reference_features is None:
-                return []
+    async def find_similar_to_upload(self, contents: bytes, limit: int, deadline: float) -> list[dict] or None:
+        """
+        Finds the library images most similar to an uploaded image that is not stored. The image is decoded at
+        a reduced scale and its features are extracted by the already loaded model.
+
+        :param contents: The bytes of the uploaded image.
+        :param limit: The number of similar images to return.
+        :param deadline: The time.monotonic() value after which queued requests are dropped before feature extraction.
+        :return: A list of dictionaries containing '_id' and 'thumbnail_url' of similar images, or None if the
+            upload is not a readable image.
+        :raises similarity_search_busy_exception: If SIMILARITY_UPLOAD_MAX_PENDING uploads are already queued or
+            running for feature extraction.
+        """
+        generation = await get_similarity_index_generation()
+        index = await self.get_index(generation)
+        if index is None or len(index) == 0:
+            return []
 
-            sample_images = await self._get_sample_images(image_id, sample_size)
-            features_matrix = await self._process_image_features(sample_images)
-            if features_matrix is None:
-                return []
+        features = await self._submit_extraction(contents, deadline)
+        if features is None:
+            return None
+        query = index.query_from({}, features)
+        if query is None:
+            return []
 
-            similarities = self._calculate_similarities(da.asarray(reference_features), features_matrix)
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(self.executor, index.search, query, limit)
+        return [{'_id': index.ids[position], 'thumbnail_url': index.thumbnails[position]}
+                for position, _ in results]
 
-            # Using a heap to keep track of top images
-            top_images = []
-            for index, (score, img) in enumerate(zip(similarities, sample_images)):
-                if score is not None:
-                    heapq.heappush(top_images,
-                                   (-score, index, {'_id': str(img['_id']), 'thumbnail_url': img.get('thumbnail_url')}))
-                    if len(top_images) > sample_size:
-                        heapq.heappop(top_images)
+    async def _submit_extraction(self, contents: bytes, deadline: float) -> list[float] or None:
+        """
+        Submits the feature extraction of an uploaded image and counts it as pending until the pool has finished
+        it, even if the request awaiting it times out first.
 
-            # Convert heap to a sorted list based on similarity score
-            top_images.sort(reverse=True, key=lambda x: x[0])  # Sort primarily by score
-            return [{'_id': img['_id'], 'thumbnail_url': img['thumbnail_url']} for _, _, img in top_images]
-        except Exception as e:
-            logger.error(f"Unhandled exception in find_similar_images: {e}")
-            return []
+        :param contents: The bytes of the uploaded image.
+        :param deadline: The time.monotonic() value after which the request is dropped.
+        :return: The extracted features, or None if the upload is not a readable image.
+        :raises similarity_search_busy_exception: If too many extractions are already pending.
+        """
+        # Work already in the pool keeps running after a timeout, so admission is bounded before submitting
+        if self.pending_uploads >= SIMILARITY_UPLOAD_MAX_PENDING:
+            raise similarity_search_busy_exception
+
+        loop = asyncio.get_running_loop()
+        self.pending_uploads += 1
+        future = self.feature_executor.submit(self._extract_query_features, contents, deadline)
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._finish_extraction))
+        return await asyncio.wrap_future(future)
+
+    def _finish_extraction(self) -> None:
+        self.pending_uploads -= 1
 
     @staticmethod
-    async def _get_sample_images(image_id: str, limit: int) -> list:
+    def _extract_query_features(contents: bytes, deadline: float) -> list[float] or None:
         """
-        Gets a sample of images from the database.
+        Decodes an uploaded image and extracts its features, unless the request already missed its deadline
+        while waiting for the model.
 
-        :param image_id: The ID of the image to exclude from the sample.
-        :param limit: The maximum number of images to include in the sample.
-        :return: A list of the sampled images.
+        :param contents: The bytes of the uploaded image.
+        :param deadline: The time.monotonic() value after which the request is dropped.
+        :return: The extracted features, or None if the upload is not a readable image.
         """
-        oid = to_object_id(image_id)
-        if oid is None:
-            logger.error("Invalid ObjectId")
-            return []
+        if time.monotonic() > deadline:
+            raise TimeoutError("Search by upload expired while queued")
+        image = decode_query_image(contents)
+        if image is None:
+            return None
+        return extract_features(image)
+
+    async def _search(self, image_id: str, limit: int, generation: int or None) -> list[dict]:
+        """
+        Searches the similarity index for the images most similar to a given image.
 
-        total_docs = await images_collection.count_documents({})
-        if total_docs == 0:
+        :param image_id: The ID of the image for which to find similar images.
+        :param limit: The number of similar images to return.
+        :param generation: The current index generation.
+        :return: A list of dictionaries containing '_id' and 'thumbnail_url' of similar images.
+        """
+        index = await self.get_index(generation)
+        if index is None or len(index) == 0:
             return []
 
-        size = max(limit, total_docs // 20)  # Sample size is 5% of total documents or the limit, whichever is greater
-        pipeline = [
-            {'$match': {'_id': {'$ne': oid}}},
-            {'$sample': {'size': size}},
-            {'$project': {'features': 1, 'thumbnail_url': 1}}
-        ]
-        cursor = images_collection.aggregate(pipeline, allowDiskUse=True)
-        return await cursor.to_list(length=size)
+        query = index.query_for(image_id)
+        if query is None:
+            # The image was added after the index was built
+            image = await get_image_document(image_id, INDEX_PROJECTION)
+            image_vectors = await get_image_vectors(image_id, ['features'])
+            if not image or not image_vectors or 'features' not in image_vectors:
+                logger.warning(f"No features found for image ID: {image_id}")
+                return []
+            query = index.query_from(image, image_vectors['features'])
+            if query is None:
+                return []
+
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(self.executor, index.search, query, limit, image_id)
+        return [{'_id': index.ids[position], 'thumbnail_url': index.thumbnails[position]}
+                for position, _ in results]
@@ -9,7 +9,8 @@ and extracting and processing their contents.
 from io import BytesIO
 from zipfile import ZipFile, ZIP_DEFLATED
 from data.databases.space_manager import SpaceManager
-from data.databases.mongodb.async_db.database_tools import get_album, get_image_document, get_root_id, create_album
+from data.databases.mongodb.async_db.database_tools import get_album_subtree, get_image_document, get_root_id, \
+    create_album
 import os
 import asyncio
 from config.logging_config import setup_logging
@@ -36,12 +37,13 @@ class ZipProcessor:
         self.space_manager = SpaceManager()
         self.size = size
 
-    async def _add_album_to_zip(self, album: dict, zipf: ZipFile, path: str,
+    async def _add_album_to_zip(self, album: dict, albums: dict[str, dict], zipf: ZipFile, path: str,
                                 depth: int = 0, max_depth: int = 10) -> None:
         """
         Recursively adds an album and its contents to a ZIP file.
 
         :param album: A dictionary containing album data.
+        :param albums: The albums of the subtree being zipped, by ID.
         :param zipf: An open ZipFile object to add files to.
         :param path: The current path within the ZIP file.
         :param depth: The current depth of the album hierarchy.
@@ -52,21 +54,21 @@ class ZipProcessor:
             return
 
         path = os.path.join(path, album['name'])
-        image_tasks = [get_image_document(image_id) for image_id in album['images']]
-        sub_album_tasks = [get_album(sub_album_id) for sub_album_id in album['sons']]
-        images_and_albums = await asyncio.gather(*image_tasks, *sub_album_tasks, return_exceptions=True)
+        image_tasks = [get_image_document(image_id, ['filename']) for image_id in album['images']]
+        images = await asyncio.gather(*image_tasks, return_exceptions=True)
 
-        for image in images_and_albums[:len(album['images'])]:
+        for image in images:
             try:
                 if image:
                     await self._add_image_to_zip(image, zipf, path)
             except Exception as e:
                 logger.error(f"Failed to process image: {image['filename']} in album: {album['name']} - {e}")
 
-        for sub_album in images_and_albums[len(album['images']):]:
+        for sub_album_id in album['sons']:
+            sub_album = albums.get(sub_album_id)
             try:
                 if sub_album:
-                    await self._add_album_to_zip(sub_album, zipf, path, depth=depth + 1, max_depth=max_depth)
+                    await self._add_album_to_zip(sub_album, albums, zipf, path, depth=depth + 1, max_depth=max_depth)
             except Exception as e:
                 logger.error(f"Failed to process sub-album: {sub_album['name']} in album: {album['name']} - {e}")
 
@@ -124,14 +126,16 @@ class ZipProcessor:
         """
         zip_buffer = BytesIO()
         with ZipFile(zip_buffer, 'w', ZIP_DEFLATED) as zipf:
+            albums = {str(album['_id']): album for album in
+                      await get_album_subtree(album_ids, ['name', 'images', 'sons'])}
             for album_id in album_ids:
-                album = await get_album(album_id)
+                album = albums.get(album_id)
                 if not album:
                     raise ValueError(f"Album {album_id} not found")
-                await self._add_album_to_zip(album, zipf, "")
+                await self._add_album_to_zip(album, albums, zipf, "")
 
             for image_id in image_ids:
-                image = await get_image_document(image_id)
+                image = await get_image_document(image_id, ['filename'])
                 if not image:
                     raise ValueError(f"Image {image_id} not found")
                 response = await self.space_manager.get_image_from_space(image['filename'])
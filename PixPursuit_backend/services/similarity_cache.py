@@ -0,0 +1,147 @@
+"""
+services/similarity_cache.py
+
+Caches similar image results in two tiers: a bounded in-process LRU cache with a TTL in front of a Redis cache
+shared by all API workers. Entries are keyed by the similarity index generation, a Redis counter bumped whenever
+images are ingested or deleted, so results computed before a change are never served after it and simply expire.
+Every lookup is recorded with its latency, so the API can report the hit rate of each tier.
+"""
+
+import json
+import time
+from collections import OrderedDict
+from config.logging_config import setup_logging
+from config.redis_config import get_redis_client
+from utils.metrics import CACHE_LOOKUPS
+from utils.constants import SIMILARITY_CACHE_MAX_SIZE, SIMILARITY_CACHE_TTL, SIMILARITY_CACHE_KEY_PREFIX, \
+    SIMILARITY_CACHE_STATS_KEY
+
+logger = setup_logging(__name__)
+
+async_redis_client = get_redis_client(async_mode=True)
+
+LOOKUP_SOURCES = ('local', 'redis', 'miss')
+
+
+class SimilarityCache:
+    """
+    A two-tier cache of similar image results.
+
+    Attributes:
+        max_size (int): The maximum number of entries kept in process.
+        ttl (int): The time in seconds entries stay cached.
+        entries (OrderedDict): The in-process entries, least recently used first, as (expires at, results).
+        generation (int or None): The index generation of the in-process entries.
+    """
+    def __init__(self, max_size: int = SIMILARITY_CACHE_MAX_SIZE, ttl: int = SIMILARITY_CACHE_TTL):
+        """
+        Initializes the cache.
+
+        :param max_size: The maximum number of entries kept in process.
+        :param ttl: The time in seconds entries stay cached.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.generation = None
+
+    @staticmethod
+    def _key(generation: int, image_id: str, limit: int) -> str:
+        return f"{SIMILARITY_CACHE_KEY_PREFIX}:{generation}:{image_id}:{limit}"
+
+    def _set_local(self, key: str, results: list[dict]) -> None:
+        self.entries[key] = (time.monotonic() + self.ttl, results)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    async def get(self, generation: int, image_id: str, limit: int) -> tuple[list[dict] or None, str]:
+        """
+        Looks up cached results, first in process and then in Redis.
+
+        :param generation: The current index generation.
+        :param image_id: The ID of the image the results are for.
+        :param limit: The number of results requested.
+        :return: A tuple of the results, or None if not cached, and the tier that answered ('local', 'redis' or 'miss').
+        """
+        if generation != self.generation:
+            self.entries.clear()
+            self.generation = generation
+
+        key = self._key(generation, image_id, limit)
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                return entry[1], 'local'
+            del self.entries[key]
+
+        try:
+            cached = await async_redis_client.get(key)
+            if cached is not None:
+                results = json.loads(cached)
+                self._set_local(key, results)
+                return results, 'redis'
+        except Exception as e:
+            logger.error(f"Error reading similarity cache: {e}")
+        return None, 'miss'
+
+    async def set(self, generation: int, image_id: str, limit: int, results: list[dict]) -> None:
+        """
+        Caches results in process and in Redis.
+
+        :param generation: The index generation the results were computed at.
+        :param image_id: The ID of the image the results are for.
+        :param limit: The number of results requested.
+        :param results: The results to cache.
+        """
+        key = self._key(generation, image_id, limit)
+        if generation == self.generation:
+            self._set_local(key, results)
+        try:
+            await async_redis_client.set(key, json.dumps(results), ex=self.ttl)
+        except Exception as e:
+            logger.error(f"Error writing similarity cache: {e}")
+
+
+async def record_similarity_lookup(source: str, seconds: float) -> None:
+    """
+    Records a similar image lookup in the statistics.
+
+    :param source: The tier that answered the lookup ('local', 'redis' or 'miss').
+    :param seconds: The latency of the lookup in seconds.
+    """
+    CACHE_LOOKUPS.labels('similarity', source).inc()
+    try:
+        async with async_redis_client.pipeline(transaction=False) as pipe:
+            pipe.hincrby(SIMILARITY_CACHE_STATS_KEY, f"{source}_count", 1)
+            pipe.hincrbyfloat(SIMILARITY_CACHE_STATS_KEY, f"{source}_seconds", seconds)
+            await pipe.execute()
+    except Exception as e:
+        logger.error(f"Error recording similarity cache stats: {e}")
+
+
+async def get_similarity_cache_stats() -> dict or None:
+    """
+    Retrieves the hit rate and latency statistics of the similar image search.
+
+    :return: A dictionary with the number of lookups, the hit rate and, for each tier, the number of lookups
+        and their average latency in milliseconds, or None if an error occurs.
+    """
+    try:
+        raw = await async_redis_client.hgetall(SIMILARITY_CACHE_STATS_KEY)
+        raw = {key.decode(): float(value) for key, value in raw.items()}
+        stats = {}
+        for source in LOOKUP_SOURCES:
+            count = int(raw.get(f"{source}_count", 0))
+            seconds = raw.get(f"{source}_seconds", 0.0)
+            stats[source] = {
+                'count': count,
+                'avg_latency_ms': round(seconds / count * 1000, 3) if count else None
+            }
+        lookups = sum(stats[source]['count'] for source in LOOKUP_SOURCES)
+        hits = lookups - stats['miss']['count']
+        return {'lookups': lookups, 'hit_rate': round(hits / lookups, 4) if lookups else None, **stats}
+    except Exception as e:
+        logger.error(f"Error retrieving similarity cache stats: {e}")
+        return None
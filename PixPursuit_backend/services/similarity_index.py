@@ -0,0 +1,360 @@
+"""
+services/similarity_index.py
+
+This module contains the SimilarityIndex class, an in-memory index of all images used to find similar images
+in two stages. Candidates are first retrieved by cosine similarity of the image features, then re-ranked with
+every factor of the WEIGHTS table: overlaps of tag and face sets, computed on precomputed sparse bitsets, and
+matches of the album and the uploader, computed on categorical codes.
+"""
+
+import numpy as np
+from scipy import sparse
+from utils.vector_codec import decode_vector
+from utils.constants import WEIGHTS, SIMILARITY_CANDIDATES
+
+SET_FIELDS = ('user_tags', 'auto_tags', 'user_faces', 'auto_faces')
+CATEGORICAL_FIELDS = ('album_id', 'added_by')
+INDEX_PROJECTION = ['thumbnail_url', *SET_FIELDS, *CATEGORICAL_FIELDS]
+COMPACTION_MIN_ROWS = 1024
+
+
+def _set_values(field: str, document: dict) -> set:
+    """
+    Extracts the values of a set field of an image document, leaving out placeholders that carry no identity.
+
+    :param field: The name of the set field.
+    :param document: The image document.
+    :return: The set of values.
+    """
+    values = document.get(field) or []
+    if field == 'user_faces':
+        return {value for value in values if value and not str(value).startswith('anon')}
+    if field == 'auto_faces':
+        return {value for value in values if value != -1}
+    return set(values)
+
+
+class SimilarityQuery:
+    """
+    The signals of the image to find similar images for, expressed in the terms of an index.
+
+    Attributes:
+        features (np.ndarray): The L2-normalized float32 feature vector.
+        sets (dict[str, np.ndarray]): For each set field, the index columns of the image's values.
+        set_sizes (dict[str, int]): For each set field, the number of the image's values.
+        codes (dict[str, int]): For each categorical field, the index code of the image's value, or -1.
+    """
+    def __init__(self, features: np.ndarray, sets: dict, set_sizes: dict, codes: dict):
+        self.features = features
+        self.sets = sets
+        self.set_sizes = set_sizes
+        self.codes = codes
+
+
+class SimilarityIndex:
+    """
+    An in-memory index of image features and similarity signals.
+
+    An index is never modified once built: `updated` returns a new index with images added, updated or removed,
+    so searches still running on the previous index are unaffected. The new index shares the feature matrix of
+    the previous one and appends the rows of new images past the rows the previous index uses.
+
+    Attributes:
+        ids (list[str]): The image ID of each row, including removed rows.
+        positions (dict[str, int]): A mapping of the IDs of indexed images to their row.
+        thumbnails (list[str]): The thumbnail URL of each row.
+        features (np.ndarray): The L2-normalized float32 feature matrix, with spare rows for appending.
+        active (np.ndarray): For each row, whether the image is still indexed.
+        size (int): The number of used rows, including removed images.
+        set_rows (dict[str, list[np.ndarray]]): For each set field, the columns of the values of each row.
+        sets (dict[str, sparse.csr_matrix]): For each set field, a binary row-by-value matrix.
+        set_sizes (dict[str, np.ndarray]): For each set field, the number of values of each row.
+        vocabularies (dict[str, dict]): For each set and categorical field, a mapping of values to columns or codes.
+        codes (dict[str, np.ndarray]): For each categorical field, the code of each row's value, or -1.
+    """
+    def __init__(self):
+        self.ids = []
+        self.positions = {}
+        self.thumbnails = []
+        self.features = None
+        self.active = np.empty(0, dtype=bool)
+        self.size = 0
+        self.set_rows = {field: [] for field in SET_FIELDS}
+        self.sets = {}
+        self.set_sizes = {field: np.empty(0, dtype=np.float32) for field in SET_FIELDS}
+        self.vocabularies = {field: {} for field in (*SET_FIELDS, *CATEGORICAL_FIELDS)}
+        self.codes = {field: np.empty(0, dtype=np.int32) for field in CATEGORICAL_FIELDS}
+        self._build_sets()
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    @classmethod
+    def build(cls, documents: list[dict], features: dict) -> 'SimilarityIndex':
+        """
+        Builds the index from image documents and their stored feature vectors.
+
+        :param documents: The image documents, with at least the fields of INDEX_PROJECTION.
+        :param features: A mapping of image IDs to their stored feature vectors.
+        :return: The built index. Images without features are left out.
+        """
+        return cls().updated(documents, features)
+
+    def updated(self, documents: list[dict], features: dict, removed: list[str] = ()) -> 'SimilarityIndex':
+        """
+        Returns a copy of the index with images removed, added or updated. Only the latest index may be
+        updated, as the copy writes the rows of added images into the feature matrix they share.
+
+        :param documents: The documents of the images to add or update, with at least the fields of INDEX_PROJECTION.
+        :param features: A mapping of image IDs to their stored feature vectors, for the images to add. The
+            documents of images without an entry only update the similarity signals of images already indexed.
+        :param removed: The IDs of the images to remove.
+        :return: The updated index. Images that are neither indexed nor have features are left out.
+        """
+        index = SimilarityIndex.__new__(SimilarityIndex)
+        index.__dict__.update(self.__dict__)
+        index.ids = list(self.ids)
+        index.positions = dict(self.positions)
+        index.thumbnails = list(self.thumbnails)
+        index.active = self.active[:self.size].copy()
+        index.set_rows = {field: list(rows) for field, rows in self.set_rows.items()}
+        index.sets, index.set_sizes = {}, {}
+        index.vocabularies = {field: dict(vocabulary) for field, vocabulary in self.vocabularies.items()}
+        codes = {field: list(self.codes[field]) for field in CATEGORICAL_FIELDS}
+
+        for image_id in removed:
+            position = index.positions.pop(str(image_id), None)
+            if position is not None:
+                index.active[position] = False
+
+        rows, new_documents = [], []
+        dimension = self.features.shape[1] if self.features is not None else None
+        for document in documents:
+            image_id = str(document['_id'])
+            position = index.positions.get(image_id)
+            if document['_id'] in features:
+                vector = decode_vector(features[document['_id']])
+                dimension = dimension or (vector.size if vector.size > 1 else None)
+                if vector.size <= 1 or vector.size != dimension:
+                    continue
+                if position is not None:
+                    # Re-added images get a new row, as rows in use are shared with previous indexes
+                    index.active[position] = False
+                rows.append(vector)
+                new_documents.append(document)
+            elif position is not None:
+                index.thumbnails[position] = document.get('thumbnail_url')
+                for field in SET_FIELDS:
+                    index.set_rows[field][position] = index._set_columns(field, document)
+                for field in CATEGORICAL_FIELDS:
+                    codes[field][position] = index._code(field, document)
+
+        if rows:
+            index._append(np.vstack(rows).astype(np.float32))
+        for document in new_documents:
+            index.positions[str(document['_id'])] = len(index.ids)
+            index.ids.append(str(document['_id']))
+            index.thumbnails.append(document.get('thumbnail_url'))
+            for field in SET_FIELDS:
+                index.set_rows[field].append(index._set_columns(field, document))
+            for field in CATEGORICAL_FIELDS:
+                codes[field].append(index._code(field, document))
+        index.active = np.concatenate([index.active, np.ones(len(new_documents), dtype=bool)])
+        index.size = len(index.ids)
+
+        index.codes = {field: np.array(values, dtype=np.int32) for field, values in codes.items()}
+        index._build_sets()
+        if index.size > COMPACTION_MIN_ROWS and len(index) < index.size // 2:
+            return index._compacted()
+        return index
+
+    def _append(self, rows: np.ndarray) -> None:
+        """
+        Appends normalized feature rows after the used rows, growing the matrix if needed. Rows past
+        the used rows are not visible to any index, so they can be written in the shared matrix.
+
+        :param rows: The feature rows to append.
+        """
+        norms = np.linalg.norm(rows, axis=1, keepdims=True)
+        rows = np.divide(rows, norms, out=np.zeros_like(rows), where=norms > 0)
+        capacity = len(self.features) if self.features is not None else 0
+        if self.size + len(rows) > capacity:
+            capacity = max(capacity * 2, self.size + len(rows))
+            features = np.zeros((capacity, rows.shape[1]), dtype=np.float32)
+            if self.size:
+                features[:self.size] = self.features[:self.size]
+            self.features = features
+        self.features[self.size:self.size + len(rows)] = rows
+
+    def _set_columns(self, field: str, document: dict) -> np.ndarray:
+        """
+        Maps the values of a set field of a document to columns, adding new values to the vocabulary.
+
+        :param field: The name of the set field.
+        :param document: The image document.
+        :return: The columns of the values.
+        """
+        vocabulary = self.vocabularies[field]
+        return np.array([vocabulary.setdefault(value, len(vocabulary)) for value in _set_values(field, document)],
+                        dtype=np.int32)
+
+    def _code(self, field: str, document: dict) -> int:
+        """
+        Maps the value of a categorical field of a document to its code, adding a new value to the vocabulary.
+
+        :param field: The name of the categorical field.
+        :param document: The image document.
+        :return: The code of the value, or -1 if the document has no value.
+        """
+        if not document.get(field):
+            return -1
+        vocabulary = self.vocabularies[field]
+        return vocabulary.setdefault(str(document[field]), len(vocabulary))
+
+    def _build_sets(self) -> None:
+        """
+        Builds the binary set matrices and set sizes from the columns of each row.
+        """
+        for field in SET_FIELDS:
+            rows = self.set_rows[field]
+            lengths = np.array([len(columns) for columns in rows], dtype=np.int64)
+            indices = np.concatenate(rows) if rows else np.empty(0, dtype=np.int32)
+            indptr = np.concatenate([[0], np.cumsum(lengths)])
+            self.sets[field] = sparse.csr_matrix(
+                (np.ones(len(indices), dtype=np.float32), indices, indptr),
+                shape=(len(rows), len(self.vocabularies[field]))
+            )
+            self.set_sizes[field] = lengths.astype(np.float32)
+
+    def _compacted(self) -> 'SimilarityIndex':
+        """
+        Returns a copy of the index without the rows of removed images.
+
+        :return: The compacted index.
+        """
+        rows = np.flatnonzero(self.active[:self.size])
+        index = SimilarityIndex()
+        index.vocabularies = self.vocabularies
+        index.ids = [self.ids[row] for row in rows]
+        index.positions = {image_id: position for position, image_id in enumerate(index.ids)}
+        index.thumbnails = [self.thumbnails[row] for row in rows]
+        index.features = self.features[rows]
+        index.active = np.ones(len(rows), dtype=bool)
+        index.size = len(rows)
+        index.set_rows = {field: [self.set_rows[field][row] for row in rows] for field in SET_FIELDS}
+        index.codes = {field: self.codes[field][rows] for field in CATEGORICAL_FIELDS}
+        index._build_sets()
+        return index
+
+    def query_for(self, image_id: str) -> SimilarityQuery or None:
+        """
+        Builds the query for an image in the index.
+
+        :param image_id: The ID of the image.
+        :return: The query, or None if the image is not in the index.
+        """
+        position = self.positions.get(str(image_id))
+        if position is None:
+            return None
+        sets = {field: self.sets[field].indices[self.sets[field].indptr[position]:self.sets[field].indptr[position + 1]]
+                for field in SET_FIELDS}
+        set_sizes = {field: int(self.set_sizes[field][position]) for field in SET_FIELDS}
+        codes = {field: int(self.codes[field][position]) for field in CATEGORICAL_FIELDS}
+        return SimilarityQuery(self.features[position], sets, set_sizes, codes)
+
+    def query_from(self, document: dict, features: bytes or list) -> SimilarityQuery or None:
+        """
+        Builds the query for an image that is not in the index, e.g. one added after the index was built.
+
+        :param document: The image document, with at least the fields of INDEX_PROJECTION.
+        :param features: The stored feature vector of the image.
+        :return: The query, or None if the image has no usable features.
+        """
+        vector = decode_vector(features)
+        if vector.size != self.features.shape[1]:
+            return None
+        norm = np.linalg.norm(vector)
+        vector = vector / norm if norm > 0 else vector
+
+        sets, set_sizes = {}, {}
+        for field in SET_FIELDS:
+            values = _set_values(field, document)
+            sets[field] = np.array([self.vocabularies[field][value] for value in values
+                                    if value in self.vocabularies[field]], dtype=np.int32)
+            set_sizes[field] = len(values)
+        codes = {field: self.vocabularies[field].get(str(document.get(field)), -1) for field in CATEGORICAL_FIELDS}
+        return SimilarityQuery(vector.astype(np.float32), sets, set_sizes, codes)
+
+    def candidates(self, query: SimilarityQuery, count: int, exclude: str = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Retrieves the images with the most similar features.
+
+        :param query: The query.
+        :param count: The number of candidates to retrieve.
+        :param exclude: The ID of an image to leave out, usually the query image itself.
+        :return: A tuple of the candidates' index positions and their cosine similarities, unordered.
+        """
+        if len(self) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = self.features[:self.size] @ query.features
+        scores[~self.active] = -np.inf
+
+        excluded = self.positions.get(str(exclude)) if exclude is not None else None
+        if excluded is not None:
+            scores[excluded] = -np.inf
+
+        available = len(self) - (excluded is not None)
+        count = min(count, available)
+        if count <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        positions = np.argpartition(-scores, count - 1)[:count]
+        return positions, scores[positions]
+
+    def rerank(self, query: SimilarityQuery, positions: np.ndarray, cosine: np.ndarray,
+               weights: dict = WEIGHTS) -> np.ndarray:
+        """
+        Scores candidates with all similarity factors: cosine similarity of the features, Jaccard overlap
+        of the tag and face sets, and matches of the album and uploader, each multiplied by its weight.
+
+        :param query: The query.
+        :param positions: The candidates' index positions.
+        :param cosine: The candidates' cosine similarities.
+        :param weights: The weight of each factor.
+        :return: The candidates' scores.
+        """
+        scores = weights.get('features', 0) * cosine.astype(np.float32)
+        for field in SET_FIELDS:
+            weight = weights.get(field, 0)
+            columns = query.sets[field]
+            if not weight or columns.size == 0:
+                continue
+            intersection = np.asarray(self.sets[field][positions][:, columns].sum(axis=1)).ravel()
+            union = self.set_sizes[field][positions] + query.set_sizes[field] - intersection
+            scores += weight * np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+        for field in CATEGORICAL_FIELDS:
+            weight = weights.get(field, 0)
+            code = query.codes[field]
+            if not weight or code < 0:
+                continue
+            scores += weight * (self.codes[field][positions] == code)
+        return scores
+
+    def search(self, query: SimilarityQuery, limit: int, exclude: str = None,
+               candidates: int = SIMILARITY_CANDIDATES, weights: dict = WEIGHTS) -> list[tuple[int, float]]:
+        """
+        Finds the most similar images: retrieves candidates by features and re-ranks them with all factors.
+
+        :param query: The query.
+        :param limit: The number of images to return.
+        :param exclude: The ID of an image to leave out, usually the query image itself.
+        :param candidates: The number of candidates to re-rank. At least `limit` candidates are retrieved.
+        :param weights: The weight of each factor.
+        :return: A list of (index position, score) tuples, best first.
+        """
+        positions, cosine = self.candidates(query, max(candidates, limit), exclude)
+        if positions.size == 0:
+            return []
+        scores = self.rerank(query, positions, cosine, weights)
+        order = np.argsort(-scores, kind='stable')[:limit]
+        return [(int(positions[i]), float(scores[i])) for i in order]
@@ -0,0 +1,148 @@
+"""
+services/tag_prediction/model_registry.py
+
+Implements a small file-based registry of tag predictor checkpoints. Every checkpoint is published as a new
+immutable version file, and a CURRENT pointer file names the version in use. Both are written to a temporary
+file and renamed into place, so readers never see a partially written checkpoint, and processes can cheaply
+detect a new model by re-reading the pointer.
+"""
+
+import os
+import shutil
+import time
+import uuid
+import torch
+from config.logging_config import setup_logging
+from utils.constants import MODEL_REGISTRY_DIR, MODEL_REGISTRY_KEEP, MODEL_FILE_PATH
+
+logger = setup_logging(__name__)
+
+CURRENT_POINTER = "CURRENT"
+CHECKPOINT_SUFFIX = ".pth"
+
+
+class ModelRegistry:
+    """
+    A registry of versioned model checkpoints with a pointer to the current version.
+
+    Attributes:
+        directory (str): The directory holding the checkpoints and the pointer.
+        keep (int): The number of most recent checkpoints to keep.
+    """
+    def __init__(self, directory: str = MODEL_REGISTRY_DIR, keep: int = MODEL_REGISTRY_KEEP):
+        """
+        Initializes the registry.
+
+        :param directory: The directory holding the checkpoints and the pointer.
+        :param keep: The number of most recent checkpoints to keep.
+        """
+        self.directory = directory
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _replace_atomically(self, name: str, write: callable) -> None:
+        """
+        Writes a file through a uniquely named temporary file that is then renamed over the target.
+
+        :param name: The name of the target file in the registry directory.
+        :param write: A callable writing the contents to the path it is given.
+        """
+        tmp_path = self._path(f".{name}.{uuid.uuid4().hex}.tmp")
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, self._path(name))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def current_version(self) -> str or None:
+        """
+        Reads the version the CURRENT pointer refers to. If nothing was published yet, a legacy single-file
+        checkpoint is imported as the first version.
+
+        :return: The current version, or None if there is no checkpoint.
+        """
+        try:
+            with open(self._path(CURRENT_POINTER)) as pointer:
+                return pointer.read().strip() or None
+        except FileNotFoundError:
+            return self._import_legacy_checkpoint()
+        except Exception as e:
+            logger.error(f"Error reading current model version: {e}")
+            return None
+
+    def publish(self, checkpoint: dict) -> str or None:
+        """
+        Saves a checkpoint as a new version and points CURRENT to it.
+
+        :param checkpoint: The checkpoint to save.
+        :return: The new version, or None if saving failed.
+        """
+        version = f"{time.strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        try:
+            self._replace_atomically(version + CHECKPOINT_SUFFIX, lambda path: torch.save(checkpoint, path))
+            self._replace_atomically(CURRENT_POINTER, lambda path: self._write_text(path, version))
+            self._prune()
+            return version
+        except Exception as e:
+            logger.error(f"Error publishing model checkpoint: {e}", exc_info=True)
+            return None
+
+    def load(self, version: str) -> dict or None:
+        """
+        Loads the checkpoint of a version.
+
+        :param version: The version to load.
+        :return: The checkpoint, or None if loading failed.
+        """
+        try:
+            return torch.load(self._path(version + CHECKPOINT_SUFFIX))
+        except Exception as e:
+            logger.error(f"Error loading model checkpoint {version}: {e}", exc_info=True)
+            return None
+
+    def versions(self) -> list[str]:
+        """
+        Lists the versions in the registry, oldest first.
+
+        :return: A list of versions.
+        """
+        return sorted(name[:-len(CHECKPOINT_SUFFIX)] for name in os.listdir(self.directory)
+                      if name.endswith(CHECKPOINT_SUFFIX) and not name.startswith('.'))
+
+    def _prune(self) -> None:
+        """
+        Removes all but the most recent checkpoints. Older versions are kept for a while so that readers that
+        have just read the pointer can still load the version it named.
+        """
+        for version in self.versions()[:-self.keep]:
+            try:
+                os.remove(self._path(version + CHECKPOINT_SUFFIX))
+            except FileNotFoundError:
+                pass
+
+    def _import_legacy_checkpoint(self) -> str or None:
+        """
+        Imports the legacy single-file checkpoint as the first version, if it exists.
+
+        :return: The imported version, or None if there is no legacy checkpoint.
+        """
+        if not os.path.exists(MODEL_FILE_PATH):
+            return None
+        version = f"{time.strftime('%Y%m%d%H%M%S')}_legacy"
+        try:
+            self._replace_atomically(version + CHECKPOINT_SUFFIX, lambda path: shutil.copyfile(MODEL_FILE_PATH, path))
+            self._replace_atomically(CURRENT_POINTER, lambda path: self._write_text(path, version))
+            logger.info(f"Imported legacy model checkpoint as version {version}")
+            return version
+        except Exception as e:
+            logger.error(f"Error importing legacy model checkpoint: {e}")
+            return None
+
+    @staticmethod
+    def _write_text(path: str, text: str) -> None:
+        with open(path, 'w') as file:
+            file.write(text)
@@ -0,0 +1,91 @@
+"""
+services/tag_prediction/refresh_stats.py
+
+Records statistics of the periodic auto tags refresh in Redis, so the API can report how many images the
+last pass processed, updated and skipped as already up to date.
+"""
+
+from datetime import datetime
+from config.logging_config import setup_logging
+from config.redis_config import get_redis_client
+from utils.constants import AUTO_TAGS_REFRESH_STATS_KEY
+
+logger = setup_logging(__name__)
+
+async_redis_client = get_redis_client(async_mode=True)
+sync_redis_client = get_redis_client(async_mode=False)
+
+
+def start_refresh_stats(model_version: str or None, total_images: int) -> None:
+    """
+    Resets the statistics at the start of a new refresh pass.
+
+    :param model_version: The version of the model predicting the tags.
+    :param total_images: The number of images in the library.
+    """
+    try:
+        with sync_redis_client.pipeline(transaction=True) as pipe:
+            pipe.delete(AUTO_TAGS_REFRESH_STATS_KEY)
+            pipe.hset(AUTO_TAGS_REFRESH_STATS_KEY, mapping={
+                'status': 'running',
+                'model_version': model_version or '',
+                'started_at': datetime.now().isoformat(),
+                'total_images': total_images,
+                'processed': 0,
+                'updated': 0
+            })
+            pipe.execute()
+    except Exception as e:
+        logger.error(f"Error starting auto tags refresh stats: {e}")
+
+
+def record_refresh_chunk(processed: int, updated: int) -> None:
+    """
+    Adds the results of a processed chunk to the statistics.
+
+    :param processed: The number of images predicted in the chunk.
+    :param updated: The number of images written in the chunk.
+    """
+    try:
+        with sync_redis_client.pipeline(transaction=True) as pipe:
+            pipe.hincrby(AUTO_TAGS_REFRESH_STATS_KEY, 'processed', processed)
+            pipe.hincrby(AUTO_TAGS_REFRESH_STATS_KEY, 'updated', updated)
+            pipe.execute()
+    except Exception as e:
+        logger.error(f"Error recording auto tags refresh stats: {e}")
+
+
+def finish_refresh_stats(total_images: int) -> None:
+    """
+    Marks the pass as finished and records how many images were skipped as up to date.
+
+    :param total_images: The number of images in the library.
+    """
+    try:
+        processed = int(sync_redis_client.hget(AUTO_TAGS_REFRESH_STATS_KEY, 'processed') or 0)
+        sync_redis_client.hset(AUTO_TAGS_REFRESH_STATS_KEY, mapping={
+            'status': 'finished',
+            'finished_at': datetime.now().isoformat(),
+            'total_images': total_images,
+            'skipped': max(total_images - processed, 0)
+        })
+    except Exception as e:
+        logger.error(f"Error finishing auto tags refresh stats: {e}")
+
+
+async def get_refresh_stats() -> dict or None:
+    """
+    Retrieves the statistics of the last auto tags refresh pass.
+
+    :return: A dictionary of the statistics, empty if no pass has run yet, or None if an error occurs.
+    """
+    try:
+        stats = await async_redis_client.hgetall(AUTO_TAGS_REFRESH_STATS_KEY)
+        stats = {key.decode(): value.decode() for key, value in stats.items()}
+        for field in ('total_images', 'processed', 'updated', 'skipped'):
+            if field in stats:
+                stats[field] = int(stats[field])
+        return stats
+    except Exception as e:
+        logger.error(f"Error retrieving auto tags refresh stats: {e}")
+        return None
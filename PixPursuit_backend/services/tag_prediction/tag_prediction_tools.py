@@ -2,83 +2,82 @@
 services/tag_prediction/tag_prediction_tools.py
 
 This module contains functions and tasks related to the training and prediction processes of a machine learning model for tag prediction.
-It includes caching mechanisms for unique tags, model state management, and Celery tasks for asynchronous training and prediction operations.
+It includes model state management, the mini-batch model trainer consuming the training buffer,
+and Celery tasks for asynchronous training and prediction operations.
 """
 
+import time
+import numpy as np
 import torch
 import torch.optim as optim
 from config.logging_config import setup_logging
-import os
 from celery import shared_task
 from services.tag_prediction.tag_predictor import TagPredictor
-from data.databases.mongodb.async_db.database_tools import get_image_document
-from data.databases.mongodb.sync_db.celery_database_tools import get_image_document_sync, get_unique_tags, add_auto_tags, get_image_ids_paginated
-from data.databases.mongodb.async_db.database_tools import get_album
+from services.tag_prediction.model_registry import ModelRegistry
+from services.tag_prediction.training_buffer import encode_sample, push_training_samples, pop_training_samples, \
+    drain_settled_images, drain_touched_albums, sync_redis_client
+from services.tag_prediction.tag_vocabulary import TagVocabulary, get_tag_vocabulary
+from data.databases.mongodb.sync_db.celery_database_tools import get_image_vectors_batch_sync, \
+    get_image_documents_batch_sync, get_album_subtree_sync, add_auto_tags_bulk, stream_images_for_tagging, count_images, \
+    mark_images_without_features
+from services.tag_prediction.refresh_stats import start_refresh_stats, record_refresh_chunk, finish_refresh_stats
+from utils.vector_codec import decode_vector, vector_digest
+from utils.metrics import MODEL_INFERENCE
 from utils.constants import (
-    POSITIVE_THRESHOLD, LEARNING_RATE, MODEL_FILE_PATH, TRAIN_MODEL_TASK,
-    PREDICT_TAGS_TASK, PREDICT_ALL_TAGS_TASK, MAIN_QUEUE, BEAT_QUEUE
+    POSITIVE_THRESHOLD, LEARNING_RATE, TRAIN_MODEL_TASK,
+    PREDICT_TAGS_TASK, PREDICT_ALL_TAGS_TASK, MAIN_QUEUE, BEAT_QUEUE, TRAINING_BATCH_SIZE,
+    TRAINER_MAX_RUNTIME, TRAINER_CHECKPOINT_INTERVAL, TRAINER_LOCK_KEY, TRAINING_DEBOUNCE_WINDOW,
+    TRAINING_EVENTS_BATCH_SIZE, AUTO_TAGS_REFRESH_BATCH_SIZE,
+    AUTO_TAGS_REFRESH_CHECKPOINT_KEY
 )
 
 logger = setup_logging(__name__)
 
-unique_tags_cache = None
+model_registry = ModelRegistry()
 
+# Model, optimizer and model version of the trainer, kept across trainer runs in the worker process
+trainer_state = None
 
-def get_unique_tags_cached() -> list[str]:
-    """
-    Retrieves and caches the unique tags. If already cached, returns the cached tags.
-
-    :return: A list of unique tags.
-    """
-    global unique_tags_cache
-    if unique_tags_cache is None:
-        unique_tags_cache = get_unique_tags()
-    return unique_tags_cache
-
-
-def update_unique_tags_cache() -> None:
-    """
-    Updates the cache of unique tags.
-    """
-    global unique_tags_cache
-    unique_tags_cache = get_unique_tags()
+# Model, tag vocabulary and model version used for prediction, reloaded when the current version changes
+predictor_state = None
 
 
-def save_model_state(model: TagPredictor, file_path: str = MODEL_FILE_PATH) -> None:
+def save_model_state(model: TagPredictor, optimizer: optim.Optimizer = None, tags: list[str] = None) -> str or None:
     """
-    Saves the state of the tag prediction model to a file.
+    Publishes the state of the tag prediction model as a new version in the model registry.
 
     :param model: The TagPredictor model to save.
-    :param file_path: The path to the file where the model state should be saved.
+    :param optimizer: The optimizer whose state should be saved along with the model, if any.
+    :param tags: The tag vocabulary the model was trained with, if known.
+    :return: The published version, or None if saving failed.
     """
-    try:
-        torch.save({
-            'state_dict': model.state_dict(),
-            'num_tags': model.num_tags
-        }, file_path)
-    except Exception as e:
-        logger.error(f"Error saving model state: {e}", exc_info=True)
-
-
-def load_model_state(file_path: str = MODEL_FILE_PATH, input_size: int = 1000,
+    checkpoint = {
+        'state_dict': model.state_dict(),
+        'num_tags': model.num_tags
+    }
+    if optimizer is not None:
+        checkpoint['optimizer_state_dict'] = optimizer.state_dict()
+    if tags is not None:
+        checkpoint['tags'] = tags
+    return model_registry.publish(checkpoint)
+
+
+def load_model_state(checkpoint: dict or None, input_size: int = 1000,
                      hidden_size: int = 512) -> TagPredictor or None:
     """
-    Loads the tag prediction model from a file.
+    Builds the tag prediction model from a checkpoint.
 
-    :param file_path: The path to the file from which the model state should be loaded.
+    :param checkpoint: The checkpoint loaded from the model registry, or None to initialize a new model.
     :param input_size: The input size for the model.
     :param hidden_size: The hidden size for the model.
     :return: The loaded TagPredictor model, or None if loading fails.
     """
-    if not os.path.exists(file_path):
-        logger.warning(f"Model file {file_path} not found. Initializing a new model.")
-        tag_predictor = TagPredictor(input_size, hidden_size, len(get_unique_tags_cached()))
-        return tag_predictor
+    if checkpoint is None:
+        logger.warning("No model checkpoint found. Initializing a new model.")
+        return TagPredictor(input_size, hidden_size, len(get_tag_vocabulary()))
 
     try:
-        checkpoint = torch.load(file_path)
-        num_tags = checkpoint['num_tags']
-        model = TagPredictor(input_size, hidden_size, num_tags)
+        model = TagPredictor(input_size, hidden_size, checkpoint['num_tags'])
         model.load_state_dict(checkpoint['state_dict'])
         return model
     except Exception as e:
@@ -86,41 +85,116 @@ def load_model_state(file_path: str = MODEL_FILE_PATH, input_size: int = 1000,
         return None
 
 
-def update_model_tags(tag_vector: list[int] = None) -> TagPredictor:
+def load_predictor_state(version: str or None) -> tuple[TagPredictor, list[str], str or None] or None:
     """
-    Updates the tags of the model based on the provided tag vector.
+    Loads a version of the tag prediction model together with the tag vocabulary it was trained with.
+    Checkpoints without a stored vocabulary fall back to the current tag vocabulary.
 
-    :param tag_vector: A list of integers representing the tag vector.
-    :return: The updated TagPredictor model.
+    :param version: The version to load, or None to initialize an untrained model.
+    :return: A tuple of the model, the tag vocabulary and the model version, or None if loading fails.
     """
-    tag_predictor = load_model_state()
-    try:
-        if not tag_vector:
-            unique_tags = get_unique_tags_cached()
-            num_tags = len(unique_tags)
-        else:
-            num_tags = len(tag_vector)
-        if num_tags != tag_predictor.fc3.out_features:
-            tag_predictor.update_output_layer(num_tags)
-    except Exception as e:
-        logger.error(f"Error updating model tags: {e}", exc_info=True)
+    checkpoint = model_registry.load(version) if version else None
+    if version and checkpoint is None:
+        return None
+
+    model = load_model_state(checkpoint)
+    if not model:
+        return None
 
-    save_model_state(tag_predictor)
-    return tag_predictor
+    tags = (checkpoint or {}).get('tags') or get_tag_vocabulary().tags
+    if len(tags) != model.fc3.out_features:
+        model.update_output_layer(len(tags))
+    return model, tags, version
 
 
-def tags_to_vector(tags: list[str], feedback: dict) -> list[int]:
+def get_predictor_state() -> tuple[TagPredictor, list[str], str or None] or None:
+    """
+    Returns the model, tag vocabulary and model version used for prediction. They are kept in memory and
+    reloaded only when the registry's current version changes. If the new version can't be loaded,
+    the previously loaded model keeps being used.
+
+    :return: A tuple of the model, the tag vocabulary and the model version, or None if loading fails.
+    """
+    global predictor_state
+    version = model_registry.current_version()
+    if predictor_state is None or predictor_state[2] != version:
+        loaded_state = load_predictor_state(version)
+        if loaded_state:
+            predictor_state = loaded_state
+    return predictor_state
+
+
+def load_trainer_state(version: str or None) -> tuple[TagPredictor, optim.Optimizer, str or None] or None:
+    """
+    Loads a version of the model and its optimizer for training. The optimizer state is restored from
+    the checkpoint if present.
+
+    :param version: The version to load, or None to initialize an untrained model.
+    :return: A tuple of the model, the optimizer and the model version, or None if loading fails.
+    """
+    checkpoint = model_registry.load(version) if version else None
+    if version and checkpoint is None:
+        return None
+
+    model = load_model_state(checkpoint)
+    if not model:
+        return None
+
+    optimizer = optim.Adam(model.parameters(), lr=LEARNING_RATE)
+    if checkpoint and 'optimizer_state_dict' in checkpoint:
+        try:
+            optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
+        except Exception as e:
+            logger.warning(f"Couldn't restore optimizer state, starting with a fresh optimizer: {e}")
+    return model, optimizer, version
+
+
+def resize_trainer_output(model: TagPredictor, optimizer: optim.Optimizer,
+                          num_tags: int) -> optim.Optimizer:
+    """
+    Resizes the output layer of the model being trained and rebuilds its optimizer, keeping the optimizer
+    state of the layers that were not replaced.
+
+    :param model: The model being trained.
+    :param optimizer: The current optimizer of the model.
+    :param num_tags: The new number of tags.
+    :return: The optimizer for the resized model.
+    """
+    model.update_output_layer(num_tags)
+    new_optimizer = optim.Adam(model.parameters(), lr=LEARNING_RATE)
+    for param in model.parameters():
+        if param in optimizer.state:
+            new_optimizer.state[param] = optimizer.state[param]
+    return new_optimizer
+
+
+def get_trainer_state() -> tuple[TagPredictor, optim.Optimizer, str or None] or None:
+    """
+    Returns the model and optimizer of the trainer, reloading them if another version was published
+    since the last trainer run in this process.
+
+    :return: A tuple of the model, the optimizer and the model version, or None if loading fails.
+    """
+    global trainer_state
+    version = model_registry.current_version()
+    if trainer_state is None or trainer_state[2] != version:
+        trainer_state = load_trainer_state(version)
+    return trainer_state
+
+
+def tags_to_vector(tags: list[str], feedback: dict, vocabulary: TagVocabulary = None) -> list[int]:
     """
     Converts a list of tags and their feedback to a vector representation.
 
     :param tags: A list of tags.
     :param feedback: A dictionary containing feedback data.
+    :param vocabulary: The tag vocabulary to index into. Defaults to the current tag vocabulary.
     :return: A list of integers representing the tag vector.
     """
     try:
-        unique_tags = get_unique_tags_cached()
-        tag_vector = [0] * len(unique_tags)
-        tag_dict = {tag: i for i, tag in enumerate(unique_tags)}
+        vocabulary = vocabulary or get_tag_vocabulary()
+        tag_vector = [0] * len(vocabulary)
+        tag_dict = vocabulary.index
 
         for tag in tags:
             if tag in tag_dict:
@@ -138,155 +212,300 @@ def tags_to_vector(tags: list[str], feedback: dict) -> list[int]:
         return []
 
 
-async def training_init(inserted_ids: list[str]) -> None:
+def collect_album_image_ids(album_ids: list[str]) -> list[str]:
     """
-    Initializes training for the provided image IDs.
+    Collects the IDs of all images in the given albums and their sub-albums.
 
-    :param inserted_ids: A list of image document IDs to be processed for training.
+    :param album_ids: The IDs of the albums.
+    :return: A list of image IDs.
     """
-    for inserted_id in inserted_ids:
-        try:
-            image_document = await get_image_document(inserted_id)
-            if image_document:
-                features = image_document['features']
-                feedback_tags = image_document.get('feedback', {})
-                tags = image_document['user_tags']
-                update_unique_tags_cache()
-                tag_vector = tags_to_vector(tags, feedback_tags)
-                train_model.delay(features, tag_vector)
-                logger.info(f"Training initialized for image: {inserted_id}")
-        except Exception as e:
-            logger.error(f"Error during training initialization: {e}", exc_info=True)
+    albums = get_album_subtree_sync(album_ids, ['images'])
+    return [image_id for album in albums for image_id in album.get('images', [])]
 
 
-async def train_init_albums(album_ids: list[str]) -> None:
+def collect_training_samples() -> int:
     """
-    Initializes training for the provided album IDs.
+    Turns the settled training events into samples in the training buffer. Images edited again within
+    the debounce window are left for a later run, so repeated edits become a single sample.
 
-    :param album_ids: A list of album IDs to initialize training for.
+    :return: The number of samples added to the buffer.
     """
-    for album_id in album_ids:
-        try:
-            album = await get_album(album_id)
-            if not album:
-                continue
-
-            image_ids = album.get('images', [])
-            await training_init(image_ids)
-
-            sub_album_ids = album.get('sons', [])
-            if sub_album_ids:
-                await train_init_albums(sub_album_ids)
+    try:
+        image_ids = set(drain_settled_images(TRAINING_DEBOUNCE_WINDOW))
+        image_ids.update(collect_album_image_ids(drain_touched_albums()))
+    except Exception as e:
+        logger.error(f"Error draining training events: {e}", exc_info=True)
+        return 0
 
+    image_ids = list(image_ids)
+    collected = 0
+    for start in range(0, len(image_ids), TRAINING_EVENTS_BATCH_SIZE):
+        batch_ids = image_ids[start:start + TRAINING_EVENTS_BATCH_SIZE]
+        try:
+            documents = get_image_documents_batch_sync(batch_ids, ['user_tags', 'feedback'])
+            image_vectors = get_image_vectors_batch_sync(batch_ids, ['features'])
+            samples = []
+            for image_id, document in documents.items():
+                features = decode_vector(image_vectors.get(image_id, {}).get('features'))
+                if features.size == 0:
+                    continue
+                samples.append(encode_sample(features, document.get('user_tags', []), document.get('feedback', {})))
+            push_training_samples(samples)
+            collected += len(samples)
         except Exception as e:
-            logger.error(f"Error while training images in albums: {e}")
-            continue
+            logger.error(f"Error collecting training samples: {e}", exc_info=True)
 
+    if collected:
+        logger.info(f"Training samples collected for {collected} images")
+    return collected
 
-def predictions_to_tag_names(predictions: list[int]) -> list[str]:
+
+def predictions_to_tag_names(predictions: list[int], all_tags: list[str]) -> list[str]:
     """
     Converts a list of prediction indices to corresponding tag names.
 
     :param predictions: A list of integers representing prediction indices.
+    :param all_tags: The tag vocabulary the predictions index into.
     :return: A list of tag names corresponding to the prediction indices.
     """
-    all_tags = get_unique_tags()
-    index_to_tag = {i: tag for i, tag in enumerate(all_tags)}
-    return [index_to_tag[idx] for idx in predictions if idx in index_to_tag and index_to_tag[idx] != 'NULL']
+    return [all_tags[idx] for idx in predictions if 0 <= idx < len(all_tags) and all_tags[idx] != 'NULL']
+
+
+def train_batch(model: TagPredictor, optimizer: optim.Optimizer,
+                samples: list[tuple[np.ndarray, list[str], dict]], vocabulary: TagVocabulary) -> float:
+    """
+    Performs a single training step on a mini-batch of samples.
+
+    :param model: The model being trained.
+    :param optimizer: The optimizer of the model.
+    :param samples: The samples of the mini-batch, as returned by the training buffer.
+    :param vocabulary: The tag vocabulary the model is trained with.
+    :return: The loss of the mini-batch.
+    """
+    features_tensor = torch.from_numpy(np.stack([features for features, _, _ in samples]))
+    target = torch.tensor([tags_to_vector(tags, feedback, vocabulary) for _, tags, feedback in samples],
+                          dtype=torch.float32)
+
+    criterion = torch.nn.BCELoss()
+    model.train()
+    optimizer.zero_grad()
+    predicted_tags = model(features_tensor)
+    loss = criterion(predicted_tags, target)
+    loss.backward()
+    optimizer.step()
+    return loss.item()
 
 
 @shared_task(name=TRAIN_MODEL_TASK, queue=MAIN_QUEUE)
-def train_model(features: list[float], tag_vector: list[int]) -> None:
+def train_model() -> None:
     """
-    Trains the model with the provided features and tag vector.
+    Periodically trains the model on the samples accumulated in the training buffer, after collecting
+    samples for the images whose training events settled since the last run.
 
-    :param features: A list of feature values for the model.
-    :param tag_vector: A list of integers representing the tag vector.
+    Only one trainer runs at a time, guarded by a Redis lock. The trainer consumes the buffer in mini-batches
+    with a persistent optimizer state and publishes checkpoints to the model registry on an interval and when done.
     """
-    logger.info("Model training started")
-    tag_predictor = update_model_tags(tag_vector)
-    if not tag_predictor:
-        logger.error("Model not found. Training aborted")
+    global trainer_state
+    lock = sync_redis_client.lock(TRAINER_LOCK_KEY, timeout=TRAINER_MAX_RUNTIME + 60)
+    if not lock.acquire(blocking=False):
+        logger.info("Model trainer already running")
         return
 
-    if not features or not tag_vector:
-        logger.error("Features or tag vector not found. Training aborted")
-        return
+    try:
+        collect_training_samples()
+        state = get_trainer_state()
+        if not state:
+            logger.error("Model not found. Training aborted")
+            return
+        tag_predictor, optimizer, version = state
+
+        vocabulary = get_tag_vocabulary()
+        num_tags = len(vocabulary)
+        if num_tags != tag_predictor.fc3.out_features:
+            optimizer = resize_trainer_output(tag_predictor, optimizer, num_tags)
 
-    features_tensor = torch.tensor(features, dtype=torch.float32)
-    if features_tensor.ndim == 1:
-        features_tensor = features_tensor.unsqueeze(0)
+        started_at = last_checkpoint_at = time.monotonic()
+        trained, dirty = 0, False
+        while time.monotonic() - started_at < TRAINER_MAX_RUNTIME:
+            samples = pop_training_samples(TRAINING_BATCH_SIZE)
+            if not samples:
+                break
 
-    target = torch.tensor([tag_vector], dtype=torch.float32)
-    if target.ndim == 1:
-        target = target.unsqueeze(0)
+            input_size = tag_predictor.fc1.in_features
+            samples = [sample for sample in samples if sample[0].size == input_size]
+            if not samples:
+                continue
 
-    try:
-        criterion = torch.nn.BCELoss()
-        optimizer = optim.Adam(tag_predictor.parameters(), lr=LEARNING_RATE)
-        optimizer.zero_grad()
-        predicted_tags = tag_predictor(features_tensor)
-        loss = criterion(predicted_tags, target)
-        loss.backward()
-        optimizer.step()
-        logger.info("Model trained and state saved")
+            try:
+                train_batch(tag_predictor, optimizer, samples, vocabulary)
+                trained += len(samples)
+                dirty = True
+            except Exception as e:
+                logger.error(f"Error training model: {e}", exc_info=True)
+
+            if dirty and time.monotonic() - last_checkpoint_at >= TRAINER_CHECKPOINT_INTERVAL:
+                version = save_model_state(tag_predictor, optimizer, vocabulary.tags) or version
+                last_checkpoint_at = time.monotonic()
+                dirty = False
+
+        if dirty:
+            version = save_model_state(tag_predictor, optimizer, vocabulary.tags) or version
+        trainer_state = (tag_predictor, optimizer, version)
+        if trained:
+            logger.info(f"Model trained on {trained} samples and saved as version {version}")
     except Exception as e:
-        logger.error(f"Error training model: {e}", exc_info=True)
+        logger.error(f"Error during model training: {e}", exc_info=True)
+    finally:
+        try:
+            lock.release()
+        except Exception as e:
+            logger.warning(f"Couldn't release model trainer lock: {e}")
+
+
+def predict_tag_names(tag_predictor: TagPredictor, all_tags: list[str],
+                      image_vectors: dict[str, dict], image_ids: list[str]) -> dict[str, list[str]]:
+    """
+    Predicts tag names for a batch of images with a single forward pass.
+
+    :param tag_predictor: The model to predict with.
+    :param all_tags: The tag vocabulary of the model.
+    :param image_vectors: A mapping of image IDs to their vectors documents.
+    :param image_ids: The IDs of the images to predict tags for.
+    :return: A mapping of image IDs to predicted tag names. Images without valid features are omitted.
+    """
+    input_size = tag_predictor.fc1.in_features
+    batch_ids, batch_features = [], []
+    for image_id in image_ids:
+        features = decode_vector(image_vectors.get(str(image_id), {}).get('features'))
+        if features.size != input_size:
+            logger.error(f"Couldn't retrieve image features: {image_id}")
+            continue
+        batch_ids.append(str(image_id))
+        batch_features.append(features)
+
+    if not batch_ids:
+        return {}
 
-    save_model_state(tag_predictor)
+    features_tensor = torch.from_numpy(np.stack(batch_features))
+    with MODEL_INFERENCE.labels('tag_predictor').time():
+        predicted_indices = tag_predictor.predict_tags_batch(features_tensor)
+    return {image_id: predictions_to_tag_names(indices, all_tags)
+            for image_id, indices in zip(batch_ids, predicted_indices)}
+
+
+def prediction_stamps(model_version: str or None, image_vectors: dict[str, dict],
+                      image_ids: list[str]) -> dict[str, dict]:
+    """
+    Builds the fields recording which model version and features the auto tags of each image were predicted from.
+    The periodic refresh skips images whose stamp matches the current model and features.
+
+    :param model_version: The version of the model that predicted the tags. Untrained models are not stamped.
+    :param image_vectors: A mapping of image IDs to their vectors documents.
+    :param image_ids: The IDs of the images that were predicted.
+    :return: A mapping of image IDs to the stamp fields.
+    """
+    if not model_version:
+        return {}
+
+    stamps = {}
+    for image_id in image_ids:
+        features_digest = vector_digest(image_vectors.get(image_id, {}).get('features'))
+        stamps[image_id] = {
+            'auto_tags_model_version': model_version,
+            'auto_tags_features_digest': features_digest,
+            'features_digest': features_digest
+        }
+    return stamps
 
 
 @shared_task(name=PREDICT_TAGS_TASK, queue=MAIN_QUEUE)
 def predict_and_update_tags(image_ids: list[str]) -> None:
     """
-    Predicts and updates tags for the provided image IDs.
+    Predicts and updates tags for the provided image IDs. The features of all images are fetched with a single
+    query, tags are predicted with one batched forward pass and written with a single bulk write.
 
     :param image_ids: A list of image document IDs for which to predict and update tags.
     """
-    for image_id in image_ids:
-        try:
-            image_document = get_image_document_sync(image_id)
-            if not image_document:
-                logger.error(f"Couldn't retrieve image document: {image_id}")
-                continue
+    try:
+        state = get_predictor_state()
+        if not state:
+            logger.error("Model not found. Prediction aborted")
+            return
+        tag_predictor, all_tags, model_version = state
+
+        image_vectors = get_image_vectors_batch_sync(image_ids, ['features'])
+        predicted_tags = predict_tag_names(tag_predictor, all_tags, image_vectors, image_ids)
+        add_auto_tags_bulk(predicted_tags, prediction_stamps(model_version, image_vectors, list(predicted_tags)))
+    except Exception as e:
+        logger.error(f"Error predicting and updating tags for images: {e}", exc_info=True)
 
-            tag_predictor = update_model_tags()
-            if not tag_predictor:
-                logger.error(f"Model not found. Prediction aborted for image: {image_id}")
-                continue
 
-            features = image_document['features']
-            features_tensor = torch.tensor(features, dtype=torch.float32)
-            if features_tensor.ndim == 1:
-                features_tensor = features_tensor.unsqueeze(0)
+def refresh_auto_tags_chunk(tag_predictor: TagPredictor, all_tags: list[str], model_version: str or None,
+                            documents: list[dict]) -> int:
+    """
+    Predicts and writes auto tags for a chunk of streamed image documents.
 
-            predicted_indices = tag_predictor.predict_tags(features_tensor)
-            predicted_tags = predictions_to_tag_names(predicted_indices)
-            add_auto_tags(image_id, predicted_tags)
-            save_model_state(tag_predictor)
-        except Exception as e:
-            logger.error(f"Error predicting and updating tags for image: {image_id} - {e}", exc_info=True)
-            continue
+    :param tag_predictor: The model to predict with.
+    :param all_tags: The tag vocabulary of the model.
+    :param model_version: The version of the model.
+    :param documents: The image documents, with their '_id' field.
+    :return: The number of updated images.
+    """
+    image_ids = [str(document['_id']) for document in documents]
+    image_vectors = get_image_vectors_batch_sync(image_ids, ['features'])
+    predicted_tags = predict_tag_names(tag_predictor, all_tags, image_vectors, image_ids)
+    if model_version:
+        # Otherwise images without features would be streamed again by every run
+        mark_images_without_features([image_id for image_id in image_ids if image_id not in predicted_tags],
+                                     model_version)
+    return add_auto_tags_bulk(predicted_tags, prediction_stamps(model_version, image_vectors, list(predicted_tags)))
 
 
 @shared_task(name=PREDICT_ALL_TAGS_TASK, queue=BEAT_QUEUE)
 def update_all_auto_tags() -> None:
     """
-    Periodically updates all auto-generated tags for the images in the database.
+    Periodically updates the auto-generated tags of stale images in the database.
+
+    Only images whose tags were predicted by another model version or from different features are refreshed,
+    so runs without a new checkpoint or new images are close to no-ops. Images are streamed through a projected
+    cursor and predicted in vectorized chunks, with each chunk written in a single unordered bulk write.
+    The ID of the last written image is checkpointed in Redis, so an interrupted pass resumes where it stopped
+    instead of starting over.
     """
-    logger.info("Updating all auto tags")
-    update_unique_tags_cache()
-    page_size = 100
-    last_id = None
-    while True:
-        try:
-            image_ids = get_image_ids_paginated(last_id, page_size)
-            if not image_ids:
-                break
+    state = get_predictor_state()
+    if not state:
+        logger.error("Model not found. Auto tags update aborted")
+        return
+    tag_predictor, all_tags, model_version = state
 
-            predict_and_update_tags.delay(image_ids)
+    last_id = sync_redis_client.get(AUTO_TAGS_REFRESH_CHECKPOINT_KEY)
+    last_id = last_id.decode() if last_id else None
+    if not last_id:
+        start_refresh_stats(model_version, count_images())
+    logger.info(f"Updating all auto tags{f' resuming after image: {last_id}' if last_id else ''}")
 
-            last_id = image_ids[-1]
-        except Exception as e:
-            logger.error(f"Error updating all auto tags: {e}", exc_info=True)
-            break
+    processed, updated = 0, 0
+    try:
+        documents = []
+        cursor = stream_images_for_tagging(last_id, AUTO_TAGS_REFRESH_BATCH_SIZE, model_version)
+        for document in cursor:
+            documents.append(document)
+            if len(documents) < AUTO_TAGS_REFRESH_BATCH_SIZE:
+                continue
+            chunk_updated = refresh_auto_tags_chunk(tag_predictor, all_tags, model_version, documents)
+            record_refresh_chunk(len(documents), chunk_updated)
+            processed += len(documents)
+            updated += chunk_updated
+            sync_redis_client.set(AUTO_TAGS_REFRESH_CHECKPOINT_KEY, str(documents[-1]['_id']))
+            documents = []
+
+        if documents:
+            chunk_updated = refresh_auto_tags_chunk(tag_predictor, all_tags, model_version, documents)
+            record_refresh_chunk(len(documents), chunk_updated)
+            processed += len(documents)
+            updated += chunk_updated
+        sync_redis_client.delete(AUTO_TAGS_REFRESH_CHECKPOINT_KEY)
+        finish_refresh_stats(count_images())
+        logger.info(f"Auto tags updated: {processed} stale images processed, {updated} updated")
+    except Exception as e:
+        logger.error(f"Error updating all auto tags after {processed} images: {e}", exc_info=True)
@@ -66,10 +66,16 @@ class TagPredictor(nn.Module):
     def update_output_layer(self, new_num_tags):
         """
         Updates the output layer of the model to predict a new number of tags.
+        The tag vocabulary only grows at its end, so the weights of the tags that are kept are copied over.
 
         :param new_num_tags: The new number of unique tags to predict.
         """
+        old_fc3 = self.fc3
         self.fc3 = nn.Linear(self.fc2.out_features, new_num_tags)
+        kept = min(old_fc3.out_features, new_num_tags)
+        with torch.no_grad():
+            self.fc3.weight[:kept] = old_fc3.weight[:kept]
+            self.fc3.bias[:kept] = old_fc3.bias[:kept]
         self.in3 = nn.InstanceNorm1d(new_num_tags)
         self.num_tags = new_num_tags
 
@@ -85,3 +91,15 @@ class TagPredictor(nn.Module):
             predictions = self.forward(features)
             high_confidence_tags = (predictions > TAG_PREDICTION_THRESHOLD).nonzero(as_tuple=True)[1]
             return high_confidence_tags.tolist()
+
+    def predict_tags_batch(self, features):
+        """
+        Predicts tags for a batch of feature vectors with a single forward pass.
+
+        :param features: The input tensor of shape (batch_size, input_size).
+        :return: A list with, for each row of the batch, the indices of tags with high confidence predictions.
+        """
+        self.eval()
+        with torch.no_grad():
+            predictions = self.forward(features) > TAG_PREDICTION_THRESHOLD
+            return [row.nonzero(as_tuple=True)[0].tolist() for row in predictions]
@@ -0,0 +1,64 @@
+"""
+services/tag_prediction/tag_vocabulary.py
+
+Provides the tag vocabulary used to map tags to model outputs and back. Each process keeps a cached copy
+of the vocabulary with a precomputed tag-to-index mapping, and reloads it from the tags collection only
+when the vocabulary version in Redis changes, so lookups never scan the collection.
+"""
+
+import time
+from config.logging_config import setup_logging
+from data.databases.mongodb.sync_db.celery_database_tools import get_unique_tags
+from data.databases.redis_db.redis_tools import get_tag_vocabulary_version
+from utils.constants import TAG_VOCABULARY_MAX_AGE
+
+logger = setup_logging(__name__)
+
+
+class TagVocabulary:
+    """
+    A snapshot of the tag vocabulary.
+
+    Attributes:
+        tags (list[str]): The tag names, ordered by creation. Removed tags are kept as 'NULL' to preserve indices.
+        index (dict[str, int]): A mapping of tag names to their position in `tags`.
+        version (int or None): The vocabulary version the snapshot was loaded at.
+    """
+    def __init__(self, tags: list[str], version: int or None):
+        """
+        Initializes the snapshot and precomputes the tag-to-index mapping.
+
+        :param tags: The tag names, ordered by creation.
+        :param version: The vocabulary version the tags were loaded at.
+        """
+        self.tags = tags
+        self.index = {tag: i for i, tag in enumerate(tags) if tag != 'NULL'}
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.tags)
+
+
+vocabulary_cache = None
+
+
+def get_tag_vocabulary() -> TagVocabulary:
+    """
+    Returns the cached tag vocabulary, reloading it if the vocabulary version changed or the cached copy is
+    older than TAG_VOCABULARY_MAX_AGE.
+
+    :return: The current tag vocabulary.
+    """
+    global vocabulary_cache
+    version = get_tag_vocabulary_version()
+    if (vocabulary_cache is None or version != vocabulary_cache.version
+            or time.monotonic() - vocabulary_cache.loaded_at > TAG_VOCABULARY_MAX_AGE):
+        try:
+            vocabulary_cache = TagVocabulary(get_unique_tags(), version)
+            logger.info(f"Loaded tag vocabulary version {version} with {len(vocabulary_cache)} tags")
+        except Exception as e:
+            logger.error(f"Error loading tag vocabulary: {e}", exc_info=True)
+            if vocabulary_cache is None:
+                return TagVocabulary([], None)
+    return vocabulary_cache
@@ -0,0 +1,135 @@
+"""
+services/tag_prediction/training_buffer.py
+
+Implements the intake of the tag predictor training. Routes record the images and albums whose tags or
+feedback changed as lightweight events; the trainer debounces them, so repeated edits of an image within
+a window become a single sample. Samples accumulate in the training buffer, a Redis list drained in
+mini-batches by the single model trainer. Each sample holds the image feature vector together with the
+image's tags and feedback, so the tag vector is built against the tag vocabulary current at training time.
+"""
+
+import base64
+import json
+import time
+import numpy as np
+from config.logging_config import setup_logging
+from config.redis_config import get_redis_client
+from utils.constants import TRAINING_BUFFER_KEY, TRAINING_BUFFER_MAX_SIZE, TRAINING_TOUCHED_IMAGES_KEY, \
+    TRAINING_TOUCHED_ALBUMS_KEY
+
+logger = setup_logging(__name__)
+
+async_redis_client = get_redis_client(async_mode=True)
+sync_redis_client = get_redis_client(async_mode=False)
+
+
+def encode_sample(features: np.ndarray, tags: list[str], feedback: dict) -> str:
+    """
+    Serializes a training sample for the buffer.
+
+    :param features: The image feature vector.
+    :param tags: The user tags of the image.
+    :param feedback: The tag feedback of the image.
+    :return: The serialized sample.
+    """
+    return json.dumps({
+        'features': base64.b64encode(np.asarray(features, dtype=np.float32).tobytes()).decode('ascii'),
+        'tags': tags,
+        'feedback': feedback
+    })
+
+
+def decode_sample(raw: bytes or str) -> tuple[np.ndarray, list[str], dict]:
+    """
+    Deserializes a training sample read from the buffer.
+
+    :param raw: The serialized sample.
+    :return: A tuple of the feature vector, the tags and the feedback.
+    """
+    sample = json.loads(raw)
+    features = np.frombuffer(base64.b64decode(sample['features']), dtype=np.float32)
+    return features, sample['tags'], sample['feedback']
+
+
+async def queue_training_update(image_ids: list[str] = None, album_ids: list[str] = None) -> None:
+    """
+    Records that the tags or feedback of images changed, so the trainer turns them into training samples.
+    Recording an image again moves its debounce window forward.
+
+    :param image_ids: The IDs of the edited images.
+    :param album_ids: The IDs of albums whose images were all tagged.
+    """
+    if not image_ids and not album_ids:
+        return
+    try:
+        now = time.time()
+        async with async_redis_client.pipeline(transaction=True) as pipe:
+            if image_ids:
+                pipe.zadd(TRAINING_TOUCHED_IMAGES_KEY, {str(image_id): now for image_id in image_ids})
+            if album_ids:
+                pipe.sadd(TRAINING_TOUCHED_ALBUMS_KEY, *[str(album_id) for album_id in album_ids])
+            await pipe.execute()
+    except Exception as e:
+        logger.error(f"Error queueing training update: {e}", exc_info=True)
+
+
+def drain_settled_images(window: int) -> list[str]:
+    """
+    Removes and returns the edited images that were not edited again within the debounce window.
+
+    :param window: The debounce window in seconds.
+    :return: A list of image IDs.
+    """
+    cutoff = time.time() - window
+    with sync_redis_client.pipeline(transaction=True) as pipe:
+        pipe.zrangebyscore(TRAINING_TOUCHED_IMAGES_KEY, '-inf', cutoff)
+        pipe.zremrangebyscore(TRAINING_TOUCHED_IMAGES_KEY, '-inf', cutoff)
+        image_ids, _ = pipe.execute()
+    return [image_id.decode() for image_id in image_ids]
+
+
+def drain_touched_albums() -> list[str]:
+    """
+    Removes and returns the albums whose images were tagged.
+
+    :return: A list of album IDs.
+    """
+    with sync_redis_client.pipeline(transaction=True) as pipe:
+        pipe.smembers(TRAINING_TOUCHED_ALBUMS_KEY)
+        pipe.delete(TRAINING_TOUCHED_ALBUMS_KEY)
+        album_ids, _ = pipe.execute()
+    return [album_id.decode() for album_id in album_ids]
+
+
+def push_training_samples(samples: list[str]) -> None:
+    """
+    Appends serialized samples to the training buffer, dropping the oldest samples beyond the buffer size.
+
+    :param samples: The serialized samples to append.
+    """
+    if not samples:
+        return
+    try:
+        with sync_redis_client.pipeline(transaction=True) as pipe:
+            pipe.rpush(TRAINING_BUFFER_KEY, *samples)
+            pipe.ltrim(TRAINING_BUFFER_KEY, -TRAINING_BUFFER_MAX_SIZE, -1)
+            pipe.execute()
+    except Exception as e:
+        logger.error(f"Error pushing training samples: {e}", exc_info=True)
+
+
+def pop_training_samples(count: int) -> list[tuple[np.ndarray, list[str], dict]]:
+    """
+    Removes and returns up to `count` of the oldest samples from the training buffer.
+
+    :param count: The maximum number of samples to pop.
+    :return: A list of decoded samples, empty if the buffer is empty.
+    """
+    raw_samples = sync_redis_client.lpop(TRAINING_BUFFER_KEY, count) or []
+    samples = []
+    for raw in raw_samples:
+        try:
+            samples.append(decode_sample(raw))
+        except Exception as e:
+            logger.error(f"Skipping malformed training sample: {e}")
+    return samples
@@ -4,6 +4,7 @@ import pytest
 from httpx import AsyncClient
 from pathlib import Path
 from tests.conftest import TEST_ALBUM_ID
+from data.databases.mongodb.async_db.database_tools import get_album
 from uuid import uuid4
 from unittest.mock import patch
 
@@ -45,6 +46,32 @@ async def test_create_and_delete_album_with_parent(async_client: AsyncClient, to
     await test_create_and_delete_album(async_client, token, TEST_ALBUM_ID)
 
 
+@pytest.mark.asyncio
+async def test_delete_album_deletes_sub_albums(async_client: AsyncClient, token: str):
+    headers = {"Authorization": f"Bearer {token}"}
+    album_ids = []
+    parent_id = TEST_ALBUM_ID
+    for _ in range(2):
+        create_data = {"album_name": f"Test Album {uuid4()}", "parent_id": parent_id, "image_ids": []}
+        create_response = await async_client.post("/create-album", headers=headers, json=create_data)
+        assert create_response.status_code == 200
+        parent_id = create_response.json()["album_id"]
+        album_ids.append(parent_id)
+
+    sub_album = await get_album(album_ids[1], ['ancestors'])
+    assert sub_album['ancestors'][-2:] == [TEST_ALBUM_ID, album_ids[0]]
+
+    delete_response = await async_client.request(
+        method="DELETE",
+        url="/delete-albums",
+        headers=headers,
+        json={"album_ids": [album_ids[0]]}
+    )
+    assert delete_response.status_code == 200
+    assert await get_album(album_ids[1]) is None
+    assert album_ids[0] not in (await get_album(TEST_ALBUM_ID, ['sons']))['sons']
+
+
 @pytest.mark.asyncio
 async def test_delete_album_invalid_id(async_client: AsyncClient, token: str):
     headers = {"Authorization": f"Bearer {token}"}
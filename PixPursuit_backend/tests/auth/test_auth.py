@@ -1,4 +1,7 @@
 import pytest
+from unittest.mock import patch
+from data.databases.mongodb.async_db.database_tools import get_user
+from services.authentication.user_cache import user_cache
 from tests.conftest import TEST_USERNAME, TEST_PASSWORD, TEST_EMAIL
 
 
@@ -20,4 +23,15 @@ async def test_token_endpoint_email(async_client):
 async def test_token_endpoint_invalid_credentials(async_client):
     response = await async_client.post("/token", data={"username": "invalid", "password": "invalid"})
     assert response.status_code == 401
-    assert response.json() == {"detail": "Incorrect username or password"}
\ No newline at end of file
+    assert response.json() == {"detail": "Incorrect username or password"}
+
+
+@pytest.mark.asyncio
+async def test_authenticated_user_is_cached(async_client, token):
+    user_cache.invalidate()
+    headers = {"Authorization": f"Bearer {token}"}
+    with patch('services.authentication.auth.get_user', side_effect=get_user) as mock_get_user:
+        for _ in range(2):
+            response = await async_client.get("/similarity-cache-stats", headers=headers)
+            assert response.status_code == 200
+        mock_get_user.assert_called_once()
@@ -3,13 +3,15 @@ import asyncio
 import pytest
 from httpx import AsyncClient
 from uuid import uuid4
-from tests.conftest import TEST_IMAGE_ID
+from bson import ObjectId
+from tests.conftest import TEST_ALBUM_ID, TEST_IMAGE_ID
+from data.databases.mongodb.async_db.database_tools import get_image_document, update_tags_count, tags_collection
 from unittest.mock import patch
 
 
 @pytest.mark.asyncio
 async def test_add_and_remove_user_tag_and_feedback(async_client: AsyncClient, token: str):
-    with patch('tag_prediction.tag_prediction_tools.train_model.delay') as mock_train_model:
+    with patch('api.routes.content.queue_training_update') as mock_queue_training_update:
         headers = {"Authorization": f"Bearer {token}"}
         tag1 = f"Test Tag 1 {uuid4()}"
         tag2 = f"Test Tag 2 {uuid4()}"
@@ -45,12 +47,12 @@ async def test_add_and_remove_user_tag_and_feedback(async_client: AsyncClient, t
         assert response.status_code == 200
         assert response.json()["message"] == "Tags removed successfully"
 
-        assert mock_train_model.call_count == 3
+        assert mock_queue_training_update.call_count == 3
 
 
 @pytest.mark.asyncio
 async def test_add_tags_to_selected(async_client: AsyncClient, token: str):
-    with patch('tag_prediction.tag_prediction_tools.train_model.delay') as mock_train_model:
+    with patch('api.routes.content.queue_training_update') as mock_queue_training_update:
         headers = {"Authorization": f"Bearer {token}"}
         tag1 = f"Test Tag 1 {uuid4()}"
         tag2 = f"Test Tag 2 {uuid4()}"
@@ -79,7 +81,73 @@ async def test_add_tags_to_selected(async_client: AsyncClient, token: str):
         assert response.status_code == 200
         assert response.json()["message"] == "Tags removed successfully"
 
-        assert mock_train_model.call_count == 2
+        assert mock_queue_training_update.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_add_tags_to_selected_album(async_client: AsyncClient, token: str):
+    with patch('api.routes.content.queue_training_update'):
+        headers = {"Authorization": f"Bearer {token}"}
+        tag = f"Test Tag {uuid4()}"
+        data = {
+            "image_ids": [],
+            "album_ids": [TEST_ALBUM_ID],
+            "tags": [tag, tag]
+        }
+        response = await async_client.post("/add-tags-to-selected", headers=headers, json=data)
+        assert response.status_code == 200
+
+        image = await get_image_document(TEST_IMAGE_ID, ['user_tags'])
+        assert image['user_tags'].count(tag) == 1
+
+        remove_tag_data = {
+            "image_id": TEST_IMAGE_ID,
+            "tags": [tag]
+        }
+        response = await async_client.post("/remove-tags", headers=headers, json=remove_tag_data)
+        assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_update_tags_count_increments():
+    tag = f"tag-{uuid4()}"
+    try:
+        assert await update_tags_count({tag: 2})
+        assert await update_tags_count({tag: 1})
+        assert (await tags_collection.find_one({'name': tag}))['count'] == 3
+    finally:
+        await tags_collection.delete_many({'name': tag})
+
+
+@pytest.mark.asyncio
+async def test_update_tags_count_renames_tags_dropping_to_zero():
+    tag = f"tag-{uuid4()}"
+    assert await update_tags_count({tag: 2})
+    tag_id = (await tags_collection.find_one({'name': tag}))['_id']
+    try:
+        assert await update_tags_count({tag: -2})
+        assert await tags_collection.find_one({'name': tag}) is None
+        removed = await tags_collection.find_one({'_id': tag_id})
+        assert removed['name'] == 'NULL'
+        assert removed['count'] == 0
+    finally:
+        await tags_collection.delete_one({'_id': tag_id})
+
+
+@pytest.mark.asyncio
+async def test_update_tags_count_re_adds_removed_tag():
+    tag = f"tag-{uuid4()}"
+    assert await update_tags_count({tag: 1})
+    removed_id = (await tags_collection.find_one({'name': tag}))['_id']
+    try:
+        assert await update_tags_count({tag: -1})
+        assert await update_tags_count({tag: 1})
+        added = await tags_collection.find_one({'name': tag})
+        assert added['_id'] != removed_id
+        assert added['count'] == 1
+        assert (await tags_collection.find_one({'_id': removed_id}))['name'] == 'NULL'
+    finally:
+        await tags_collection.delete_many({'$or': [{'_id': removed_id}, {'name': tag}]})
 
 
 @pytest.mark.asyncio
@@ -115,6 +183,25 @@ async def test_add_like(async_client: AsyncClient, token: str):
     assert response.json()["message"] == "Like added successfully"
 
 
+@pytest.mark.asyncio
+async def test_add_like_twice_counts_once(async_client: AsyncClient, token: str):
+    headers = {"Authorization": f"Bearer {token}"}
+    like_data = {"inserted_id": TEST_IMAGE_ID, "is_positive": True}
+    unlike_data = {"inserted_id": TEST_IMAGE_ID, "is_positive": False}
+    await async_client.post("/add-like", headers=headers, json=unlike_data)
+    likes = (await get_image_document(TEST_IMAGE_ID, ['likes']))['likes']
+
+    for _ in range(2):
+        response = await async_client.post("/add-like", headers=headers, json=like_data)
+        assert response.status_code == 200
+    assert (await get_image_document(TEST_IMAGE_ID, ['likes']))['likes'] == likes + 1
+
+    for _ in range(2):
+        response = await async_client.post("/add-like", headers=headers, json=unlike_data)
+        assert response.status_code == 200
+    assert (await get_image_document(TEST_IMAGE_ID, ['likes']))['likes'] == likes
+
+
 @pytest.mark.asyncio
 async def test_add_view(async_client: AsyncClient):
     data = {
@@ -125,6 +212,15 @@ async def test_add_view(async_client: AsyncClient):
     assert response.json()["message"] == "View added successfully"
 
 
+@pytest.mark.asyncio
+async def test_add_view_of_unknown_image(async_client: AsyncClient):
+    data = {
+        "inserted_id": str(ObjectId())
+    }
+    response = await async_client.post("/add-view", json=data)
+    assert response.status_code == 500
+
+
 @pytest.mark.asyncio
 async def test_add_user_face(async_client: AsyncClient, token: str):
     with patch('databases.face_operations.update_names.delay') as mock_update_names:
@@ -1,8 +1,15 @@
+import struct
+import zlib
 import pytest
 from httpx import AsyncClient
 from pathlib import Path
+from bson import ObjectId
 from unittest.mock import patch
 from tests.conftest import TEST_ALBUM_ID, TEST_IMAGE_ID
+from data.databases.mongodb.async_db.database_tools import vectors_collection
+from data.databases.mongodb.sync_db.face_operations import delete_faces_associated_with_images
+from api.routes.images import image_similarity
+from utils.constants import SIMILARITY_UPLOAD_MAX_PENDING
 
 test_image_path = Path(__file__).parent / 'test.jpg'
 
@@ -41,6 +48,39 @@ async def test_process_and_delete_image(async_client: AsyncClient, token: str):
         mock_delete_faces.assert_called_once_with(image_ids)
 
 
+@pytest.mark.asyncio
+async def test_process_duplicate_image_reuses_data(async_client: AsyncClient, token: str):
+    source = {'_id': TEST_IMAGE_ID, 'image_url': 'https://example.com/image.jpg',
+              'thumbnail_url': 'https://example.com/thumbnail.jpg', 'filename': 'image.jpg', 'metadata': {}}
+    with patch('data.data_extraction.image_processing.get_image_by_content_hash', return_value=source), \
+            patch('data.data_extraction.image_processing.SpaceManager.save_image_to_space') as mock_save_to_space, \
+            patch('data.data_extraction.image_processing.extract_data.delay') as mock_extract_data, \
+            patch('data.data_extraction.image_processing.reuse_extracted_data.delay') as mock_reuse_data, \
+            patch('tag_prediction.tag_prediction_tools.predict_and_update_tags.delay'), \
+            patch('data.databases.mongodb.async_db.database_tools.SpaceManager.delete_image_from_space'), \
+            patch('databases.face_operations.delete_faces_associated_with_images.delay'):
+
+        files = {'images': (test_image_path.name, test_image_path.open('rb'), 'image/jpeg')}
+        data = {'album_id': TEST_ALBUM_ID}
+        headers = {"Authorization": f"Bearer {token}"}
+        response = await async_client.post("/process-images", files=files, data=data, headers=headers)
+        assert response.status_code == 200
+
+        mock_save_to_space.assert_not_called()
+        mock_extract_data.assert_not_called()
+        mock_reuse_data.assert_called_once()
+        source_id, inserted_id = mock_reuse_data.call_args.args
+        assert source_id == TEST_IMAGE_ID
+
+        delete_response = await async_client.request(
+            method="DELETE",
+            url="/delete-images",
+            json={"image_ids": [inserted_id]},
+            headers=headers
+        )
+        assert delete_response.status_code == 200
+
+
 @pytest.mark.asyncio
 async def test_process_images_unauthorized(async_client: AsyncClient):
     files = {'images': (test_image_path.name, test_image_path.open('rb'), 'image/jpeg')}
@@ -95,6 +135,100 @@ async def test_find_similar_images_invalid_limit(async_client: AsyncClient, toke
     assert response.json() == {"detail": "Invalid request parameters"}
 
 
+@pytest.mark.asyncio
+async def test_find_similar_images_limit_too_large(async_client: AsyncClient, token: str):
+    data = {"image_id": TEST_IMAGE_ID, "limit": 101}
+    headers = {"Authorization": f"Bearer {token}"}
+    response = await async_client.post("/find-similar-images", json=data, headers=headers)
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_find_similar_to_upload(async_client: AsyncClient, token: str):
+    files = {'image': (test_image_path.name, test_image_path.open('rb'), 'image/jpeg')}
+    headers = {"Authorization": f"Bearer {token}"}
+    response = await async_client.post("/find-similar-to-upload", files=files, data={'limit': 5}, headers=headers)
+
+    assert response.status_code == 200
+    assert "similar_images" in response.json()
+
+
+@pytest.mark.asyncio
+async def test_find_similar_to_upload_invalid_image(async_client: AsyncClient, token: str):
+    files = {'image': ('test.jpg', b'not an image', 'image/jpeg')}
+    headers = {"Authorization": f"Bearer {token}"}
+    response = await async_client.post("/find-similar-to-upload", files=files, headers=headers)
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_find_similar_to_upload_decompression_bomb(async_client: AsyncClient, token: str):
+    def chunk(chunk_type: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+    # A PNG header declaring 20000x20000 pixels, past the limit Pillow decodes
+    bomb = b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', 20000, 20000, 8, 2, 0, 0, 0)) \
+        + chunk(b'IEND', b'')
+    files = {'image': ('bomb.png', bomb, 'image/png')}
+    headers = {"Authorization": f"Bearer {token}"}
+    response = await async_client.post("/find-similar-to-upload", files=files, headers=headers)
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_find_similar_to_upload_busy(async_client: AsyncClient, token: str):
+    with patch.object(image_similarity, 'pending_uploads', SIMILARITY_UPLOAD_MAX_PENDING):
+        files = {'image': (test_image_path.name, test_image_path.open('rb'), 'image/jpeg')}
+        headers = {"Authorization": f"Bearer {token}"}
+        response = await async_client.post("/find-similar-to-upload", files=files, headers=headers)
+        assert response.status_code == 503
+
+
+@pytest.mark.asyncio
+async def test_find_similar_to_upload_too_large(async_client: AsyncClient, token: str):
+    with patch('api.routes.images.QUERY_IMAGE_MAX_BYTES', 1024):
+        files = {'image': (test_image_path.name, test_image_path.open('rb'), 'image/jpeg')}
+        headers = {"Authorization": f"Bearer {token}"}
+        response = await async_client.post("/find-similar-to-upload", files=files, headers=headers)
+        assert response.status_code == 413
+
+
+@pytest.mark.asyncio
+async def test_find_by_face_no_query(async_client: AsyncClient, token: str):
+    headers = {"Authorization": f"Bearer {token}"}
+    response = await async_client.post("/find-by-face", data={'image_id': TEST_IMAGE_ID}, headers=headers)
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_find_by_face_not_found(async_client: AsyncClient, token: str):
+    data = {'image_id': TEST_IMAGE_ID, 'face_index': 999}
+    headers = {"Authorization": f"Bearer {token}"}
+    response = await async_client.post("/find-by-face", data=data, headers=headers)
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Face not found"}
+
+
+@pytest.mark.asyncio
+async def test_find_by_face_unauthorized(async_client: AsyncClient):
+    response = await async_client.post("/find-by-face", data={'image_id': TEST_IMAGE_ID, 'face_index': 0})
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_duplicate_groups(async_client: AsyncClient, token: str):
+    headers = {"Authorization": f"Bearer {token}"}
+    response = await async_client.get("/duplicate-groups", params={'limit': 5}, headers=headers)
+    assert response.status_code == 200
+    assert "groups" in response.json()
+
+
+@pytest.mark.asyncio
+async def test_duplicate_groups_unauthorized(async_client: AsyncClient):
+    response = await async_client.get("/duplicate-groups")
+    assert response.status_code == 401
+
+
 @pytest.mark.asyncio
 async def test_scrape_images(async_client: AsyncClient, token: str):
     data = {"url": "http://www.galeria.pk.edu.pl/index.php?album=1953-podpisanie-umowy-z-pkp-intercity", "album_id": TEST_ALBUM_ID}
@@ -134,3 +268,17 @@ async def test_scrape_images_invalid_url(async_client: AsyncClient, token: str):
     response = await async_client.post("/scrape-images", json=data, headers=headers)
     assert response.status_code == 400
     assert response.json() == {"detail": "Invalid URL"}
+
+
+@pytest.mark.asyncio
+async def test_delete_faces_without_any_faces():
+    image_id = ObjectId()
+    await vectors_collection.insert_one({'_id': image_id, 'features': [], 'embeddings': []})
+    with patch('data.databases.mongodb.sync_db.face_operations.sync_faces_collection') as mock_faces, \
+            patch('data.databases.mongodb.sync_db.face_operations.publish_face_index_update') as mock_publish:
+        mock_faces.find.return_value = []
+
+        assert delete_faces_associated_with_images([str(image_id)])
+
+        mock_publish.assert_called_once_with(image_id, None)
+    assert await vectors_collection.find_one({'_id': image_id}) is None
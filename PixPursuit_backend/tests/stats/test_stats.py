@@ -0,0 +1,78 @@
+import pytest
+from httpx import AsyncClient
+from unittest.mock import patch
+
+
+@pytest.mark.asyncio
+async def test_auto_tags_stats(async_client: AsyncClient, token: str):
+    stats = {
+        'status': 'finished',
+        'model_version': 'abc123',
+        'total_images': 10,
+        'processed': 2,
+        'updated': 1,
+        'skipped': 8
+    }
+    with patch('api.routes.stats.get_refresh_stats', return_value=stats):
+        headers = {"Authorization": f"Bearer {token}"}
+        response = await async_client.get("/auto-tags-stats", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["skipped"] == 8
+
+
+@pytest.mark.asyncio
+async def test_auto_tags_stats_unauthorized(async_client: AsyncClient):
+    response = await async_client.get("/auto-tags-stats")
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_similarity_cache_stats(async_client: AsyncClient, token: str):
+    stats = {
+        'lookups': 4,
+        'hit_rate': 0.75,
+        'local': {'count': 2, 'avg_latency_ms': 0.5},
+        'redis': {'count': 1, 'avg_latency_ms': 1.2},
+        'miss': {'count': 1, 'avg_latency_ms': 35.0}
+    }
+    with patch('api.routes.stats.get_similarity_cache_stats', return_value=stats):
+        headers = {"Authorization": f"Bearer {token}"}
+        response = await async_client.get("/similarity-cache-stats", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["hit_rate"] == 0.75
+
+
+@pytest.mark.asyncio
+async def test_similarity_cache_stats_unauthorized(async_client: AsyncClient):
+    response = await async_client.get("/similarity-cache-stats")
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_password_hashing_stats(async_client: AsyncClient, token: str):
+    headers = {"Authorization": f"Bearer {token}"}
+    response = await async_client.get("/password-hashing-stats", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["verify"]["count"] > 0
+
+
+@pytest.mark.asyncio
+async def test_password_hashing_stats_unauthorized(async_client: AsyncClient):
+    response = await async_client.get("/password-hashing-stats")
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_metrics(async_client: AsyncClient, token: str):
+    with patch('api.routes.stats.METRICS_TOKEN', None):
+        await async_client.get("/auto-tags-stats", headers={"Authorization": f"Bearer {token}"})
+        response = await async_client.get("/metrics")
+        assert response.status_code == 200
+        assert 'route="/auto-tags-stats"' in response.text
+
+
+@pytest.mark.asyncio
+async def test_metrics_invalid_token(async_client: AsyncClient):
+    with patch('api.routes.stats.METRICS_TOKEN', 'secret'):
+        response = await async_client.get("/metrics", headers={"Authorization": "Bearer wrong"})
+        assert response.status_code == 401
@@ -9,7 +9,7 @@ import os
 
 from dotenv import load_dotenv
 
-from utils.dirs import get_generated_dir_path
+from utils.dirs import get_generated_dir_path, get_model_dir_path
 
 load_dotenv()
 
@@ -18,6 +18,10 @@ SECRET_KEY_AUTH = os.getenv("AUTH_SECRET_KEY")  # Secret key for authentication.
 ALGORITHM = "HS256"  # Algorithm used for token encoding.
 ACCESS_TOKEN_EXPIRE_MINUTES = 120  # Access token expiration time in minutes.
 REFRESH_TOKEN_EXPIRE_DAYS = 30  # Refresh token expiration time in days.
+USER_CACHE_MAX_SIZE = 1024  # Maximum number of authenticated users cached in each process.
+USER_CACHE_TTL = 30  # Time in seconds authenticated users stay cached.
+PASSWORD_HASHING_WORKERS = 2  # Maximum number of Argon2 hashes and verifications running at a time in each process.
+PASSWORD_HASHING_MAX_QUEUE = 64  # Maximum number of Argon2 operations waiting in each process before new ones are rejected.
 
 # Email settings for FastMail
 MAIL_USERNAME = os.getenv("MAIL_USERNAME")  # Username for mail server.
@@ -60,14 +64,24 @@ EMAIL_BODY_TEMPLATE = """
 EMAIL_SUBTYPE = "html"  # Subtype of the email content.
 
 # Tag Prediction
+MODEL_REGISTRY_DIR = get_model_dir_path()  # Directory holding the versioned model checkpoints and the current pointer.
+MODEL_REGISTRY_KEEP = 5  # Number of most recent model checkpoints kept in the registry.
 MODEL_FILE_PATH = os.path.join(
     get_generated_dir_path(), "tag_predictor_state.pth"
-)  # File path for saving model state.
+)  # Legacy single-file model state, imported into the model registry if no checkpoint was published yet.
 LEARNING_RATE = float(
     os.getenv("LEARNING_RATE", "0.001")
 )  # Learning rate for model training.
 POSITIVE_THRESHOLD = 2  # Threshold for considering a feedback as positive.
 TAG_PREDICTION_THRESHOLD = 0.75  # Threshold for tag prediction confidence.
+TRAINING_BATCH_SIZE = 64  # Number of buffered samples per mini-batch training step.
+TRAINING_BUFFER_MAX_SIZE = 50000  # Maximum number of samples kept in the training buffer; oldest are dropped first.
+TRAINER_MAX_RUNTIME = 240  # Maximum time in seconds a single trainer run consumes the buffer.
+TRAINER_CHECKPOINT_INTERVAL = 30  # Interval in seconds between model checkpoints during a trainer run.
+TRAINING_DEBOUNCE_WINDOW = 60  # Time in seconds an edited image must stay untouched before it becomes a training sample.
+TRAINING_EVENTS_BATCH_SIZE = 1000  # Number of touched images turned into training samples per database round trip.
+TAG_VOCABULARY_MAX_AGE = 600  # Time in seconds after which a cached tag vocabulary is reloaded regardless of its version.
+AUTO_TAGS_REFRESH_BATCH_SIZE = 1000  # Number of images predicted and written per chunk of the auto tags refresh.
 
 # Utils
 ALLOWED_EXTENSIONS = {
@@ -96,6 +110,7 @@ IMAGE_URL_PREFIX = (
 
 # MongoDB configuration
 MONGODB_URI = os.getenv("MONGODB_URI")  # URI for MongoDB connection.
+ALBUM_MIGRATION_BATCH_SIZE = 500  # Number of albums updated per bulk write during the album ancestors migration.
 
 # Scraper settings
 BASE_URL = "http://www.galeria.pk.edu.pl"  # Base URL for the web scraper.
@@ -110,6 +125,21 @@ WEIGHTS = {
     "auto_tags": 0.05,
     "added_by": 0.03,
 }  # Weights for factors in image similarity scoring.
+SIMILARITY_CANDIDATES = 500  # Number of nearest images by features re-ranked with all similarity factors.
+SIMILARITY_MAX_LIMIT = 100  # Maximum number of similar images returned per request.
+SIMILARITY_INDEX_STREAM_MAX_LEN = 10000  # Approximate number of similarity index updates kept in the Redis stream.
+SIMILARITY_CACHE_MAX_SIZE = 1024  # Maximum number of similar image results cached in each process.
+SIMILARITY_CACHE_TTL = 600  # Time in seconds similar image results stay cached.
+QUERY_IMAGE_DECODE_SIZE = 256  # Size in pixels uploaded query images are at least decoded at; matches the feature transform resize.
+SIMILARITY_UPLOAD_TIMEOUT = 2.0  # Latency cap in seconds of the search by upload; slower requests get a 503.
+SIMILARITY_UPLOAD_MAX_PENDING = 4  # Maximum number of uploads queued or running for feature extraction in each process before new ones are rejected.
+QUERY_IMAGE_MAX_BYTES = 20 * 1024 * 1024  # Maximum size in bytes of image files uploaded as search queries.
+
+# Vector storage
+VECTOR_STORAGE_DTYPE = os.getenv(
+    "VECTOR_STORAGE_DTYPE", "float16"
+)  # Element dtype of stored feature vectors and face embeddings ('float16' or 'float32').
+VECTOR_MIGRATION_BATCH_SIZE = 500  # Number of documents re-encoded per bulk write during vector migration.
 
 # Face Detection
 MIN_FACE_SIZE = 3  # Minimum size for a detected face.
@@ -117,12 +147,44 @@ FACE_SIZE_THRESHOLD = 4200  # Size threshold for considering a detected face.
 FACE_DELETE_THRESHOLD = 0.1  # Threshold for deleting faces.
 DBSCAN_EPS = 0.8  # Epsilon value for DBSCAN clustering.
 DBSCAN_MIN_SAMPLES = 5  # Minimum samples for DBSCAN clustering.
+FACE_MATCH_THRESHOLD = 0.9  # Maximum embedding distance for a face to match in face search.
+FACE_CROP_DECODE_SIZE = 160  # Size in pixels uploaded face crops are at least decoded at; the input size of the face model.
+FACE_INDEX_STREAM_MAX_LEN = 10000  # Approximate number of face index updates kept in the Redis stream.
+
+# Duplicate detection
+DHASH_SIZE = 8  # Rows and bits per row of the perceptual difference hash (an 8x8 grid gives 64-bit hashes).
+DUPLICATE_MAX_DISTANCE = 3  # Maximum Hamming distance between the hashes of near-duplicate images and their group's oldest image.
+DUPLICATE_GROUPS_BATCH_SIZE = 1000  # Number of image documents fetched or updated per round trip by the duplicate grouping job.
+
+# Redis configuration
+REDIS_URL = "redis://redis:6379/1"  # URL for Redis application state (separate from the Celery database).
+TRAINING_BUFFER_KEY = "tag_predictor:training_buffer"  # Redis list holding pending training samples.
+TRAINER_LOCK_KEY = "tag_predictor:trainer_lock"  # Redis lock ensuring a single model trainer.
+TRAINING_TOUCHED_IMAGES_KEY = "tag_predictor:touched_images"  # Redis sorted set of edited image IDs scored by last edit time.
+TRAINING_TOUCHED_ALBUMS_KEY = "tag_predictor:touched_albums"  # Redis set of album IDs whose images were tagged.
+AUTO_TAGS_REFRESH_CHECKPOINT_KEY = "tag_predictor:refresh_checkpoint"  # Last image ID processed by the auto tags refresh.
+TAG_VOCABULARY_VERSION_KEY = "tag_vocabulary:version"  # Version counter of the tag vocabulary, bumped on tag changes.
+AUTO_TAGS_REFRESH_STATS_KEY = "tag_predictor:refresh_stats"  # Redis hash with statistics of the last auto tags refresh.
+SIMILARITY_INDEX_GENERATION_KEY = "similarity_index:generation"  # Generation counter of the similarity index, bumped on image ingest and deletion.
+SIMILARITY_CACHE_KEY_PREFIX = "similarity_cache"  # Prefix of the Redis keys holding cached similar image results.
+SIMILARITY_CACHE_STATS_KEY = "similarity_cache:stats"  # Redis hash with hit and latency statistics of the similar image search.
+PASSWORD_HASHING_STATS_KEY = "password_hashing:stats"  # Redis hash with queueing statistics of password hashing and verification.
+FACE_INDEX_STREAM_KEY = "face_index:updates"  # Redis stream of added and deleted face embeddings, replayed by face indexes.
+SIMILARITY_INDEX_STREAM_KEY = "similarity_index:updates"  # Redis stream of added, updated and deleted images, replayed by similarity indexes.
+IMAGE_VIEWS_PENDING_KEY = "image_views:pending"  # Redis hash of image IDs to views recorded since the last flush.
+IMAGE_VIEWS_FLUSHING_KEY = "image_views:flushing"  # Redis hash of image IDs to views being flushed to the database.
+IMAGE_VIEWS_FLUSH_ID_FIELD = "flush_id"  # Field of the flushing hash with the ID stamped on images by that flush.
+METRICS_SNAPSHOTS_KEY = "metrics:snapshots"  # Redis hash with the latest metrics snapshot of each Celery worker process.
+METRICS_RETIRED_KEY = "metrics:retired"  # Redis key with the summed counters of Celery worker processes that exited.
 
 # Celery configuration
 CELERY_BROKER_URL = "redis://redis:6379/0"  # Broker URL for Celery.
 CELERY_RESULT_BACKEND = "redis://redis:6379/0"  # Backend URL for Celery results.
 UPDATE_AUTO_TAGS_SCHEDULE = "*/1"  # Schedule for updating auto tags.
 CLUSTER_FACES_SCHEDULE = "*/1"  # Schedule for clustering faces.
+GROUP_DUPLICATES_SCHEDULE = "*/6"  # Schedule (hours) for grouping near-duplicate images.
+TRAIN_MODEL_SCHEDULE = "*/5"  # Schedule (minutes) for consuming the training buffer.
+FLUSH_IMAGE_VIEWS_SCHEDULE = "*/1"  # Schedule (minutes) for writing buffered image views to the database.
 BEAT_SCHEDULE_FILE_PATH = os.path.join(
     get_generated_dir_path(), "celerybeat-schedule"
 )  # Path for Celery beat schedule file.
@@ -132,12 +194,26 @@ MAIN_QUEUE = "main_queue"
 BEAT_QUEUE = "beat_queue"
 SHAREPOINT_TASK = "sharepoint_client.initiate_album_processing.main"
 EXTRACT_DATA_TASK = "image_processing.extract_data.main"
+REUSE_DATA_TASK = "image_processing.reuse_extracted_data.main"
 TRAIN_MODEL_TASK = "tag_prediction_tools.train_model.main"
 PREDICT_TAGS_TASK = "tag_prediction_tools.predict_and_update_tags.main"
 PREDICT_ALL_TAGS_TASK = "tag_prediction_tools.update_all_auto_tags.beat"
 GROUP_FACES_TASK = "face_operations.group_faces.beat"
+GROUP_DUPLICATES_TASK = "duplicate_detection.group_duplicates.beat"
 UPDATE_NAMES_TASK = "face_operations.update_names.main"
 DELETE_FACES_TASK = "face_operations.delete_faces_associated_with_images.main"
+MIGRATE_VECTORS_TASK = "celery_database_tools.migrate_vectors.beat"
+MIGRATE_ALBUM_ANCESTORS_TASK = "celery_database_tools.migrate_album_ancestors.beat"
+FLUSH_IMAGE_VIEWS_TASK = "celery_database_tools.flush_image_views.beat"
+
+# Metrics
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # Bearer token required to scrape /metrics; the endpoint is open if unset.
+METRICS_PUBLISH_INTERVAL = 15  # Interval in seconds at which a Celery worker publishes its metrics snapshot if it changed.
+METRICS_HEARTBEAT_INTERVAL = 300  # Time in seconds after which a Celery worker republishes an unchanged metrics snapshot.
+METRICS_SNAPSHOT_MAX_AGE = 86400  # Time in seconds after which the snapshot of a silent worker process is retired.
+TASK_DURATION_BUCKETS = (
+    0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, float("inf")
+)  # Histogram buckets in seconds for Celery task durations and queue wait times.
 
 # Logging configuration
 LOG_FILE_PATH = os.path.join(
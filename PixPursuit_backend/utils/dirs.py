@@ -25,6 +25,20 @@ def get_generated_dir_path() -> str:
     return generated_files_dir
 
 
+def get_model_dir_path() -> str:
+    """
+    Gets the path to the directory for storing tag predictor checkpoints.
+    The directory is mounted as a volume shared by the web and worker containers.
+    Creates the directory if it does not exist.
+
+    :return: The absolute path to the model directory.
+    """
+    model_dir = os.path.join(get_generated_dir_path(), 'tag_predictor')
+    if not os.path.exists(model_dir):
+        os.makedirs(model_dir, exist_ok=True)
+    return model_dir
+
+
 def get_tmp_dir_path() -> str:
     """
     Creates a unique temporary directory for processing and returns its path.
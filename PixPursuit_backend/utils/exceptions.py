@@ -19,6 +19,8 @@ class StatusCode(Enum):
     BAD_REQUEST = status.HTTP_400_BAD_REQUEST
     NOT_FOUND = status.HTTP_404_NOT_FOUND
     FORBIDDEN = status.HTTP_403_FORBIDDEN
+    SERVICE_UNAVAILABLE = status.HTTP_503_SERVICE_UNAVAILABLE
+    REQUEST_ENTITY_TOO_LARGE = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
 
 
 def create_exception(status_code: int, detail: str, headers: dict = None) -> HTTPException:
@@ -41,6 +43,7 @@ create_user_exception = create_exception(StatusCode.INTERNAL_SERVER_ERROR.value,
 invalid_token_exception = create_exception(StatusCode.BAD_REQUEST.value, "Invalid token")
 verify_email_exception = create_exception(StatusCode.INTERNAL_SERVER_ERROR.value, "Failed to verify email")
 send_confirmation_email_exception = create_exception(StatusCode.INTERNAL_SERVER_ERROR.value, "Failed to send confirmation email")
+password_hashing_busy_exception = create_exception(StatusCode.SERVICE_UNAVAILABLE.value, "Too many sign-ins in progress, try again shortly")
 
 # Album route exceptions
 create_album_exception = create_exception(StatusCode.INTERNAL_SERVER_ERROR.value, "Failed to create new album")
@@ -66,6 +69,13 @@ delete_images_exception = create_exception(StatusCode.INTERNAL_SERVER_ERROR.valu
 relocate_images_exception = create_exception(StatusCode.INTERNAL_SERVER_ERROR.value, "Failed to relocate images")
 find_similar_images_exception = create_exception(StatusCode.INTERNAL_SERVER_ERROR.value, "Failed to find similar images")
 invalid_limit_exception = create_exception(StatusCode.BAD_REQUEST.value, "Invalid limit value")
+invalid_image_exception = create_exception(StatusCode.BAD_REQUEST.value, "Unsupported or corrupt image file")
+query_image_too_large_exception = create_exception(StatusCode.REQUEST_ENTITY_TOO_LARGE.value, "Query image file is too large")
+similarity_search_timeout_exception = create_exception(StatusCode.SERVICE_UNAVAILABLE.value, "Similarity search timed out")
+similarity_search_busy_exception = create_exception(StatusCode.SERVICE_UNAVAILABLE.value, "Too many searches by image in progress, try again shortly")
+no_face_query_exception = create_exception(StatusCode.BAD_REQUEST.value, "Provide an image ID with a face index, or a face image")
+face_not_found_exception = create_exception(StatusCode.NOT_FOUND.value, "Face not found")
+get_duplicate_groups_exception = create_exception(StatusCode.INTERNAL_SERVER_ERROR.value, "Failed to get duplicate groups")
 scrape_and_save_images_exception = create_exception(StatusCode.INTERNAL_SERVER_ERROR.value, "Failed to scrape and save images")
 invalid_url_exception = create_exception(StatusCode.BAD_REQUEST.value, "Invalid URL")
 
@@ -75,3 +85,6 @@ get_soup_exception = create_exception(StatusCode.INTERNAL_SERVER_ERROR.value, "F
 scrape_images_exception = create_exception(StatusCode.INTERNAL_SERVER_ERROR.value, "Failed to scrape images")
 prepare_image_files_exception = create_exception(StatusCode.INTERNAL_SERVER_ERROR.value, "Failed to prepare image files")
 clean_up_exception = create_exception(StatusCode.INTERNAL_SERVER_ERROR.value, "Failed to clean up")
+
+# Stats route exceptions
+get_stats_exception = create_exception(StatusCode.INTERNAL_SERVER_ERROR.value, "Failed to get statistics")
@@ -9,9 +9,9 @@ like checking file types, converting data formats, and handling image files.
 import os
 from bson import ObjectId
 from fastapi import UploadFile
-from utils.constants import ALLOWED_EXTENSIONS, PK_GALLERY_URL
+from utils.constants import ALLOWED_EXTENSIONS, PK_GALLERY_URL, QUERY_IMAGE_DECODE_SIZE
 from config.logging_config import setup_logging
-from PIL import Image
+from PIL import Image, UnidentifiedImageError
 from io import BytesIO
 from utils.exceptions import prepare_image_files_exception
 
@@ -67,6 +67,24 @@ async def image_to_byte_array(image: Image) -> bytes or None:
     return img_byte_arr
 
 
+def decode_query_image(contents: bytes, size: int = QUERY_IMAGE_DECODE_SIZE) -> Image or None:
+    """
+    Decodes an uploaded image used only as a search query. JPEG images are decoded directly at a reduced
+    scale that still covers `size` pixels on each side, which is much faster than decoding at full resolution.
+
+    :param contents: The bytes of the uploaded image.
+    :param size: The minimum size in pixels of each side of the decoded image.
+    :return: The decoded RGB image, or None if the file is not a readable image or too many pixels to decode safely.
+    """
+    try:
+        image = Image.open(BytesIO(contents))
+        image.draft('RGB', (size, size))
+        return image.convert('RGB')
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        logger.error(f"Unsupported image format or corrupt image file: {e}")
+        return None
+
+
 async def convert_to_upload_file(save_dir: str) -> list[UploadFile]:
     """
     Converts saved images in a directory to UploadFile objects for processing.
@@ -0,0 +1,312 @@
+"""
+utils/metrics.py
+
+Defines the application metrics exposed in the Prometheus text format at /metrics: request latency per route and
+in-flight requests, Celery task durations and queue wait times, model forward pass timings, MongoDB and Spaces
+call latencies, and cache lookups by result, from which hit ratios follow.
+
+Every process records into its own registry. Celery workers publish a snapshot of their registry to a Redis hash
+from a background thread, whenever it changed and at least every METRICS_HEARTBEAT_INTERVAL, and the API merges the
+snapshots of all workers with its own registry when it is scraped, summing the series the processes share.
+
+When a worker exits, or its snapshot is older than METRICS_SNAPSHOT_MAX_AGE, its counters and histograms are folded
+into a retired total kept in Redis, so the summed series never decrease and Prometheus does not read them as resets.
+Gauges of exited workers are dropped.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+from celery.signals import before_task_publish, task_prerun, task_postrun, worker_ready, worker_process_init, \
+    worker_shutdown, worker_process_shutdown
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, \
+    disable_created_metrics
+from prometheus_client.metrics_core import Metric
+from pymongo import monitoring
+from redis.exceptions import WatchError
+from config.logging_config import setup_logging
+from config.redis_config import get_redis_client
+from utils.constants import METRICS_SNAPSHOTS_KEY, METRICS_RETIRED_KEY, METRICS_PUBLISH_INTERVAL, \
+    METRICS_HEARTBEAT_INTERVAL, METRICS_SNAPSHOT_MAX_AGE, TASK_DURATION_BUCKETS
+
+logger = setup_logging(__name__)
+
+async_redis_client = get_redis_client(async_mode=True)
+sync_redis_client = get_redis_client(async_mode=False)
+
+disable_created_metrics()  # Creation timestamps cannot be summed across processes
+
+REQUEST_LATENCY = Histogram('pixpursuit_http_request_duration_seconds', 'Latency of HTTP requests.',
+                            ['method', 'route', 'status'])
+REQUESTS_IN_FLIGHT = Gauge('pixpursuit_http_requests_in_flight', 'HTTP requests being served.', ['method'])
+TASK_DURATION = Histogram('pixpursuit_celery_task_duration_seconds', 'Run time of Celery tasks.',
+                          ['task', 'state'], buckets=TASK_DURATION_BUCKETS)
+TASK_QUEUE_WAIT = Histogram('pixpursuit_celery_task_queue_wait_seconds',
+                            'Time Celery tasks waited in the queue before running.',
+                            ['task'], buckets=TASK_DURATION_BUCKETS)
+MODEL_INFERENCE = Histogram('pixpursuit_model_inference_seconds', 'Duration of model forward passes.', ['model'])
+MONGO_LATENCY = Histogram('pixpursuit_mongodb_command_duration_seconds', 'Latency of MongoDB commands.',
+                          ['command', 'outcome'])
+SPACES_LATENCY = Histogram('pixpursuit_spaces_request_duration_seconds', 'Latency of Spaces requests.',
+                           ['operation'])
+CACHE_LOOKUPS = Counter('pixpursuit_cache_lookups_total', 'Cache lookups by the tier that answered.',
+                        ['cache', 'result'])
+
+CUMULATIVE_TYPES = ('counter', 'histogram', 'summary')
+
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}"  # Set again in forked worker processes
+_publisher_stopped = threading.Event()
+_publisher = None
+_task_started = {}
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """
+    Records the latency of every MongoDB command, passed to the MongoDB clients as an event listener.
+    """
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        MONGO_LATENCY.labels(event.command_name, 'succeeded').observe(event.duration_micros / 1e6)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        MONGO_LATENCY.labels(event.command_name, 'failed').observe(event.duration_micros / 1e6)
+
+
+def instrument_space_client(client) -> None:
+    """
+    Records the latency of every request a boto3 Spaces client makes.
+
+    :param client: The boto3 client.
+    """
+    def before_call(context: dict, **kwargs) -> None:
+        context['metrics_started_at'] = time.perf_counter()
+
+    def after_call(context: dict, model, **kwargs) -> None:
+        started_at = context.get('metrics_started_at')
+        if started_at is not None:
+            SPACES_LATENCY.labels(model.name).observe(time.perf_counter() - started_at)
+
+    client.meta.events.register('before-call.s3', before_call)
+    client.meta.events.register('after-call.s3', after_call)
+
+
+def snapshot_registry(registry: CollectorRegistry = REGISTRY) -> list:
+    """
+    Serializes the samples of a registry.
+
+    :param registry: The registry to serialize.
+    :return: A list of [name, type, documentation, samples] entries, each sample as [name, labels, value].
+    """
+    return [[family.name, family.type, family.documentation,
+             [[sample.name, sample.labels, sample.value] for sample in family.samples]]
+            for family in registry.collect()]
+
+
+def sum_snapshots(snapshots: list[list]) -> dict:
+    """
+    Sums several registry snapshots, series by series.
+
+    :param snapshots: The snapshots, as returned by snapshot_registry.
+    :return: A mapping of family names to (type, documentation, {(sample name, sorted labels): value}) tuples.
+    """
+    families = {}
+    for snapshot in snapshots:
+        for name, metric_type, documentation, samples in snapshot:
+            family = families.setdefault(name, (metric_type, documentation, {}))
+            for sample_name, labels, value in samples:
+                key = (sample_name, tuple(sorted(labels.items())))
+                family[2][key] = family[2].get(key, 0.0) + value
+    return families
+
+
+def retire_snapshots(retired: bytes or None, snapshots: list[list]) -> str:
+    """
+    Folds the counters and histograms of the snapshots of exited processes into the retired total.
+
+    :param retired: The serialized retired total, or None if no process exited yet.
+    :param snapshots: The snapshots to fold in.
+    :return: The serialized new retired total.
+    """
+    snapshots = [[family for family in snapshot if family[1] in CUMULATIVE_TYPES] for snapshot in snapshots]
+    if retired:
+        snapshots.append(json.loads(retired))
+    return json.dumps([[name, metric_type, documentation,
+                        [[sample_name, dict(labels), value] for (sample_name, labels), value in samples.items()]]
+                       for name, (metric_type, documentation, samples) in sum_snapshots(snapshots).items()])
+
+
+def publish_snapshot(families: list) -> None:
+    """
+    Publishes a snapshot of the registry of this process to Redis.
+
+    :param families: The snapshot, as returned by snapshot_registry.
+    """
+    try:
+        snapshot = json.dumps({'published_at': time.time(), 'families': families})
+        sync_redis_client.hset(METRICS_SNAPSHOTS_KEY, PROCESS_ID, snapshot)
+    except Exception as e:
+        logger.error(f"Error publishing metrics snapshot: {e}")
+
+
+def run_publisher() -> None:
+    """
+    Publishes the registry of this process every METRICS_PUBLISH_INTERVAL seconds if it changed, and at least
+    every METRICS_HEARTBEAT_INTERVAL seconds so the snapshot is not taken for one of an exited process.
+    """
+    last_families, last_published = None, 0.0
+    while not _publisher_stopped.wait(METRICS_PUBLISH_INTERVAL):
+        families = snapshot_registry()
+        if families != last_families or time.time() - last_published >= METRICS_HEARTBEAT_INTERVAL:
+            publish_snapshot(families)
+            last_families, last_published = families, time.time()
+
+
+def retire_own_snapshot() -> None:
+    """
+    Folds the final registry of this process into the retired total and removes its snapshot, in one transaction.
+    """
+    families = snapshot_registry()
+    for _ in range(3):
+        try:
+            with sync_redis_client.pipeline() as pipe:
+                pipe.watch(METRICS_RETIRED_KEY)
+                retired = retire_snapshots(pipe.get(METRICS_RETIRED_KEY), [families])
+                pipe.multi()
+                pipe.set(METRICS_RETIRED_KEY, retired)
+                pipe.hdel(METRICS_SNAPSHOTS_KEY, PROCESS_ID)
+                pipe.execute()
+                return
+        except WatchError:
+            continue
+        except Exception as e:
+            logger.error(f"Error retiring metrics snapshot: {e}")
+            return
+    # Left in place, the final snapshot is still summed and is retired once stale
+    publish_snapshot(families)
+
+
+class MergedMetrics:
+    """
+    A collector yielding the sum of several registry snapshots, series by series.
+    """
+    def __init__(self, snapshots: list[list]):
+        self.snapshots = snapshots
+
+    def collect(self):
+        for name, (metric_type, documentation, samples) in sum_snapshots(self.snapshots).items():
+            metric = Metric(name, documentation, metric_type)
+            for (sample_name, labels), value in sorted(samples.items(), key=self._sample_order):
+                metric.add_sample(sample_name, dict(labels), value)
+            yield metric
+
+    @staticmethod
+    def _sample_order(item: tuple) -> tuple:
+        """
+        Orders the samples of a family so the buckets, count and sum of each histogram series are adjacent and
+        the buckets ascend.
+        """
+        (sample_name, labels), _ = item
+        series = tuple((key, value) for key, value in labels if key != 'le')
+        bucket = float(dict(labels).get('le', 'inf'))
+        return series, not sample_name.endswith('_bucket'), bucket, sample_name
+
+
+async def render_metrics() -> bytes:
+    """
+    Renders the metrics of this process and of the Celery workers in the Prometheus text format.
+
+    :return: The rendered metrics.
+    """
+    snapshots = [snapshot_registry()]
+    try:
+        async with async_redis_client.pipeline() as pipe:
+            # Watched so that a snapshot retired concurrently is neither lost nor counted twice
+            await pipe.watch(METRICS_SNAPSHOTS_KEY, METRICS_RETIRED_KEY)
+            published = await pipe.hgetall(METRICS_SNAPSHOTS_KEY)
+            retired = await pipe.get(METRICS_RETIRED_KEY)
+            stale = {}
+            for process_id, snapshot in published.items():
+                snapshot = json.loads(snapshot)
+                if time.time() - snapshot['published_at'] > METRICS_SNAPSHOT_MAX_AGE:
+                    stale[process_id] = snapshot['families']
+                elif process_id.decode() != PROCESS_ID:
+                    snapshots.append(snapshot['families'])
+            if retired:
+                snapshots.append(json.loads(retired))
+            if stale:
+                # Summed as read either way, so the scrape is consistent whether or not they are retired now
+                snapshots.extend([[family for family in families if family[1] in CUMULATIVE_TYPES]
+                                  for families in stale.values()])
+                pipe.multi()
+                pipe.set(METRICS_RETIRED_KEY, retire_snapshots(retired, list(stale.values())))
+                pipe.hdel(METRICS_SNAPSHOTS_KEY, *stale)
+                try:
+                    await pipe.execute()
+                except WatchError:
+                    logger.info("Worker metrics snapshots changed while retiring stale ones, retrying on next scrape")
+    except Exception as e:
+        logger.error(f"Error reading worker metrics snapshots: {e}")
+
+    registry = CollectorRegistry(auto_describe=False)
+    registry.register(MergedMetrics(snapshots))
+    return generate_latest(registry)
+
+
+@before_task_publish.connect
+def stamp_published_at(headers: dict = None, **kwargs) -> None:
+    if headers is not None:
+        headers['published_at'] = time.time()
+
+
+@task_prerun.connect
+def record_task_start(task_id: str = None, task=None, **kwargs) -> None:
+    _task_started[task_id] = time.perf_counter()
+    published_at = getattr(task.request, 'published_at', None)
+    if published_at:
+        TASK_QUEUE_WAIT.labels(task.name).observe(max(time.time() - published_at, 0.0))
+
+
+@task_postrun.connect
+def record_task_end(task_id: str = None, task=None, state: str = None, **kwargs) -> None:
+    started_at = _task_started.pop(task_id, None)
+    if started_at is not None:
+        TASK_DURATION.labels(task.name, state or 'UNKNOWN').observe(time.perf_counter() - started_at)
+
+
+def start_publisher() -> None:
+    """
+    Starts the thread publishing the registry of this process, unless it runs already.
+    """
+    global _publisher
+    if _publisher is None:
+        _publisher = threading.Thread(target=run_publisher, name='metrics-publisher', daemon=True)
+        _publisher.start()
+
+
+@worker_ready.connect
+def start_worker_publisher(**kwargs) -> None:
+    start_publisher()
+
+
+@worker_process_init.connect
+def start_child_publisher(**kwargs) -> None:
+    global PROCESS_ID, _publisher, _publisher_stopped
+    # A prefork child inherits the process ID and publisher state of the parent, but not its thread
+    PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}"
+    _publisher_stopped = threading.Event()
+    _publisher = None
+    start_publisher()
+
+
+@worker_shutdown.connect
+@worker_process_shutdown.connect
+def retire_worker_metrics(**kwargs) -> None:
+    _publisher_stopped.set()
+    if _publisher is not None:
+        # A snapshot published after retiring would be counted again once stale
+        _publisher.join(timeout=METRICS_PUBLISH_INTERVAL)
+    retire_own_snapshot()
@@ -0,0 +1,86 @@
+"""
+utils/vector_codec.py
+
+Encodes feature vectors and face embeddings into compact BSON Binary values and decodes them back
+into NumPy arrays. Decoding also accepts the legacy representation (plain or nested lists of floats),
+so documents written before the compact encoding was introduced keep working until they are migrated.
+"""
+
+import hashlib
+import numpy as np
+from bson.binary import Binary
+from utils.constants import VECTOR_STORAGE_DTYPE
+
+# BSON reserves binary subtypes 128-255 for user-defined data; the subtype records the element dtype
+_DTYPE_TO_SUBTYPE = {'float16': 128, 'float32': 129}
+_SUBTYPE_TO_DTYPE = {subtype: dtype for dtype, subtype in _DTYPE_TO_SUBTYPE.items()}
+
+
+def encode_vector(vector: list[float] or np.ndarray, dtype: str = VECTOR_STORAGE_DTYPE) -> Binary or None:
+    """
+    Encodes a vector as a BSON Binary value.
+
+    :param vector: The vector to encode. Nested lists (e.g. a batch of one) are flattened.
+    :param dtype: The storage dtype, either 'float16' or 'float32'.
+    :return: The encoded Binary value, or None if the vector is None.
+    """
+    if vector is None:
+        return None
+    array = np.asarray(vector, dtype=dtype).reshape(-1)
+    return Binary(array.tobytes(), subtype=_DTYPE_TO_SUBTYPE[dtype])
+
+
+def encode_vectors(vectors: list, dtype: str = VECTOR_STORAGE_DTYPE) -> list[Binary]:
+    """
+    Encodes a list of vectors, e.g. all face embeddings of an image.
+
+    :param vectors: The vectors to encode.
+    :param dtype: The storage dtype, either 'float16' or 'float32'.
+    :return: A list of encoded Binary values.
+    """
+    if vectors is None:
+        return []
+    return [encode_vector(vector, dtype) for vector in vectors]
+
+
+def decode_vector(value: Binary or bytes or list or None) -> np.ndarray:
+    """
+    Decodes a stored vector into a flat float32 NumPy array.
+
+    :param value: The stored value, either an encoded Binary or a legacy list of floats.
+    :return: The decoded vector. Missing values decode to an empty array.
+    """
+    if value is None:
+        return np.empty(0, dtype=np.float32)
+    if isinstance(value, bytes):
+        dtype = _SUBTYPE_TO_DTYPE.get(getattr(value, 'subtype', None), 'float32')
+        return np.frombuffer(value, dtype=dtype).astype(np.float32)
+    return np.asarray(value, dtype=np.float32).reshape(-1)
+
+
+def decode_vectors(values: list or None) -> np.ndarray:
+    """
+    Decodes a list of stored vectors into a 2D float32 NumPy array.
+
+    :param values: The stored values, each either an encoded Binary or a legacy list of floats.
+    :return: An array of shape (len(values), dim), or an empty (0, 0) array if there are no values.
+    """
+    if not values:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.vstack([decode_vector(value) for value in values])
+
+
+def vector_digest(value: Binary or bytes or list or None) -> str or None:
+    """
+    Computes a digest identifying the contents of a stored vector, used to detect changed vectors.
+
+    :param value: The stored value, either an encoded Binary or a legacy list of floats.
+    :return: The hex digest of the vector, or None if the vector is missing or empty.
+    """
+    if value is None:
+        return None
+    if not isinstance(value, bytes):
+        value = encode_vector(value)
+    if not value:
+        return None
+    return hashlib.sha1(value).hexdigest()